@@ -0,0 +1,119 @@
+import math
+
+import numpy as np
+from django.db import connection
+from django.db.models import Count
+
+from .models import Location
+from .spatial import is_postgis
+
+GRID_SHAPES = ('square', 'hex')
+MAX_GRID_CELLS = 250000
+
+# Hexagons are pointy-top with a width of `size`, so the rows of hexagon
+# centers are sqrt(3) / 2 * size apart. Points are binned to the nearer center
+# of two rectangular lattices offset by half a cell, which tiles the plane
+# with hexagons. Both lattices are anchored at 0,0, so cells do not move when
+# the bbox changes.
+HEX_RATIO = math.sqrt(3)
+
+SQUARE_GRID_SQL = """
+    SELECT floor(ST_X(coordinates) / %(size)s) AS grid_col, floor(ST_Y(coordinates) / %(size)s) AS grid_row, count(*)
+    FROM {location}
+    WHERE coordinates && ST_MakeEnvelope(%(west)s, %(south)s, %(east)s, %(north)s, 4326)
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+"""
+
+HEX_GRID_SQL = """
+    WITH p AS (
+        SELECT ST_X(coordinates) / %(size)s AS x, ST_Y(coordinates) / (%(size)s * %(ratio)s) AS y
+        FROM {location}
+        WHERE coordinates && ST_MakeEnvelope(%(west)s, %(south)s, %(east)s, %(north)s, 4326)
+    ),
+    c AS (
+        SELECT x, y, floor(x + 0.5) AS i1, floor(y + 0.5) AS j1, floor(x) + 0.5 AS i2, floor(y) + 0.5 AS j2
+        FROM p
+    )
+    SELECT
+        CASE WHEN (x - i1) ^ 2 + 3 * (y - j1) ^ 2 <= (x - i2) ^ 2 + 3 * (y - j2) ^ 2 THEN 2 * i1 ELSE 2 * i2 END AS grid_col,
+        CASE WHEN (x - i1) ^ 2 + 3 * (y - j1) ^ 2 <= (x - i2) ^ 2 + 3 * (y - j2) ^ 2 THEN 2 * j1 ELSE 2 * j2 END AS grid_row,
+        count(*)
+    FROM c
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+"""
+
+
+def boundary_counts(queryset):
+    """
+    Returns [{'id', 'name', 'count'}] with the number of locations inside each
+    boundary of the queryset, counted from the membership table in one grouped query.
+    """
+    return list(
+        queryset.annotate(count=Count('memberships')).order_by('id').values('id', 'name', 'count')
+    )
+
+
+def grid_cell_count(extent, size, shape):
+    west, south, east, north = extent
+    height = size * HEX_RATIO / 2 if shape == 'hex' else size
+    return (math.floor((east - west) / size) + 1) * (math.floor((north - south) / height) + 1)
+
+
+def grid_counts(bbox, size, shape):
+    """
+    Returns [{'center': [lon, lat], 'count'}] for the non empty cells of a
+    square or hexagonal grid of cells `size` degrees wide over the bbox polygon.
+
+    On PostGIS the points are binned by one grouped query, on other backends
+    the points in the extent are fetched and binned with NumPy.
+    """
+    if is_postgis():
+        sql = (HEX_GRID_SQL if shape == 'hex' else SQUARE_GRID_SQL).format(location=Location._meta.db_table)
+        west, south, east, north = bbox.extent
+        params = {'size': size, 'ratio': HEX_RATIO, 'west': west, 'south': south, 'east': east, 'north': north}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        cols = np.array([row[0] for row in rows], dtype=float)
+        grid_rows = np.array([row[1] for row in rows], dtype=float)
+        counts = np.array([row[2] for row in rows], dtype=np.int64)
+    else:
+        points = Location.objects.filter(coordinates__bboverlaps=bbox).values_list('coordinates', flat=True)
+        coordinates = np.array([(point.x, point.y) for point in points], dtype=float).reshape(-1, 2)
+        cols, grid_rows, counts = bin_points(coordinates, size, shape)
+    return [
+        {'center': center, 'count': int(count)}
+        for center, count in zip(cell_centers(cols, grid_rows, size, shape), counts)
+    ]
+
+
+def bin_points(coordinates, size, shape):
+    """
+    Returns the (cols, rows, counts) arrays of the non empty cells for an
+    N x 2 array of lon/lat coordinates, binned like the SQL queries.
+    """
+    if shape == 'hex':
+        x = coordinates[:, 0] / size
+        y = coordinates[:, 1] / (size * HEX_RATIO)
+        i1, j1 = np.floor(x + 0.5), np.floor(y + 0.5)
+        i2, j2 = np.floor(x) + 0.5, np.floor(y) + 0.5
+        first = (x - i1) ** 2 + 3 * (y - j1) ** 2 <= (x - i2) ** 2 + 3 * (y - j2) ** 2
+        cols = 2 * np.where(first, i1, i2)
+        rows = 2 * np.where(first, j1, j2)
+    else:
+        cols = np.floor(coordinates[:, 0] / size)
+        rows = np.floor(coordinates[:, 1] / size)
+    cells, counts = np.unique(np.stack([cols, rows], axis=1).reshape(-1, 2), axis=0, return_counts=True)
+    return cells[:, 0], cells[:, 1], counts
+
+
+def cell_centers(cols, rows, size, shape):
+    if shape == 'hex':
+        lons = cols * size / 2
+        lats = rows * size * HEX_RATIO / 2
+    else:
+        lons = (cols + 0.5) * size
+        lats = (rows + 0.5) * size
+    return [[float(lon), float(lat)] for lon, lat in zip(lons.tolist(), lats.tolist())]
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class GisAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gis_app'
+
+    def ready(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+        from .metrics import install_query_recorder
+
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(sender=type(connection), connection=connection)
@@ -0,0 +1,163 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.gis.geos import Point
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .models import Location, Boundary
+from .serializers import LocationSerializer, BoundarySerializer, DistanceSerializer, WithinBoundarySerializer
+from .cache import prepared_boundaries
+from .metrics import timer
+from .pagination import alist_response
+from .conditional import adetail_validators, validators, set_validators, not_modified_response
+from .filters import filter_locations, filter_boundaries
+from .geojson import location_features
+from .views import simplified_boundaries
+
+
+def async_api_view(authenticated=False):
+    """
+    Turns an async function into an API view.
+
+    The view receives a DRF `Request`, authenticated with the same classes as
+    the APIViews (and with their CSRF checks). Authentication runs in a thread,
+    the view itself runs on the event loop and queries with the async ORM.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            request = Request(
+                request,
+                parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+                authenticators=[authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+            )
+            try:
+                user = await sync_to_async(lambda: request.user)()
+                if authenticated and not user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                return await view(request, *args, **kwargs)
+            except (exceptions.NotAuthenticated, exceptions.AuthenticationFailed) as e:
+                # Same as APIView: 401 with a challenge if the first
+                # authenticator has one, 403 otherwise.
+                header = request.authenticators[0].authenticate_header(request) if request.authenticators else None
+                response = JsonResponse({'detail': e.detail}, status=status.HTTP_401_UNAUTHORIZED if header else status.HTTP_403_FORBIDDEN)
+                if header:
+                    response['WWW-Authenticate'] = header
+                return response
+            except exceptions.APIException as e:
+                return JsonResponse({'detail': e.detail}, status=e.status_code)
+            except Http404:
+                return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return wrapper
+    return decorator
+
+
+def error_response(message):
+    return JsonResponse({'error': message}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@require_GET
+@async_api_view(authenticated=True)
+async def location_list(request):
+    """
+    Async version of the location list, with the same query parameters.
+    """
+    try:
+        location_obj = filter_locations(Location.objects.all(), request.query_params)
+    except ValueError as e:
+        return error_response(str(e))
+    return await alist_response(request, location_obj, LocationSerializer, location_features)
+
+
+@require_GET
+@async_api_view(authenticated=True)
+async def location_detail(request, pk):
+    response = not_modified_response(request, *await adetail_validators(Location.objects.all(), pk, request.query_params))
+    if response is not None:
+        return response
+    location_obj = await aget_object_or_404(Location, pk=pk)
+    response = JsonResponse(LocationSerializer(location_obj).data, status=status.HTTP_200_OK)
+    return set_validators(response, *validators(request.query_params, location_obj.pk, location_obj.updated_at))
+
+
+@require_GET
+@async_api_view(authenticated=True)
+async def boundary_list(request):
+    """
+    Async version of the boundary list, with the same query parameters.
+    """
+    try:
+        boundary_obj = filter_boundaries(Boundary.objects.all(), request.query_params)
+        boundary_obj, features, context = simplified_boundaries(boundary_obj, request.query_params)
+    except ValueError as e:
+        return error_response(str(e))
+    return await alist_response(request, boundary_obj, BoundarySerializer, features, context)
+
+
+@require_GET
+@async_api_view(authenticated=True)
+async def boundary_detail(request, pk):
+    try:
+        boundaries, _, context = simplified_boundaries(Boundary.objects.all(), request.query_params)
+    except ValueError as e:
+        return error_response(str(e))
+    response = not_modified_response(request, *await adetail_validators(Boundary.objects.all(), pk, request.query_params))
+    if response is not None:
+        return response
+    boundary_obj = await aget_object_or_404(boundaries, pk=pk)
+    response = JsonResponse(BoundarySerializer(boundary_obj, context=context).data, status=status.HTTP_200_OK)
+    return set_validators(response, *validators(request.query_params, boundary_obj.pk, boundary_obj.updated_at))
+
+
+@require_POST
+@async_api_view()
+async def calculate_distance(request):
+    """
+    Async version of the distance between two locations.
+    """
+    serializer = DistanceSerializer(data=request.data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    points = []
+    for name in ('location1', 'location2'):
+        if f'{name}_id' in data:
+            points.append((await aget_object_or_404(Location, id=data[f'{name}_id'])).coordinates)
+        else:
+            points.append(Point(*data[name], srid=4326))
+    result = {name: list(value) if isinstance(value, tuple) else value for name, value in data.items()}
+    with timer('geos'):
+        result['distance'] = points[0].distance(points[1])
+    return JsonResponse(result, status=status.HTTP_200_OK)
+
+
+@require_POST
+@async_api_view()
+async def check_boundary(request):
+    """
+    Async version of the check if a location is within a boundary.
+    """
+    serializer = WithinBoundarySerializer(data=request.data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+    if 'location_id' in data:
+        point = (await aget_object_or_404(Location, id=data['location_id'])).coordinates
+    else:
+        point = Point(*data['location'], srid=4326)
+    if 'boundary_id' in data:
+        area = await sync_to_async(prepared_boundaries.get)(data['boundary_id'])
+        if area is None:
+            raise Http404
+    else:
+        area = data['boundary']
+    with timer('geos'):
+        is_within = area.contains(point)
+    return JsonResponse({'is_within': is_within}, status=status.HTTP_200_OK)
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+from .cache import LRUCache
+
+
+class CachedJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authenticates requests with a JWT access token in the Authorization header
+    without any database query: the user is a `TokenUser` built from the
+    token's claims.
+
+    Validated tokens are cached by their raw value until they expire, so
+    a client sending the same token again skips the signature check and
+    claim validation.
+    """
+
+    tokens = LRUCache(getattr(settings, 'JWT_TOKEN_CACHE_SIZE', 10000))
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = self.tokens.get(raw_token)
+        if cached is not None and cached[2] > time.time():
+            return cached[0], cached[1]
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        self.tokens.set(raw_token, (user, validated_token, validated_token['exp']))
+        return user, validated_token
@@ -0,0 +1,224 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .tiles import tile_range
+from .models import Boundary
+
+
+class LRUCache:
+    """
+    Thread safe in-process cache keeping the `maxsize` most recently used entries.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                self.entries.move_to_end(key)
+            except KeyError:
+                return default
+            return self.entries[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class TileCache:
+    """
+    Cache for rendered tiles: an in-process LRU in front of a Django cache backend.
+
+    Tiles are keyed by layer and z/x/y plus a generation token of the tile's
+    ancestor at `invalidation_zoom` (or of the tile itself below that zoom).
+    A write replaces the tokens of the ancestors intersecting the changed
+    geometry, so only those tiles miss afterwards; stale entries age out of
+    both caches. Writes touching more than `max_invalidation_tiles` tiles
+    in total replace the layer token and thereby flush the whole layer.
+    """
+
+    def __init__(self, alias, lru_size, invalidation_zoom, max_invalidation_tiles, timeout=None):
+        self.alias = alias
+        self.lru = LRUCache(lru_size)
+        self.invalidation_zoom = invalidation_zoom
+        self.max_invalidation_tiles = max_invalidation_tiles
+        self.timeout = timeout
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def generation_keys(self, layer, z, x, y):
+        gz = min(z, self.invalidation_zoom)
+        shift = z - gz
+        return f'tilegen:{layer}', f'tilegen:{layer}:{gz}:{x >> shift}:{y >> shift}'
+
+    def tile_key(self, layer, z, x, y):
+        layer_key, ancestor_key = self.generation_keys(layer, z, x, y)
+        tokens = self.backend.get_many([layer_key, ancestor_key])
+        for key in (layer_key, ancestor_key):
+            if key not in tokens:
+                # A missing token may have been evicted, so it cannot be
+                # assumed unchanged: start a new generation.
+                self.backend.add(key, uuid.uuid4().hex, timeout=None)
+                tokens[key] = self.backend.get(key)
+        return f'tile:{layer}:{z}:{x}:{y}:{tokens[layer_key]}:{tokens[ancestor_key]}'
+
+    def get_or_render(self, layer, z, x, y, render):
+        """
+        Returns the cached tile, rendering and storing it with `render(layer, z, x, y)` on a miss.
+        """
+        key = self.tile_key(layer, z, x, y)
+        content = self.lru.get(key)
+        if content is None:
+            content = self.backend.get(key)
+            if content is None:
+                content = render(layer, z, x, y)
+                self.backend.set(key, content, timeout=self.timeout)
+            self.lru.set(key, content)
+        return content
+
+    def invalidate(self, layer, geometries):
+        """
+        Evicts the tiles of `layer` intersecting the extent of any of the geometries.
+        """
+        keys = set()
+        for geometry in geometries:
+            if geometry is None or geometry.empty:
+                continue
+            for z in range(self.invalidation_zoom + 1):
+                min_x, min_y, max_x, max_y = tile_range(geometry.extent, z)
+                if len(keys) + (max_x - min_x + 1) * (max_y - min_y + 1) > self.max_invalidation_tiles:
+                    self.backend.set(f'tilegen:{layer}', uuid.uuid4().hex, timeout=None)
+                    return
+                for x in range(min_x, max_x + 1):
+                    for y in range(min_y, max_y + 1):
+                        keys.add(f'tilegen:{layer}:{z}:{x}:{y}')
+        if keys:
+            self.backend.set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+    def clear(self):
+        self.lru.clear()
+        self.backend.clear()
+
+
+class VersionedCache:
+    """
+    Cache for computed results that depend on the whole data set.
+
+    Keys embed a version token stored in the Django cache backend; replacing
+    the token invalidates every cached result at once, and the stale entries
+    age out of the backend.
+    """
+
+    def __init__(self, alias, name, timeout=None):
+        self.alias = alias
+        self.name = name
+        self.timeout = timeout
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def version(self):
+        key = f'{self.name}:version'
+        token = self.backend.get(key)
+        if token is None:
+            self.backend.add(key, uuid.uuid4().hex, timeout=None)
+            token = self.backend.get(key)
+        return token
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the cached result for `key`, storing `compute()` on a miss.
+        """
+        key = f'{self.name}:{self.version()}:{key}'
+        result = self.backend.get(key)
+        if result is None:
+            result = compute()
+            self.backend.set(key, result, timeout=self.timeout)
+        return result
+
+    def invalidate(self):
+        self.backend.set(f'{self.name}:version', uuid.uuid4().hex, timeout=None)
+
+
+class PreparedGeometryCache:
+    """
+    In-process LRU of prepared GEOS geometries of a model's geometry field.
+
+    Entries are keyed by primary key and `updated_at`. Every lookup reads
+    the current `updated_at` of the object, which is cheap, and the geometry
+    is only fetched, parsed and prepared again when the object changed since
+    it was cached, also when another process wrote it.
+    """
+
+    def __init__(self, model, field, maxsize):
+        self.model = model
+        self.field = field
+        self.lru = LRUCache(maxsize)
+
+    def get(self, pk):
+        """
+        Returns the prepared geometry of the object, or None if it does not exist.
+        """
+        objects = self.model.objects.filter(pk=pk)
+        updated_at = objects.values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            return None
+        prepared = self.lru.get((pk, updated_at))
+        if prepared is None:
+            row = objects.values_list(self.field, 'updated_at').first()
+            if row is None:
+                return None
+            geometry, updated_at = row
+            prepared = geometry.prepared
+            # Builds the lazily created index of the prepared geometry now,
+            # before other threads can use it concurrently.
+            prepared.contains(geometry.point_on_surface)
+            self.lru.set((pk, updated_at), prepared)
+        return prepared
+
+    def clear(self):
+        self.lru.clear()
+
+
+tile_cache = TileCache(
+    alias=getattr(settings, 'TILE_CACHE_ALIAS', 'default'),
+    lru_size=getattr(settings, 'TILE_CACHE_LRU_SIZE', 512),
+    invalidation_zoom=getattr(settings, 'TILE_CACHE_INVALIDATION_ZOOM', 12),
+    max_invalidation_tiles=getattr(settings, 'TILE_CACHE_MAX_INVALIDATION_TILES', 4096),
+    timeout=getattr(settings, 'TILE_CACHE_TIMEOUT', 3600),
+)
+
+aggregate_cache = VersionedCache(
+    alias=getattr(settings, 'AGGREGATE_CACHE_ALIAS', 'default'),
+    name='aggregate',
+    timeout=getattr(settings, 'AGGREGATE_CACHE_TIMEOUT', 300),
+)
+
+prepared_boundaries = PreparedGeometryCache(
+    Boundary, 'area',
+    maxsize=getattr(settings, 'PREPARED_GEOMETRY_CACHE_SIZE', 256),
+)
@@ -0,0 +1,93 @@
+from django.db import connection, transaction
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+
+from .models import Location, Boundary, ChangeEvent
+from .geojson import location_features, boundary_features, dumps
+from .pagination import keyset_page
+from .spatial import is_postgis
+
+CHANGE_CHUNK_SIZE = 1000
+
+# Key of the advisory lock serializing the writers of change events, so
+# sequence numbers are committed in increasing order and a reader never
+# skips an event committed after a higher one.
+CHANGE_LOCK_ID = 0x67697363
+
+CHANGE_MODELS = {
+    ChangeEvent.LOCATION: (Location, location_features),
+    ChangeEvent.BOUNDARY: (Boundary, boundary_features),
+}
+
+
+def record_changes(model, action, ids):
+    """
+    Appends one change event per id to the change log.
+    """
+    if not ids:
+        return
+    with transaction.atomic():
+        if is_postgis():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CHANGE_LOCK_ID])
+        ChangeEvent.objects.bulk_create(
+            [ChangeEvent(model=model, action=action, object_id=pk) for pk in ids],
+            batch_size=CHANGE_CHUNK_SIZE
+        )
+
+
+def current_features(events):
+    """
+    Returns {(model, id): encoded GeoJSON Feature} with the current state of
+    the objects created or updated by the events. Deleted objects are missing.
+    """
+    features = {}
+    for model, (model_class, reader) in CHANGE_MODELS.items():
+        ids = {event.object_id for event in events if event.model == model and event.action != ChangeEvent.DELETE}
+        if ids:
+            for row in reader.rows(model_class.objects.filter(pk__in=ids)):
+                features[model, row[0]] = reader.encode(row)
+    return features
+
+
+def iter_changes(events, after, limit=None, chunk_size=CHANGE_CHUNK_SIZE):
+    """
+    Yields the events after the sequence number `after` as a JSON object
+    {"changes": [...], "last_seq": n} in byte chunks.
+
+    Created and updated objects carry their current state as a GeoJSON
+    Feature, deletes carry a null feature. Only events committed before the
+    response started are read, and at most `limit` of them.
+    """
+    last_seq = events.aggregate(last_seq=Max('seq'))['last_seq'] or after
+    events = events.filter(seq__lte=last_seq)
+    yield b'{"changes":['
+    separator = b''
+    cursor = after
+    remaining = limit
+    while cursor is not None and remaining != 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        page, next_cursor = keyset_page(events, cursor, size)
+        features = current_features(page)
+        for event in page:
+            yield separator + b'{"seq":%d,"model":%s,"id":%d,"action":%s,"created_at":%s,"feature":%s}' % (
+                event.seq, dumps(event.model), event.object_id, dumps(event.action),
+                dumps(event.created_at), features.get((event.model, event.object_id), b'null')
+            )
+            separator = b','
+            after = event.seq
+        cursor = next_cursor
+        if remaining is not None:
+            remaining -= len(page)
+    yield b'],"last_seq":%d}' % after
+
+
+def stream_changes(after, model=None, limit=None):
+    """
+    Returns a streaming response with the change events after `after`,
+    of one model or of all of them.
+    """
+    events = ChangeEvent.objects.all()
+    if model:
+        events = events.filter(model=model)
+    return StreamingHttpResponse(iter_changes(events, after, limit), content_type='application/json')
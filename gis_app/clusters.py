@@ -0,0 +1,139 @@
+import math
+
+import numpy as np
+from django.db import connection, transaction
+
+from .models import LocationCluster
+from .spatial import is_postgis
+from .tiles import MAX_LATITUDE, TILE_PIXELS, tile_range
+
+CLUSTER_MAX_ZOOM = 16
+CLUSTER_CELL_PIXELS = 64
+MAX_CLUSTER_CELLS = 4096
+
+# A cluster cell at zoom z is the tile at zoom z + CELL_ZOOM_OFFSET, so the
+# cells of a zoom level nest in the cells of the level above it.
+CELL_ZOOM_OFFSET = int(math.log2(TILE_PIXELS // CLUSTER_CELL_PIXELS))
+
+UPSERT_SQL = """
+    INSERT INTO {table} (zoom, x, y, count, sum_lon, sum_lat)
+    SELECT * FROM unnest(%s::smallint[], %s::int[], %s::int[], %s::int[], %s::float8[], %s::float8[])
+    ON CONFLICT (zoom, x, y) DO UPDATE SET
+        count = {table}.count + EXCLUDED.count,
+        sum_lon = {table}.sum_lon + EXCLUDED.sum_lon,
+        sum_lat = {table}.sum_lat + EXCLUDED.sum_lat
+"""
+
+# Only the cells changed by the deltas can have become empty, so the cleanup
+# probes them through the (zoom, x, y) unique index instead of scanning counts.
+DELETE_EMPTY_SQL = """
+    DELETE FROM {table}
+    WHERE (zoom, x, y) IN (SELECT * FROM unnest(%s::smallint[], %s::int[], %s::int[]))
+    AND count <= 0
+"""
+
+
+def cell_indexes(lons, lats, zoom):
+    """
+    Returns the x and y arrays of the cells at `zoom` containing the lon/lat arrays.
+    """
+    n = 2 ** (zoom + CELL_ZOOM_OFFSET)
+    lats = np.clip(lats, -MAX_LATITUDE, MAX_LATITUDE)
+    xs = np.floor((lons + 180) / 360 * n)
+    ys = np.floor((1 - np.arcsinh(np.tan(np.radians(lats))) / np.pi) / 2 * n)
+    return np.clip(xs, 0, n - 1).astype(np.int64), np.clip(ys, 0, n - 1).astype(np.int64)
+
+
+def cluster_deltas(added, removed):
+    """
+    Returns the (zoom, x, y, count, sum_lon, sum_lat) changes of the cells of
+    every zoom level for the added and removed points, one row per changed cell.
+    """
+    points = [(point.x, point.y) for point in added] + [(point.x, point.y) for point in removed]
+    if not points:
+        return []
+    coordinates = np.array(points, dtype=float)
+    lons, lats = coordinates[:, 0], coordinates[:, 1]
+    signs = np.concatenate([np.ones(len(added)), -np.ones(len(removed))])
+    deltas = []
+    for zoom in range(CLUSTER_MAX_ZOOM + 1):
+        xs, ys = cell_indexes(lons, lats, zoom)
+        cells, inverse = np.unique(np.stack([xs, ys], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        counts = np.bincount(inverse, weights=signs, minlength=len(cells))
+        sum_lons = np.bincount(inverse, weights=signs * lons, minlength=len(cells))
+        sum_lats = np.bincount(inverse, weights=signs * lats, minlength=len(cells))
+        for (x, y), count, sum_lon, sum_lat in zip(cells.tolist(), counts.tolist(), sum_lons.tolist(), sum_lats.tolist()):
+            # A point moved within its cell changes the sums but not the count
+            if count or sum_lon or sum_lat:
+                deltas.append((zoom, x, y, int(round(count)), sum_lon, sum_lat))
+    return deltas
+
+
+def update_clusters(added=(), removed=()):
+    """
+    Adds the `added` points to the clusters of every zoom level and removes the `removed` ones.
+    """
+    deltas = cluster_deltas(list(added), [point for point in removed if point is not None])
+    if not deltas:
+        return
+    with transaction.atomic():
+        if is_postgis():
+            columns = [list(column) for column in zip(*deltas)]
+            table = LocationCluster._meta.db_table
+            with connection.cursor() as cursor:
+                cursor.execute(UPSERT_SQL.format(table=table), columns)
+                cursor.execute(DELETE_EMPTY_SQL.format(table=table), columns[:3])
+        else:
+            apply_deltas(deltas)
+
+
+def apply_deltas(deltas):
+    """
+    Applies cluster deltas with the ORM on backends other than PostGIS,
+    deleting the changed cells left without points.
+    """
+    keys = {(zoom, x, y) for zoom, x, y, _, _, _ in deltas}
+    existing = {}
+    for zoom in {zoom for zoom, _, _ in keys}:
+        cells = LocationCluster.objects.select_for_update().filter(
+            zoom=zoom, x__in={x for z, x, _ in keys if z == zoom}, y__in={y for z, _, y in keys if z == zoom}
+        )
+        for cell in cells:
+            if (cell.zoom, cell.x, cell.y) in keys:
+                existing[cell.zoom, cell.x, cell.y] = cell
+    created = []
+    for zoom, x, y, count, sum_lon, sum_lat in deltas:
+        cell = existing.get((zoom, x, y))
+        if cell is None:
+            if count > 0:
+                created.append(LocationCluster(zoom=zoom, x=x, y=y, count=count, sum_lon=sum_lon, sum_lat=sum_lat))
+        else:
+            cell.count += count
+            cell.sum_lon += sum_lon
+            cell.sum_lat += sum_lat
+    empty = [cell.pk for cell in existing.values() if cell.count <= 0]
+    LocationCluster.objects.filter(pk__in=empty).delete()
+    LocationCluster.objects.bulk_update(
+        [cell for cell in existing.values() if cell.count > 0], ['count', 'sum_lon', 'sum_lat'], batch_size=1000
+    )
+    LocationCluster.objects.bulk_create(created, batch_size=1000)
+
+
+def cluster_cell_range(extent, zoom):
+    """
+    Returns the (min_x, min_y, max_x, max_y) cell indexes at `zoom` covering the extent.
+    """
+    return tile_range(extent, zoom + CELL_ZOOM_OFFSET, buffer=0)
+
+
+def clusters(extent, zoom):
+    """
+    Returns the clusters at `zoom` whose cell intersects the extent as
+    (count, lon, lat) tuples, located at the mean of their points.
+    """
+    min_x, min_y, max_x, max_y = cluster_cell_range(extent, zoom)
+    cells = LocationCluster.objects.filter(
+        zoom=zoom, x__range=(min_x, max_x), y__range=(min_y, max_y)
+    ).order_by('x', 'y').values_list('count', 'sum_lon', 'sum_lat')
+    return [(count, sum_lon / count, sum_lat / count) for count, sum_lon, sum_lat in cells]
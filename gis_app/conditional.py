@@ -0,0 +1,98 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Location, Boundary, ChangeEvent
+
+
+def validators(query_params, key, updated_at):
+    """
+    Returns the (ETag, Last-Modified timestamp) of a response.
+
+    The ETag covers `key` (a primary key, or the latest change and row count
+    of a list), the latest
+    `updated_at` and the query params, since they change the response body.
+    """
+    params = sorted((name, values) for name, values in query_params.lists())
+    value = f'{key}:{updated_at.isoformat() if updated_at else ""}:{params}'
+    etag = quote_etag(hashlib.md5(value.encode('utf-8')).hexdigest())
+    return etag, int(updated_at.timestamp()) if updated_at else None
+
+
+def change_model(queryset):
+    return {Location: ChangeEvent.LOCATION, Boundary: ChangeEvent.BOUNDARY}[queryset.model]
+
+
+def list_validators(queryset, query_params):
+    """
+    Returns the validators of a list: an ETag from the latest change event of
+    the model, which every write through the API, the import and the position
+    buffer appends (deletes included), along with the row count and latest
+    `updated_at` of the queryset for rows changed elsewhere.
+
+    Lists have no Last-Modified: `updated_at` does not move on deletes and
+    HTTP dates only have whole seconds, so it would answer 304 to clients
+    that missed a change.
+    """
+    stats = queryset.order_by().aggregate(count=Count('pk'), updated_at=Max('updated_at'))
+    seq = ChangeEvent.objects.filter(model=change_model(queryset)).order_by('-seq').values_list('seq', flat=True).first()
+    etag, _ = validators(query_params, f'{seq}:{stats["count"]}', stats['updated_at'])
+    return etag, None
+
+
+async def alist_validators(queryset, query_params):
+    """
+    Async version of `list_validators`.
+    """
+    stats = await queryset.order_by().aaggregate(count=Count('pk'), updated_at=Max('updated_at'))
+    seq = await ChangeEvent.objects.filter(model=change_model(queryset)).order_by('-seq').values_list('seq', flat=True).afirst()
+    etag, _ = validators(query_params, f'{seq}:{stats["count"]}', stats['updated_at'])
+    return etag, None
+
+
+def detail_validators(queryset, pk, query_params):
+    """
+    Returns the validators of a detail response, reading only the `updated_at`
+    of the object. Raises Http404 if the object does not exist.
+    """
+    updated_at = queryset.filter(pk=pk).values_list('updated_at', flat=True).first()
+    if updated_at is None:
+        raise Http404
+    return validators(query_params, pk, updated_at)
+
+
+async def adetail_validators(queryset, pk, query_params):
+    """
+    Async version of `detail_validators`.
+    """
+    updated_at = await queryset.filter(pk=pk).values_list('updated_at', flat=True).afirst()
+    if updated_at is None:
+        raise Http404
+    return validators(query_params, pk, updated_at)
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Adds the ETag and Last-Modified headers to the response and asks caches
+    to revalidate it on every request.
+    """
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified_response(request, etag, last_modified):
+    """
+    Returns a 304 response if the request's If-None-Match or If-Modified-Since
+    header matches the validators (or a 412 response if a precondition
+    fails), None otherwise.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
@@ -0,0 +1,88 @@
+from django.contrib.gis.geos import Polygon
+from django.contrib.gis.measure import D
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .geo import parse_bbox, parse_point, parse_radius, radius_envelopes
+
+
+def radius_prefilter(field, point, radius):
+    """
+    Returns a Q matching the rows whose `field` lies in the bounding boxes
+    covering `radius` meters around `point`, split at the antimeridian.
+    Bounding box overlaps are answered by the GiST index.
+    """
+    envelopes = Q()
+    for envelope in radius_envelopes(point, radius):
+        polygon = Polygon.from_bbox(envelope)
+        polygon.srid = 4326
+        envelopes |= Q(**{f'{field}__bboverlaps': polygon})
+    return envelopes
+
+
+def within_radius(queryset, field, point, radius):
+    """
+    Filters the queryset to rows whose `field` lies within `radius` meters of `point`.
+
+    The `radius_prefilter` boxes use the GiST index; `distance_lte` then
+    applies the exact spherical distance in meters.
+    """
+    return queryset.filter(radius_prefilter(field, point, radius), **{f'{field}__distance_lte': (point, D(m=radius))})
+
+
+def parse_since(value):
+    """
+    Parses an ISO 8601 timestamp, in the current time zone if it has no offset.
+    Raises ValueError if the value is not a valid timestamp.
+    """
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        since = None
+    if since is None:
+        raise ValueError('since must be an ISO 8601 timestamp')
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def filter_updated(queryset, query_params):
+    """
+    Applies the `since` query param, keeping the rows updated after it.
+    """
+    since = query_params.get('since')
+    if since:
+        queryset = queryset.filter(updated_at__gt=parse_since(since))
+    return queryset
+
+
+def filter_locations(queryset, query_params):
+    """
+    Applies the `bbox`, `near` + `radius` and `since` query params to a Location queryset.
+    Raises ValueError on invalid parameters.
+    """
+    queryset = filter_updated(queryset, query_params)
+    bbox = query_params.get('bbox')
+    if bbox:
+        queryset = queryset.filter(coordinates__bboverlaps=parse_bbox(bbox))
+    near = query_params.get('near')
+    if near:
+        point = parse_point(near)
+        radius = parse_radius(query_params.get('radius'))
+        queryset = within_radius(queryset, 'coordinates', point, radius)
+    elif query_params.get('radius'):
+        raise ValueError('radius requires near')
+    return queryset
+
+
+def filter_boundaries(queryset, query_params):
+    """
+    Applies the `bbox` and `since` query params to a Boundary queryset.
+    Raises ValueError on invalid parameters.
+    """
+    queryset = filter_updated(queryset, query_params)
+    bbox = query_params.get('bbox')
+    if bbox:
+        queryset = queryset.filter(area__bboverlaps=parse_bbox(bbox))
+    return queryset
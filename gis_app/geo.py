@@ -0,0 +1,136 @@
+import math
+
+import numpy as np
+from django.contrib.gis.geos import Point, Polygon
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = EARTH_RADIUS_M * math.pi / 180
+MAX_PRECISION = 15
+
+
+def parse_floats(value, count, name):
+    """
+    Parses a comma separated list of exactly `count` floats.
+    Raises ValueError with a message naming the query parameter on bad input.
+    """
+    try:
+        numbers = [float(part) for part in str(value).split(',')]
+    except ValueError:
+        raise ValueError(f'{name} must be {count} comma separated numbers')
+    if len(numbers) != count or not all(math.isfinite(n) for n in numbers):
+        raise ValueError(f'{name} must be {count} comma separated numbers')
+    return numbers
+
+
+def check_lon_lat(lon, lat, name):
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        raise ValueError(f'{name} is outside the valid longitude/latitude range')
+
+
+def parse_point(value, name='near'):
+    """
+    Parses `lon,lat` into a Point in SRID 4326.
+    """
+    lon, lat = parse_floats(value, 2, name)
+    check_lon_lat(lon, lat, name)
+    return Point(lon, lat, srid=4326)
+
+
+def parse_bbox(value, name='bbox'):
+    """
+    Parses `min_lon,min_lat,max_lon,max_lat` into a Polygon in SRID 4326.
+    """
+    min_lon, min_lat, max_lon, max_lat = parse_floats(value, 4, name)
+    check_lon_lat(min_lon, min_lat, name)
+    check_lon_lat(max_lon, max_lat, name)
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError(f'{name} minimum must not be greater than its maximum')
+    polygon = Polygon.from_bbox((min_lon, min_lat, max_lon, max_lat))
+    polygon.srid = 4326
+    return polygon
+
+
+def parse_radius(value, name='radius'):
+    """
+    Parses a positive radius in meters.
+    """
+    try:
+        radius = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number of meters')
+    if not math.isfinite(radius) or radius <= 0:
+        raise ValueError(f'{name} must be a positive number of meters')
+    return radius
+
+
+def parse_tolerance(value, name='simplify'):
+    """
+    Parses a positive simplification tolerance in degrees.
+    """
+    try:
+        tolerance = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number of degrees')
+    if not math.isfinite(tolerance) or tolerance <= 0:
+        raise ValueError(f'{name} must be a positive number of degrees')
+    return tolerance
+
+
+def parse_precision(value, name='precision'):
+    """
+    Parses a number of decimal digits between 0 and MAX_PRECISION.
+    """
+    try:
+        precision = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer number of digits')
+    if not 0 <= precision <= MAX_PRECISION:
+        raise ValueError(f'{name} must be between 0 and {MAX_PRECISION}')
+    return precision
+
+
+def degrees_for_meters(meters, latitude):
+    """
+    Returns a planar distance in degrees that covers every point within
+    `meters` of a point at `latitude`.
+
+    Used to build the index-backed prefilter boxes of `radius_envelopes`;
+    the exact distance is checked afterwards.
+    """
+    lat_delta = meters / METERS_PER_DEGREE
+    max_lat = abs(latitude) + lat_delta
+    if max_lat >= 89:
+        return 360.0
+    return lat_delta / math.cos(math.radians(max_lat)) * 1.01
+
+
+def radius_envelopes(point, meters):
+    """
+    Returns the (min_lon, min_lat, max_lon, max_lat) boxes covering every point
+    within `meters` of a point in SRID 4326. A box crossing the antimeridian
+    is split into one box on either side of it.
+    """
+    lat_delta = meters / METERS_PER_DEGREE * 1.01
+    min_lat, max_lat = max(point.y - lat_delta, -90.0), min(point.y + lat_delta, 90.0)
+    degrees = degrees_for_meters(meters, point.y)
+    if degrees >= 180:
+        return [(-180.0, min_lat, 180.0, max_lat)]
+    min_lon, max_lon = point.x - degrees, point.x + degrees
+    if min_lon < -180:
+        return [(min_lon + 360, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+    if max_lon > 180:
+        return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon - 360, max_lat)]
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+
+def haversine_matrix(origins, destinations):
+    """
+    Returns the N x M matrix of great-circle distances in meters between
+    N origin and M destination (lon, lat) pairs, computed in one vectorized pass.
+    """
+    origins = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+    destinations = np.radians(np.asarray(destinations, dtype=float).reshape(-1, 2))
+    lon1, lat1 = origins[:, 0, None], origins[:, 1, None]
+    lon2, lat2 = destinations[None, :, 0], destinations[None, :, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
@@ -0,0 +1,183 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db.models import Max
+
+from .models import Location, Boundary, ChangeEvent
+from .spatial_index import KDTree, STRTree, chord_to_meters, unit_vector
+
+# Changes are applied to the indexes one by one, until this many are
+# pending; above it the indexes are rebuilt from the tables.
+MAX_INCREMENTAL_CHANGES = 10000
+# Objects changed since the trees were built are checked linearly, and the
+# trees are rebuilt when they exceed this share of the indexed objects.
+MAX_DELTA_RATIO = 0.01
+MIN_DELTA_SIZE = 256
+
+
+class ReverseGeocoder:
+    """
+    In-process index answering which boundaries contain a point and which
+    locations are nearest to it, without querying the database.
+
+    Boundaries are indexed by their envelope in an STRTree and tested with
+    their prepared area, locations are indexed in a KDTree. Both are loaded
+    on first use and kept current from the change log: a lookup first
+    applies the change events written since the last refresh, at most every
+    `refresh_interval` seconds, or immediately after a write in this process.
+    Objects changed since the trees were built are kept in a small delta
+    that is searched linearly, until the trees are rebuilt.
+    """
+
+    def __init__(self, refresh_interval=1.0):
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.seq = None
+        self.next_refresh = 0
+
+    def mark_stale(self):
+        """
+        Makes the next lookup apply the latest changes first.
+        """
+        self.next_refresh = 0
+
+    def reset(self):
+        """
+        Makes the next lookup load the indexes from scratch.
+        """
+        with self.lock:
+            self.seq = None
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.seq is not None and now < self.next_refresh:
+            return
+        if self.seq is None:
+            self.load()
+        else:
+            events = list(
+                ChangeEvent.objects.filter(seq__gt=self.seq).order_by('seq')
+                .values_list('seq', 'model', 'object_id')[:MAX_INCREMENTAL_CHANGES + 1]
+            )
+            if len(events) > MAX_INCREMENTAL_CHANGES:
+                self.load()
+            elif events:
+                self.apply(events)
+        self.next_refresh = now + self.refresh_interval
+
+    def load(self):
+        """
+        Reads all boundaries and locations and builds the trees.
+        Changes written while reading are applied again by the next refresh.
+        """
+        self.seq = ChangeEvent.objects.aggregate(seq=Max('seq'))['seq'] or 0
+        self.boundaries = {}
+        for boundary_id, name, area in Boundary.objects.values_list('id', 'name', 'area').iterator(chunk_size=1000):
+            self.set_boundary(boundary_id, name, area)
+        self.locations = {}
+        for location_id, name, point in Location.objects.values_list('id', 'name', 'coordinates').iterator(chunk_size=10000):
+            self.locations[location_id] = (name, point.x, point.y)
+        self.build_boundary_tree()
+        self.build_location_tree()
+
+    def set_boundary(self, boundary_id, name, area):
+        self.boundaries[boundary_id] = (name, area.extent, area.prepared)
+
+    def build_boundary_tree(self):
+        self.boundary_tree = STRTree((boundary_id, extent) for boundary_id, (_, extent, _) in self.boundaries.items())
+        self.boundary_delta = set()
+
+    def build_location_tree(self):
+        self.location_tree = KDTree((location_id, lon, lat) for location_id, (_, lon, lat) in self.locations.items())
+        self.location_delta = set()
+
+    def apply(self, events):
+        """
+        Re-reads the objects named by the change events and updates the indexes.
+        """
+        changed = {ChangeEvent.LOCATION: set(), ChangeEvent.BOUNDARY: set()}
+        for _, model, object_id in events:
+            changed[model].add(object_id)
+        self.seq = events[-1][0]
+
+        boundary_ids = changed[ChangeEvent.BOUNDARY]
+        for boundary_id in boundary_ids:
+            self.boundaries.pop(boundary_id, None)
+        for boundary_id, name, area in Boundary.objects.filter(id__in=boundary_ids).values_list('id', 'name', 'area'):
+            self.set_boundary(boundary_id, name, area)
+        self.boundary_delta |= boundary_ids
+        if len(self.boundary_delta) > max(MIN_DELTA_SIZE, MAX_DELTA_RATIO * len(self.boundaries)):
+            self.build_boundary_tree()
+
+        location_ids = changed[ChangeEvent.LOCATION]
+        for location_id in location_ids:
+            self.locations.pop(location_id, None)
+        for location_id, name, point in Location.objects.filter(id__in=location_ids).values_list('id', 'name', 'coordinates'):
+            self.locations[location_id] = (name, point.x, point.y)
+        self.location_delta |= location_ids
+        if len(self.location_delta) > max(MIN_DELTA_SIZE, MAX_DELTA_RATIO * len(self.locations)):
+            self.build_location_tree()
+
+    def containing_boundaries(self, lon, lat):
+        """
+        Returns the (id, name) of the boundaries containing the point, sorted by id.
+        """
+        point = None
+        found = []
+        candidates = set(self.boundary_tree.query(lon, lat)) | self.boundary_delta
+        for boundary_id in sorted(candidates):
+            boundary = self.boundaries.get(boundary_id)
+            if boundary is None:
+                continue
+            name, (min_x, min_y, max_x, max_y), prepared = boundary
+            if min_x <= lon <= max_x and min_y <= lat <= max_y:
+                point = point or Point(lon, lat)
+                if prepared.contains(point):
+                    found.append((boundary_id, name))
+        return found
+
+    def nearest_locations(self, lon, lat, k):
+        """
+        Returns up to `k` (distance in meters, id, name) of the nearest locations.
+        """
+        # Changed locations are indexed at their old position (or not at all),
+        # so their tree entries are dropped and their current positions added.
+        pairs = self.location_tree.nearest(lon, lat, k, exclude=self.location_delta)
+        target = unit_vector(lon, lat)
+        for location_id in self.location_delta:
+            location = self.locations.get(location_id)
+            if location is not None:
+                chord = math.dist(target, unit_vector(location[1], location[2]))
+                pairs.append((chord_to_meters(chord), location_id))
+        return [
+            (distance, location_id, self.locations[location_id][0])
+            for distance, location_id in sorted(pairs)[:k]
+        ]
+
+    def lookup(self, points, k):
+        """
+        Returns, for every (lon, lat) point, the boundaries containing it and
+        its `k` nearest locations.
+        """
+        with self.lock:
+            self.refresh()
+            return [
+                {
+                    'point': [lon, lat],
+                    'boundaries': [
+                        {'id': boundary_id, 'name': name}
+                        for boundary_id, name in self.containing_boundaries(lon, lat)
+                    ],
+                    'nearest': [
+                        {'id': location_id, 'name': name, 'distance': distance}
+                        for distance, location_id, name in self.nearest_locations(lon, lat, k)
+                    ],
+                }
+                for lon, lat in points
+            ]
+
+
+reverse_geocoder = ReverseGeocoder(refresh_interval=getattr(settings, 'GEOCODER_REFRESH_INTERVAL', 1.0))
@@ -0,0 +1,138 @@
+import json
+
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STREAM_CHUNK_SIZE = 2000
+GEOJSON_PRECISION = 8
+GEOJSON_CONTENT_TYPE = 'application/geo+json'
+
+
+def dumps(value):
+    """
+    Encodes a value as compact JSON bytes, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_UTC_Z)
+    return json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+class FeatureReader:
+    """
+    Reads a queryset as encoded GeoJSON Features without building model instances.
+
+    The geometry is rendered by the database with ST_AsGeoJSON and spliced into
+    the output as is; only the few scalar properties go through the JSON encoder.
+    """
+
+    def __init__(self, geometry_field, properties, precision=GEOJSON_PRECISION):
+        self.geometry_field = geometry_field
+        self.properties = properties
+        self.precision = precision
+
+    def configure(self, geometry_field=None, precision=None):
+        """
+        Returns a copy of the reader reading another geometry field or annotation,
+        or writing coordinates with another number of decimal digits.
+        """
+        return FeatureReader(
+            geometry_field or self.geometry_field, self.properties,
+            self.precision if precision is None else precision
+        )
+
+    def rows(self, queryset):
+        """
+        Returns the queryset as (pk, *properties, geojson) tuples.
+        """
+        return queryset.annotate(
+            geojson=AsGeoJSON(self.geometry_field, precision=self.precision)
+        ).values_list('pk', *self.properties, 'geojson')
+
+    def encode(self, row):
+        pk, *values, geometry = row
+        properties = dumps(dict(zip(self.properties, values)))
+        geometry = geometry.encode('utf-8') if geometry else b'null'
+        return b'{"type":"Feature","id":%d,"geometry":%s,"properties":%s}' % (pk, geometry, properties)
+
+    def iter_collection(self, queryset, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Yields a GeoJSON FeatureCollection as byte chunks.
+
+        Rows are read through a server-side cursor in primary key order, so only
+        one chunk of rows is held in memory at a time.
+        """
+        yield b'{"type":"FeatureCollection","features":['
+        buffer = []
+        separator = b''
+        for row in self.rows(queryset.order_by('pk')).iterator(chunk_size=chunk_size):
+            buffer.append(self.encode(row))
+            if len(buffer) >= chunk_size:
+                yield separator + b','.join(buffer)
+                separator = b','
+                buffer = []
+        if buffer:
+            yield separator + b','.join(buffer)
+        yield b']}'
+
+    async def aiter_collection(self, queryset, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Async version of `iter_collection`, for streaming responses of async views.
+        """
+        yield b'{"type":"FeatureCollection","features":['
+        buffer = []
+        separator = b''
+        async for row in self.rows(queryset.order_by('pk')).aiterator(chunk_size=chunk_size):
+            buffer.append(self.encode(row))
+            if len(buffer) >= chunk_size:
+                yield separator + b','.join(buffer)
+                separator = b','
+                buffer = []
+        if buffer:
+            yield separator + b','.join(buffer)
+        yield b']}'
+
+    def collection(self, rows, **members):
+        """
+        Returns the already fetched rows as an encoded FeatureCollection,
+        with `members` added as extra top level keys.
+        """
+        extra = b''.join(b',%s:%s' % (dumps(key), dumps(value)) for key, value in members.items())
+        features = b','.join(self.encode(row) for row in rows)
+        return b'{"type":"FeatureCollection","features":[%s]%s}' % (features, extra)
+
+
+location_features = FeatureReader('coordinates', ('name', 'description', 'created_at', 'updated_at'))
+boundary_features = FeatureReader('area', ('name', 'created_at', 'updated_at'))
+
+
+def stream_feature_collection(queryset, features, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Returns a streaming response that writes the queryset as a GeoJSON FeatureCollection.
+    """
+    return StreamingHttpResponse(
+        features.iter_collection(queryset, chunk_size),
+        content_type=GEOJSON_CONTENT_TYPE
+    )
+
+
+def astream_feature_collection(queryset, features, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Async version of `stream_feature_collection`.
+    """
+    return StreamingHttpResponse(
+        features.aiter_collection(queryset, chunk_size),
+        content_type=GEOJSON_CONTENT_TYPE
+    )
+
+
+def feature_collection_response(rows, features, **members):
+    """
+    Returns a response with the rows encoded as a GeoJSON FeatureCollection.
+    """
+    return HttpResponse(features.collection(rows, **members), content_type=GEOJSON_CONTENT_TYPE)
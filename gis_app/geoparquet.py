@@ -0,0 +1,278 @@
+import json
+
+from django.contrib.gis.db.models.functions import Centroid, GeoHash
+from django.contrib.gis.geos import GEOSException, GEOSGeometry
+from django.db import transaction
+
+from .models import Location, Boundary
+from . import hooks
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+GEOPARQUET_VERSION = '1.1.0'
+PARQUET_CONTENT_TYPE = 'application/vnd.apache.parquet'
+ROW_GROUP_SIZE = 50000
+IMPORT_BATCH_SIZE = 5000
+BBOX_FIELDS = ('xmin', 'ymin', 'xmax', 'ymax')
+
+
+class ParquetUnavailable(Exception):
+    pass
+
+
+def require_pyarrow():
+    if pyarrow is None:
+        raise ParquetUnavailable('GeoParquet export and import require pyarrow, install it with `pip install pyarrow`')
+
+
+class ChunkSink:
+    """
+    Write-only file object collecting what the Parquet writer wrote since
+    the last `drain`, so a file can be streamed one row group at a time.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ParquetLayer:
+    """
+    Reads and writes a model as GeoParquet: one row per object with its
+    `properties` as (name, 'string' or 'timestamp') pairs, the geometry as
+    WKB and a `bbox` covering column. Imports read back the `fields` columns.
+
+    Rows are written in geohash order, so every row group covers a small
+    area and its bbox column statistics let readers skip the row groups
+    outside the area they want without decoding them.
+    """
+
+    def __init__(self, model, geometry_field, geometry_type, properties, fields, written_hook):
+        self.model = model
+        self.geometry_field = geometry_field
+        self.geometry_type = geometry_type
+        self.properties = properties
+        self.fields = fields
+        self.written_hook = written_hook
+
+    def schema(self):
+        types = {'string': pyarrow.string(), 'timestamp': pyarrow.timestamp('us', tz='UTC')}
+        columns = [('id', pyarrow.int64())]
+        columns += [(name, types[column_type]) for name, column_type in self.properties]
+        columns.append(('geometry', pyarrow.binary()))
+        columns.append(('bbox', pyarrow.struct([(name, pyarrow.float64()) for name in BBOX_FIELDS])))
+        geo = {
+            'version': GEOPARQUET_VERSION,
+            'primary_column': 'geometry',
+            'columns': {
+                'geometry': {
+                    'encoding': 'WKB',
+                    'geometry_types': [self.geometry_type],
+                    'covering': {'bbox': {name: ['bbox', name] for name in BBOX_FIELDS}},
+                },
+            },
+        }
+        return pyarrow.schema(columns, metadata={'geo': json.dumps(geo)})
+
+    def batches(self, queryset, row_group_size=ROW_GROUP_SIZE):
+        """
+        Yields the queryset as record batches of `row_group_size` rows, read
+        through a server-side cursor in geohash order.
+        """
+        schema = self.schema()
+        rows = queryset.order_by(GeoHash(Centroid(self.geometry_field))).values_list(
+            'pk', *[name for name, _ in self.properties], self.geometry_field
+        ).iterator(chunk_size=row_group_size)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= row_group_size:
+                yield self.record_batch(batch, schema)
+                batch = []
+        if batch:
+            yield self.record_batch(batch, schema)
+
+    def record_batch(self, rows, schema):
+        columns = [list(column) for column in zip(*rows)]
+        geometries = columns.pop()
+        extents = [geometry.extent for geometry in geometries]
+        arrays = [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)]
+        arrays.append(pyarrow.array([bytes(geometry.wkb) for geometry in geometries], type=pyarrow.binary()))
+        arrays.append(pyarrow.StructArray.from_arrays(
+            [pyarrow.array(values, type=pyarrow.float64()) for values in zip(*extents)], names=BBOX_FIELDS
+        ))
+        return pyarrow.record_batch(arrays, schema=schema)
+
+    def write(self, queryset, file, row_group_size=ROW_GROUP_SIZE):
+        """
+        Writes the queryset to a path or file object. Returns the number of rows.
+        """
+        require_pyarrow()
+        count = 0
+        with pyarrow.parquet.ParquetWriter(file, self.schema()) as writer:
+            for batch in self.batches(queryset, row_group_size):
+                writer.write_batch(batch)
+                count += batch.num_rows
+        return count
+
+    def iter_file(self, queryset, row_group_size=ROW_GROUP_SIZE):
+        """
+        Yields the GeoParquet file of the queryset as byte chunks, one per row group.
+        """
+        require_pyarrow()
+        sink = ChunkSink()
+        with pyarrow.parquet.ParquetWriter(sink, self.schema()) as writer:
+            for batch in self.batches(queryset, row_group_size):
+                writer.write_batch(batch)
+                yield sink.drain()
+        yield sink.drain()
+
+    def read(self, source, extent=None, batch_size=IMPORT_BATCH_SIZE):
+        """
+        Yields (objects, skipped) for every `batch_size` rows of a GeoParquet
+        path or file object, as unsaved model instances and the number of rows
+        whose geometry is missing or not of the layer's type.
+
+        With an `extent` only the rows whose bbox overlaps it are read, and
+        row groups outside of it are skipped using the column statistics.
+        """
+        require_pyarrow()
+        parquet_file = pyarrow.parquet.ParquetFile(source)
+        geometry_column = primary_column(parquet_file)
+        for index in row_groups(parquet_file, extent):
+            table = parquet_file.read_row_group(index)
+            if extent is not None:
+                table = filter_extent(table, geometry_column, extent)
+            for batch in table.to_batches(max_chunksize=batch_size):
+                yield self.objects(batch.to_pydict(), geometry_column)
+
+    def objects(self, columns, geometry_column):
+        objects = []
+        skipped = 0
+        for index, wkb in enumerate(columns[geometry_column]):
+            try:
+                geometry = GEOSGeometry(memoryview(wkb), srid=4326) if wkb is not None else None
+            except (GEOSException, ValueError):
+                geometry = None
+            if geometry is None or geometry.geom_type != self.geometry_type:
+                skipped += 1
+                continue
+            values = {name: columns[name][index] or '' for name in self.fields if name in columns}
+            objects.append(self.model(**values, **{self.geometry_field: geometry}))
+        return objects, skipped
+
+
+def primary_column(parquet_file):
+    """
+    Returns the name of the primary geometry column from the 'geo' file metadata.
+    """
+    metadata = parquet_file.schema_arrow.metadata or {}
+    try:
+        return json.loads(metadata[b'geo'])['primary_column']
+    except (KeyError, ValueError):
+        return 'geometry'
+
+
+def row_groups(parquet_file, extent):
+    """
+    Returns the indexes of the row groups whose bbox statistics overlap the
+    extent, or of all row groups if there is no extent or no bbox column.
+    """
+    metadata = parquet_file.metadata
+    if extent is None:
+        return list(range(metadata.num_row_groups))
+    paths = {metadata.schema.column(i).path: i for i in range(metadata.num_columns)}
+    if not all(f'bbox.{name}' in paths for name in BBOX_FIELDS):
+        return list(range(metadata.num_row_groups))
+    west, south, east, north = extent
+    indexes = []
+    for index in range(metadata.num_row_groups):
+        group = metadata.row_group(index)
+        statistics = {name: group.column(paths[f'bbox.{name}']).statistics for name in BBOX_FIELDS}
+        if not all(stats is not None and stats.has_min_max for stats in statistics.values()):
+            indexes.append(index)
+        elif not (statistics['xmin'].min > east or statistics['xmax'].max < west
+                  or statistics['ymin'].min > north or statistics['ymax'].max < south):
+            indexes.append(index)
+    return indexes
+
+
+def filter_extent(table, geometry_column, extent):
+    """
+    Keeps the rows of a table whose bbox overlaps the extent. The bbox is
+    read from the covering column, or computed from the geometry without one.
+    """
+    west, south, east, north = extent
+    if 'bbox' in table.column_names:
+        bbox = table.column('bbox').combine_chunks()
+        xmin, ymin, xmax, ymax = (bbox.field(name) for name in BBOX_FIELDS)
+        compute = pyarrow.compute
+        mask = compute.and_(
+            compute.and_(compute.less_equal(xmin, east), compute.greater_equal(xmax, west)),
+            compute.and_(compute.less_equal(ymin, north), compute.greater_equal(ymax, south)),
+        )
+    else:
+        mask = []
+        for wkb in table.column(geometry_column).to_pylist():
+            try:
+                x0, y0, x1, y1 = GEOSGeometry(memoryview(wkb)).extent
+            except (GEOSException, TypeError, ValueError):
+                mask.append(False)
+                continue
+            mask.append(x0 <= east and x1 >= west and y0 <= north and y1 >= south)
+    return table.filter(pyarrow.array(mask, type=pyarrow.bool_()))
+
+
+def import_file(layer, source, extent=None, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Creates the objects of a GeoParquet file, one transaction per batch.
+    Returns (created, skipped). `progress` is called with both after every batch.
+    """
+    created = skipped = 0
+    for objects, invalid in layer.read(source, extent, batch_size):
+        with transaction.atomic():
+            objects = layer.model.objects.bulk_create(objects)
+            layer.written_hook(objects)
+        created += len(objects)
+        skipped += invalid
+        if progress:
+            progress(created, skipped)
+    return created, skipped
+
+
+location_layer = ParquetLayer(
+    Location, 'coordinates', 'Point',
+    (('name', 'string'), ('description', 'string'), ('created_at', 'timestamp'), ('updated_at', 'timestamp')),
+    ('name', 'description'), hooks.locations_written
+)
+boundary_layer = ParquetLayer(
+    Boundary, 'area', 'Polygon',
+    (('name', 'string'), ('created_at', 'timestamp'), ('updated_at', 'timestamp')),
+    ('name',), hooks.boundaries_written
+)
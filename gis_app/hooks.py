@@ -0,0 +1,70 @@
+from django.db import transaction
+
+from .cache import tile_cache, aggregate_cache
+from .simplification import refresh_simplifications
+from .subdivision import refresh_pieces
+from .membership import refresh_location_memberships, refresh_boundary_memberships
+from .clusters import update_clusters
+from .changes import record_changes
+from .geocoder import reverse_geocoder
+from .models import ChangeEvent
+
+# The hooks run in the transaction of the write, so the change events and the
+# derived tables commit or roll back together with the rows. The in-process
+# caches are only invalidated once that transaction committed.
+
+
+def invalidate_on_commit(layer, geometries):
+    """
+    Invalidates the tiles of the layer around the geometries, the aggregates
+    and the reverse geocoder once the current transaction committed.
+    """
+    def invalidate():
+        tile_cache.invalidate(layer, geometries)
+        aggregate_cache.invalidate()
+        reverse_geocoder.mark_stale()
+    transaction.on_commit(invalidate)
+
+
+def locations_written(locations, previous_coordinates=()):
+    """
+    Runs the side effects of creating or updating locations.
+    `previous_coordinates` are the points the locations had before an update,
+    and are empty for new locations.
+    """
+    action = ChangeEvent.UPDATE if previous_coordinates else ChangeEvent.CREATE
+    record_changes(ChangeEvent.LOCATION, action, [location.pk for location in locations])
+    refresh_location_memberships([location.pk for location in locations])
+    update_clusters(added=[location.coordinates for location in locations], removed=previous_coordinates)
+    invalidate_on_commit('locations', [location.coordinates for location in locations] + list(previous_coordinates))
+
+
+def locations_deleted(deleted):
+    """
+    Runs the side effects of deleting locations, given as (id, coordinates) pairs.
+    """
+    record_changes(ChangeEvent.LOCATION, ChangeEvent.DELETE, [pk for pk, _ in deleted])
+    update_clusters(removed=[coordinates for _, coordinates in deleted])
+    invalidate_on_commit('locations', [coordinates for _, coordinates in deleted])
+
+
+def boundaries_written(boundaries, previous_areas=()):
+    """
+    Runs the side effects of creating or updating boundaries.
+    `previous_areas` are the polygons the boundaries had before an update,
+    and are empty for new boundaries.
+    """
+    action = ChangeEvent.UPDATE if previous_areas else ChangeEvent.CREATE
+    record_changes(ChangeEvent.BOUNDARY, action, [boundary.pk for boundary in boundaries])
+    refresh_simplifications(boundaries)
+    refresh_pieces(boundaries)
+    refresh_boundary_memberships([boundary.pk for boundary in boundaries])
+    invalidate_on_commit('boundaries', [boundary.area for boundary in boundaries] + list(previous_areas))
+
+
+def boundaries_deleted(deleted):
+    """
+    Runs the side effects of deleting boundaries, given as (id, area) pairs.
+    """
+    record_changes(ChangeEvent.BOUNDARY, ChangeEvent.DELETE, [pk for pk, _ in deleted])
+    invalidate_on_commit('boundaries', [area for _, area in deleted])
@@ -0,0 +1,68 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from gis_app.models import Location, Boundary
+from gis_app.serializers import LocationSerializer, BoundarySerializer
+from gis_app.geojson import location_features, boundary_features, orjson
+
+MODELS = {
+	'locations': (Location, LocationSerializer, location_features),
+	'boundaries': (Boundary, BoundarySerializer, boundary_features),
+}
+
+
+def best_time(function, repeat):
+	"""
+	Returns the fastest of `repeat` runs of the function in seconds, and its last result.
+	"""
+	best = None
+	for _ in range(repeat):
+		started = time.perf_counter()
+		result = function()
+		elapsed = time.perf_counter() - started
+		best = elapsed if best is None else min(best, elapsed)
+	return best, result
+
+
+class Command(BaseCommand):
+	help = 'Compare the time to render list responses with the model serializers and with the GeoJSON read path'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--model', choices=sorted(MODELS), action='append',
+			help='Model to benchmark, may be repeated (default: all)')
+		parser.add_argument('--limit', type=int,
+			help='Number of rows to render (default: all rows)')
+		parser.add_argument('--repeat', type=int, default=3,
+			help='Number of runs of each path, the fastest one is reported')
+
+	def handle(self, *args, **options):
+		if options['repeat'] < 1:
+			raise CommandError('--repeat must be a positive integer')
+		if options['limit'] is not None and options['limit'] < 1:
+			raise CommandError('--limit must be a positive integer')
+		self.stdout.write(f'JSON encoder: {"orjson" if orjson is not None else "json"}')
+		for name in options['model'] or sorted(MODELS):
+			model, serializer_class, features = MODELS[name]
+			queryset = model.objects.order_by('pk')
+			rows_queryset = features.rows(queryset)
+			if options['limit']:
+				queryset = queryset[:options['limit']]
+				rows_queryset = rows_queryset[:options['limit']]
+
+			serializer_time, content = best_time(
+				lambda: JSONRenderer().render(serializer_class(queryset.all(), many=True).data),
+				options['repeat'])
+			geojson_time, geojson_content = best_time(
+				lambda: features.collection(rows_queryset.all()),
+				options['repeat'])
+
+			rows = queryset.count()
+			self.stdout.write(f'{name}: {rows} rows')
+			self.report('serializer', rows, serializer_time, content)
+			self.report('geojson', rows, geojson_time, geojson_content)
+			if geojson_time:
+				self.stdout.write(self.style.SUCCESS(f'  geojson is {serializer_time / geojson_time:.1f}x faster'))
+
+	def report(self, label, rows, seconds, content):
+		rate = rows / seconds if seconds else 0
+		self.stdout.write(f'  {label:<10} {seconds * 1000:10.1f} ms {rate:12.0f} rows/sec {len(content):12d} bytes')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from gis_app.filters import filter_locations, filter_boundaries
+from gis_app.geoparquet import ROW_GROUP_SIZE, ParquetUnavailable, location_layer, boundary_layer
+
+LAYERS = {
+	'location': (location_layer, filter_locations),
+	'boundary': (boundary_layer, filter_boundaries),
+}
+
+
+class Command(BaseCommand):
+	help = 'Export locations or boundaries to a GeoParquet file'
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help='GeoParquet file to write')
+		parser.add_argument('--model', choices=sorted(LAYERS), default='location',
+			help='Model to export')
+		parser.add_argument('--bbox',
+			help='Only export the objects overlapping min_lon,min_lat,max_lon,max_lat')
+		parser.add_argument('--row-group-size', type=int, default=ROW_GROUP_SIZE,
+			help='Number of rows per row group, read from the database at a time')
+
+	def handle(self, *args, **options):
+		if options['row_group_size'] < 1:
+			raise CommandError('--row-group-size must be a positive integer')
+		layer, filter_queryset = LAYERS[options['model']]
+		try:
+			queryset = filter_queryset(layer.model.objects.all(), {'bbox': options['bbox']})
+			count = layer.write(queryset, options['path'], options['row_group_size'])
+		except (ParquetUnavailable, ValueError, OSError) as e:
+			raise CommandError(str(e))
+		self.stdout.write(self.style.SUCCESS(f'Successfully exported {count} objects to {options["path"]}'))
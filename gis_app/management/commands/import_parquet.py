@@ -0,0 +1,45 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from gis_app.geo import parse_bbox
+from gis_app.geoparquet import IMPORT_BATCH_SIZE, ParquetUnavailable, import_file, location_layer, boundary_layer
+
+LAYERS = {
+	'location': location_layer,
+	'boundary': boundary_layer,
+}
+
+
+class Command(BaseCommand):
+	help = 'Import locations or boundaries from a GeoParquet file'
+
+	def add_arguments(self, parser):
+		parser.add_argument('path', help='GeoParquet file to read')
+		parser.add_argument('--model', choices=sorted(LAYERS), default='location',
+			help='Model to import')
+		parser.add_argument('--bbox',
+			help='Only import the rows overlapping min_lon,min_lat,max_lon,max_lat, '
+				'skipping the row groups outside of it')
+		parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+			help='Number of rows inserted per transaction')
+
+	def handle(self, *args, **options):
+		if options['batch_size'] < 1:
+			raise CommandError('--batch-size must be a positive integer')
+		if not os.path.isfile(options['path']):
+			raise CommandError(f'Cannot open {options["path"]}: no such file')
+		self.started = time.monotonic()
+		try:
+			extent = parse_bbox(options['bbox']).extent if options['bbox'] else None
+			created, skipped = import_file(
+				LAYERS[options['model']], options['path'], extent, options['batch_size'], self.report
+			)
+		except (ParquetUnavailable, ValueError, OSError) as e:
+			raise CommandError(str(e))
+		self.stdout.write(self.style.SUCCESS(
+			f'Successfully imported {options["path"]}: {created} created, {skipped} skipped without a valid geometry'
+		))
+
+	def report(self, created, skipped):
+		elapsed = time.monotonic() - self.started
+		self.stdout.write(f'{created} created, {skipped} skipped ({created / elapsed:.0f} rows/sec)')
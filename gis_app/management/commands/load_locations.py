@@ -1,34 +1,301 @@
 import csv
-from django.core.management.base import BaseCommand
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+import django
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.gis.geos import Point
+from django.db import transaction
 from gis_app.models import Location
+from gis_app.spatial import existing_points
+from gis_app import hooks
+
+DEFAULT_PATH = 'locations CSV file.csv'
+DEFAULT_BATCH_SIZE = 5000
+GEOJSON_SUFFIXES = ('.geojson', '.json')
+GEOJSON_LINES_SUFFIXES = ('.geojsonl', '.geojsons', '.ndjson')
+
+
+class OffsetLines:
+	"""
+	Iterates over the decoded lines of a file opened in binary mode,
+	keeping the byte offset after the last line read in `offset`.
+	"""
+
+	def __init__(self, file, encoding='utf-8'):
+		self.file = file
+		self.encoding = encoding
+		self.offset = file.tell()
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		line = self.file.readline()
+		if not line:
+			raise StopIteration
+		self.offset += len(line)
+		return line.decode(self.encoding)
+
+
+def open_records(path, offset=None):
+	"""
+	Yields (record, offset) for the records of a CSV, GeoJSON or newline-delimited
+	GeoJSON file, where the record is a dict with name, description, latitude and
+	longitude keys and `offset` is the byte offset after it. Reading starts at
+	`offset` when one is given.
+
+	GeoJSON files are parsed as a whole, so they must fit in memory and have no
+	offsets: their records come with a None offset. Large inputs should be
+	newline-delimited GeoJSON, which is read one line at a time.
+	"""
+	suffix = os.path.splitext(path)[1].lower()
+	if suffix in GEOJSON_SUFFIXES:
+		with open(path, 'r', encoding='utf-8') as file:
+			data = json.load(file)
+		features = data.get('features', []) if data.get('type') == 'FeatureCollection' else [data]
+		for feature in features:
+			yield feature_record(feature), None
+	elif suffix in GEOJSON_LINES_SUFFIXES:
+		with open(path, 'rb') as file:
+			file.seek(offset or 0)
+			lines = OffsetLines(file)
+			for line in lines:
+				if line.strip():
+					yield feature_record(json.loads(line)), lines.offset
+	else:
+		with open(path, 'rb') as file:
+			# The header is read first on resume too; the reader only ever pulls
+			# the lines of the next row, so `lines.offset` ends every row.
+			header = file.readline()
+			if not header.strip():
+				return
+			fieldnames = next(csv.reader([header.decode('utf-8-sig')]))
+			file.seek(max(offset or 0, file.tell()))
+			lines = OffsetLines(file)
+			for record in csv.DictReader(lines, fieldnames=fieldnames):
+				yield record, lines.offset
+
+
+def feature_record(feature):
+	properties = feature.get('properties') or {}
+	geometry = feature.get('geometry') or {}
+	coordinates = geometry.get('coordinates') if geometry.get('type') == 'Point' else None
+	longitude, latitude = coordinates[:2] if coordinates and len(coordinates) >= 2 else (None, None)
+	return {
+		'name': properties.get('name'),
+		'description': properties.get('description'),
+		'latitude': latitude,
+		'longitude': longitude,
+	}
+
+
+def parse_record(record):
+	"""
+	Returns (name, description, point) for a record.
+	Raises ValueError with a warning message for rows that cannot be loaded.
+	"""
+	if not record.get('name') or record.get('latitude') in (None, '') or record.get('longitude') in (None, ''):
+		raise ValueError(f'Skipping row with missing required data: {record}')
+	try:
+		latitude = float(record['latitude'])
+		longitude = float(record['longitude'])
+	except (TypeError, ValueError):
+		raise ValueError(f'Skipping row with invalid coordinates: {record}')
+	description = record['description'] if record.get('description') else 'No description available'
+	return record['name'], description, Point(longitude, latitude, srid=4326)
+
+
+def read_chunks(path, progress, chunk_size):
+	"""
+	Yields (progress, rows, warnings) for every `chunk_size` records of the file
+	after the checkpointed `progress`. The progress holds the number of records
+	read so far as `position` and, except for GeoJSON files, the byte offset
+	after them as `offset`, from which reading resumes without parsing the
+	records before it.
+	"""
+	skip = progress.get('position', 0)
+	offset = progress.get('offset')
+	rows, warnings = [], []
+	position = skip
+	# Without an offset, the records before `skip` are read again and dropped
+	records = open_records(path, offset)
+	if offset is None:
+		records = itertools.islice(records, skip, None)
+	for record, offset in records:
+		position += 1
+		try:
+			rows.append(parse_record(record))
+		except ValueError as e:
+			warnings.append(str(e))
+		if len(rows) + len(warnings) >= chunk_size:
+			yield {'position': position, 'offset': offset}, rows, warnings
+			rows, warnings = [], []
+	if rows or warnings:
+		yield {'position': position, 'offset': offset}, rows, warnings
+
+
+def parse_file(path, progress, chunk_size, chunks):
+	"""
+	Worker process entry point: parses a file into the bounded `chunks` queue.
+	Puts a final (path, None, None, error) message when the file is finished.
+	"""
+	try:
+		for progress, rows, warnings in read_chunks(path, progress, chunk_size):
+			chunks.put((path, progress, rows, warnings))
+	except Exception as e:
+		chunks.put((path, None, None, f'{type(e).__name__}: {e}'))
+	else:
+		chunks.put((path, None, None, None))
+
 
 class Command(BaseCommand):
-	help = 'Load locations from CSV file'
-
-	def handle(self, *args, **kwargs):
-		with open('locations CSV file.csv', 'r', encoding='utf-8-sig') as file:
-			reader = csv.DictReader(file)
-			sett = set()
-			for row in reader:
-				if not row['name'] or not row['latitude'] or not row['longitude']:
-					self.stdout.write(self.style.WARNING(f'Skipping row with missing required data: {row}'))
-					continue
+	help = 'Load locations from CSV or GeoJSON files'
+
+	def add_arguments(self, parser):
+		parser.add_argument('paths', nargs='*', default=[DEFAULT_PATH],
+			help='CSV files with name, description, latitude and longitude columns, '
+				'or GeoJSON (.geojson) and newline-delimited GeoJSON (.geojsonl, .ndjson) files of Point features. '
+				'GeoJSON files are read into memory as a whole, use newline-delimited GeoJSON for large inputs')
+		parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+			help='Number of rows inserted per transaction')
+		parser.add_argument('--workers', type=int, default=1,
+			help='Number of processes parsing files concurrently')
+		parser.add_argument('--checkpoint',
+			help='JSON file recording the progress of every file, used to resume an interrupted import')
+
+	def handle(self, *args, **options):
+		batch_size = options['batch_size']
+		workers = options['workers']
+		if batch_size < 1:
+			raise CommandError('--batch-size must be a positive integer')
+		if workers < 1:
+			raise CommandError('--workers must be a positive integer')
+		for path in options['paths']:
+			if not os.path.isfile(path):
+				raise CommandError(f'Cannot open {path}: no such file')
+
+		self.checkpoint_path = options['checkpoint']
+		self.checkpoint = self.load_checkpoint()
+		paths = []
+		for path in options['paths']:
+			if self.checkpoint.get(path, {}).get('done'):
+				self.stdout.write(f'Skipping {path}, already loaded according to the checkpoint')
+			else:
+				paths.append(path)
+
+		self.started = time.monotonic()
+		self.read = self.created = 0
+		if workers == 1:
+			for path in paths:
+				progress = self.checkpoint.get(path, {})
+				for progress, rows, warnings in read_chunks(path, progress, batch_size):
+					self.handle_chunk(path, progress, rows, warnings)
+				self.finish_file(path)
+		else:
+			self.load_parallel(paths, batch_size, workers)
+
+		self.stdout.write(self.style.SUCCESS(
+			f'Successfully loaded locations data: {self.created} created, '
+			f'{self.read - self.created} skipped as duplicates or invalid'
+		))
+
+	def load_parallel(self, paths, batch_size, workers):
+		"""
+		Parses the files in a process pool while this process writes the parsed
+		chunks to the database. The queue is bounded so parsing cannot run
+		ahead of the writes by more than a few chunks per worker.
+		"""
+		with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+			with multiprocessing.Manager() as manager:
+				chunks = manager.Queue(maxsize=workers * 2)
+				futures = [
+					pool.submit(parse_file, path, self.checkpoint.get(path, {}), batch_size, chunks)
+					for path in paths
+				]
 				try:
-					latitude = float(row['latitude'])
-					longitude = float(row['longitude'])
-				except ValueError:
-					self.stdout.write(self.style.WARNING(f'Skipping row with invalid coordinates: {row}'))
-					continue
+					self.consume_chunks(chunks, futures, set(paths))
+				except BaseException:
+					# Leaving the manager closes the queue, which unblocks and
+					# ends the parsers still waiting to put a chunk.
+					pool.shutdown(wait=False, cancel_futures=True)
+					raise
+
+	def consume_chunks(self, chunks, futures, remaining):
+		while remaining:
+			try:
+				path, progress, rows, warnings = chunks.get(timeout=1)
+			except queue.Empty:
+				for future in futures:
+					if future.done() and future.exception():
+						raise CommandError(f'A parser process failed: {future.exception()}')
+				continue
+			if progress is not None:
+				self.handle_chunk(path, progress, rows, warnings)
+				continue
+			remaining.discard(path)
+			if warnings:
+				raise CommandError(f'Failed to parse {path}: {warnings}')
+			self.finish_file(path)
 
-				coordinates = (latitude, longitude)
-				if coordinates in sett:
+	def handle_chunk(self, path, progress, rows, warnings):
+		for warning in warnings:
+			self.stdout.write(self.style.WARNING(warning))
+		self.read += len(warnings)
+		if rows:
+			self.insert_batch(rows)
+		self.save_checkpoint(path, **progress, done=False)
+
+	def finish_file(self, path):
+		progress = {key: value for key, value in self.checkpoint.get(path, {}).items() if key != 'done'}
+		self.save_checkpoint(path, **progress, done=True)
+		self.stdout.write(f'Finished {path}')
+
+	def insert_batch(self, batch):
+		"""
+		Inserts the rows of the batch whose coordinates are neither repeated
+		in the batch nor already stored, in one transaction with their hooks.
+		"""
+		self.read += len(batch)
+		with transaction.atomic():
+			seen = existing_points([(point.x, point.y) for _, _, point in batch])
+			locations = []
+			for name, description, point in batch:
+				if (point.x, point.y) in seen:
 					continue
-				sett.add(coordinates)
-				name = row['name']
-				description = row['description'] if row['description'] else 'No description available'
-				point = Point(longitude, latitude)
+				seen.add((point.x, point.y))
+				locations.append(Location(name=name, description=description, coordinates=point))
+			locations = Location.objects.bulk_create(locations)
+			hooks.locations_written(locations)
+		self.created += len(locations)
+
+		elapsed = time.monotonic() - self.started
+		self.stdout.write(f'{self.read} rows read, {self.created} created ({self.read / elapsed:.0f} rows/sec)')
 
-				Location.objects.create(name=name, description=description, coordinates=point)
+	def load_checkpoint(self):
+		if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+			return {}
+		try:
+			with open(self.checkpoint_path, 'r', encoding='utf-8') as file:
+				return json.load(file)
+		except (OSError, ValueError) as e:
+			raise CommandError(f'Cannot read checkpoint {self.checkpoint_path}: {e}')
 
-		self.stdout.write(self.style.SUCCESS('Successfully loaded locations data'))
+	def save_checkpoint(self, path, **progress):
+		"""
+		Records the progress of a file after its rows were committed.
+		A batch replayed after a crash between the commit and this write is
+		skipped by the duplicate check; its hooks committed with its rows, so
+		its change events, memberships and clusters are already stored.
+		"""
+		self.checkpoint[path] = progress
+		if not self.checkpoint_path:
+			return
+		temporary_path = self.checkpoint_path + '.tmp'
+		with open(temporary_path, 'w', encoding='utf-8') as file:
+			json.dump(self.checkpoint, file)
+		os.replace(temporary_path, self.checkpoint_path)
@@ -0,0 +1,100 @@
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(values, fraction):
+	"""
+	Returns the value below which `fraction` of the sorted values lie.
+	"""
+	if not values:
+		return 0.0
+	return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Command(BaseCommand):
+	help = 'Send concurrent GET requests to a URL and report throughput and latency'
+
+	def add_arguments(self, parser):
+		parser.add_argument('url',
+			help='URL to request, e.g. http://127.0.0.1:8000/api/async/locations/?bbox=77,28,78,29')
+		parser.add_argument('--requests', type=int, default=1000,
+			help='Total number of requests')
+		parser.add_argument('--concurrency', type=int, default=50,
+			help='Number of requests in flight at the same time')
+		parser.add_argument('--timeout', type=float, default=30,
+			help='Timeout of every request in seconds')
+		parser.add_argument('--username',
+			help='Log in through /login/ first and send the session cookie with every request')
+		parser.add_argument('--password',
+			help='Password of --username')
+		parser.add_argument('--jwt', action='store_true',
+			help='Send the access token returned by /login/ instead of the session cookie')
+
+	def handle(self, *args, **options):
+		if options['requests'] < 1 or options['concurrency'] < 1:
+			raise CommandError('--requests and --concurrency must be positive integers')
+		self.url = options['url']
+		self.timeout = options['timeout']
+		self.headers = {}
+		if options['username']:
+			self.headers = self.login(options['username'], options['password'] or '', options['jwt'])
+
+		started = time.perf_counter()
+		with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+			results = list(pool.map(lambda _: self.fetch(), range(options['requests'])))
+		elapsed = time.perf_counter() - started
+
+		latencies = sorted(latency for _, latency in results)
+		statuses = Counter(status for status, _ in results)
+		self.stdout.write(f'{len(results)} requests in {elapsed:.2f} s with concurrency {options["concurrency"]}')
+		self.stdout.write(f'Throughput: {len(results) / elapsed:.1f} requests/sec')
+		self.stdout.write('Latency: ' + ', '.join(
+			f'{name} {percentile(latencies, fraction) * 1000:.1f} ms'
+			for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))
+		))
+		self.stdout.write('Status codes: ' + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str)))
+		if any(status != 200 for status in statuses):
+			self.stdout.write(self.style.WARNING('Some requests failed'))
+
+	def fetch(self):
+		"""
+		Returns the (status code or error name, latency in seconds) of one request.
+		"""
+		started = time.perf_counter()
+		try:
+			with urllib.request.urlopen(urllib.request.Request(self.url, headers=self.headers), timeout=self.timeout) as response:
+				response.read()
+				status = response.status
+		except urllib.error.HTTPError as e:
+			status = e.code
+		except (urllib.error.URLError, OSError) as e:
+			status = type(e).__name__
+		return status, time.perf_counter() - started
+
+	def login(self, username, password, jwt=False):
+		"""
+		Logs in and returns the Authorization header carrying the access token
+		if `jwt` is set, or the Cookie header carrying the session otherwise.
+		"""
+		parts = urllib.parse.urlsplit(self.url)
+		url = urllib.parse.urlunsplit((parts.scheme, parts.netloc, '/login/', '', ''))
+		data = json.dumps({'username': username, 'password': password}).encode('utf-8')
+		request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+		try:
+			with urllib.request.urlopen(request, timeout=self.timeout) as response:
+				cookies = response.headers.get_all('Set-Cookie') or []
+				body = json.loads(response.read())
+		except urllib.error.URLError as e:
+			raise CommandError(f'Cannot log in at {url}: {e}')
+		if jwt:
+			return {'Authorization': f'Bearer {body["access_token"]}'}
+		session = [cookie.split(';', 1)[0] for cookie in cookies if cookie.startswith('sessionid=')]
+		if not session:
+			raise CommandError(f'Logging in at {url} did not return a session cookie')
+		return {'Cookie': session[0]}
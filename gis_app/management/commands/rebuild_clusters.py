@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from gis_app.models import Location, LocationCluster
+from gis_app.clusters import update_clusters
+
+DEFAULT_BATCH_SIZE = 50000
+
+
+class Command(BaseCommand):
+	help = 'Rebuild the location clusters of every zoom level from all locations'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+			help='Number of locations added to the clusters at once')
+
+	def handle(self, *args, **options):
+		batch_size = options['batch_size']
+		if batch_size < 1:
+			raise CommandError('--batch-size must be a positive integer')
+
+		read = 0
+		with transaction.atomic():
+			LocationCluster.objects.all().delete()
+			batch = []
+			for point in Location.objects.values_list('coordinates', flat=True).iterator(chunk_size=batch_size):
+				batch.append(point)
+				if len(batch) >= batch_size:
+					update_clusters(added=batch)
+					read += len(batch)
+					batch = []
+					self.stdout.write(f'{read} locations clustered')
+			update_clusters(added=batch)
+			read += len(batch)
+
+		self.stdout.write(self.style.SUCCESS(
+			f'Successfully rebuilt clusters: {LocationCluster.objects.count()} clusters of {read} locations'
+		))
@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from gis_app.models import Boundary, BoundaryMembership
+from gis_app.membership import refresh_boundary_memberships
+from gis_app.spatial import is_postgis
+from gis_app.subdivision import refresh_pieces
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def rebuild_batch(boundary_ids):
+	"""
+	Subdivides the boundaries again and recomputes the locations they contain.
+	Returns the number of memberships stored.
+	"""
+	boundaries = Boundary.objects.filter(id__in=boundary_ids)
+	if is_postgis():
+		# ST_Subdivide reads the areas in the database, only the ids are needed here
+		boundaries = boundaries.only('id')
+	refresh_pieces(list(boundaries))
+	return refresh_boundary_memberships(boundary_ids)
+
+
+class Command(BaseCommand):
+	help = 'Rebuild the subdivided pieces of every boundary and the table of locations contained in it'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+			help='Number of boundaries recomputed per transaction')
+		parser.add_argument('--workers', type=int, default=1,
+			help='Number of processes recomputing batches concurrently')
+
+	def handle(self, *args, **options):
+		batch_size = options['batch_size']
+		workers = options['workers']
+		if batch_size < 1:
+			raise CommandError('--batch-size must be a positive integer')
+		if workers < 1:
+			raise CommandError('--workers must be a positive integer')
+
+		boundary_ids = list(Boundary.objects.order_by('id').values_list('id', flat=True))
+		batches = [boundary_ids[i:i + batch_size] for i in range(0, len(boundary_ids), batch_size)]
+		self.started = time.monotonic()
+		self.done = self.created = 0
+		if workers == 1:
+			for batch in batches:
+				self.report(len(batch), rebuild_batch(batch))
+		else:
+			# Every worker opens its own connection, none may inherit this one.
+			connections.close_all()
+			with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+				futures = {pool.submit(rebuild_batch, batch): len(batch) for batch in batches}
+				for future in as_completed(futures):
+					self.report(futures[future], future.result())
+
+		self.stdout.write(self.style.SUCCESS(
+			f'Successfully rebuilt memberships: {BoundaryMembership.objects.count()} memberships '
+			f'of {len(boundary_ids)} boundaries'
+		))
+
+	def report(self, boundaries, created):
+		"""
+		Writes the progress after a batch of boundaries was committed.
+		"""
+		self.done += boundaries
+		self.created += created
+		elapsed = time.monotonic() - self.started
+		self.stdout.write(f'{self.done} boundaries done, {self.created} memberships ({self.done / elapsed:.0f} boundaries/sec)')
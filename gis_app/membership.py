@@ -0,0 +1,56 @@
+from django.contrib.gis.geos import MultiPoint
+from django.db import connection, transaction
+
+from .models import Location, Boundary, BoundaryMembership
+from .spatial import is_postgis, location_memberships, containment_sql
+
+
+def insert_memberships_sql(side):
+    return f'INSERT INTO {BoundaryMembership._meta.db_table} (location_id, boundary_id) ' + containment_sql(
+        'l.id', f'{Location._meta.db_table} l', 'l.coordinates', f'{side}.id = ANY(%s)'
+    )
+
+
+def refresh_location_memberships(location_ids):
+    """
+    Recomputes the boundaries containing each of the locations.
+    """
+    location_ids = list(location_ids)
+    if not location_ids:
+        return
+    with transaction.atomic():
+        BoundaryMembership.objects.filter(location_id__in=location_ids).delete()
+        if is_postgis():
+            with connection.cursor() as cursor:
+                cursor.execute(insert_memberships_sql('l'), [location_ids] * 2)
+            return
+        points = Location.objects.filter(id__in=location_ids).values_list('coordinates', flat=True)
+        boundaries = Boundary.objects.filter(area__intersects=MultiPoint(list(points), srid=4326))
+        BoundaryMembership.objects.bulk_create(
+            BoundaryMembership(location_id=location_id, boundary_id=boundary_id)
+            for location_id, boundary_ids in location_memberships(location_ids, boundaries).items()
+            for boundary_id in boundary_ids
+        )
+
+
+def refresh_boundary_memberships(boundary_ids):
+    """
+    Recomputes the locations contained in each of the boundaries.
+    Returns the number of memberships stored.
+    """
+    boundary_ids = list(boundary_ids)
+    if not boundary_ids:
+        return 0
+    with transaction.atomic():
+        BoundaryMembership.objects.filter(boundary_id__in=boundary_ids).delete()
+        if is_postgis():
+            with connection.cursor() as cursor:
+                cursor.execute(insert_memberships_sql('b'), [boundary_ids] * 2)
+                return cursor.rowcount
+        created = 0
+        for boundary in Boundary.objects.filter(id__in=boundary_ids):
+            location_ids = Location.objects.filter(coordinates__within=boundary.area).values_list('id', flat=True)
+            created += len(BoundaryMembership.objects.bulk_create(
+                BoundaryMembership(location_id=location_id, boundary=boundary) for location_id in location_ids
+            ))
+        return created
@@ -0,0 +1,193 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))
+
+# Largest number of statements of one request kept for the slow request log
+MAX_RECORDED_QUERIES = 1000
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, value=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def samples(self):
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                yield self.name, dict(zip(self.labels, labels)), value
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Histogram(Counter):
+    """
+    Prometheus histogram: the number of observations up to every bucket
+    bound, their sum and their count, for every combination of labels.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels, buckets):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                # One count per bucket, the +Inf bucket, then the sum
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self.lock:
+            values = [(labels, list(counts)) for labels, counts in sorted(self.values.items())]
+        for labels, counts in values:
+            labels = dict(zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', {**labels, 'le': str(bound)}, cumulative
+            yield f'{self.name}_sum', labels, counts[-1]
+            yield f'{self.name}_count', labels, cumulative
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    """
+    The metrics of this process, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                label_text = ','.join(f'{key}="{escape(label)}"' for key, label in labels.items())
+                lines.append(f'{name}{{{label_text}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = Registry()
+requests_total = registry.add(Counter(
+    'gis_requests_total', 'Requests by view, method and status code.', ('view', 'method', 'status')
+))
+request_duration = registry.add(Histogram(
+    'gis_request_duration_seconds', 'Time until the last byte of the response was produced.', ('view', 'method'), LATENCY_BUCKETS
+))
+db_queries = registry.add(Histogram(
+    'gis_db_queries', 'SQL statements run by a request.', ('view',), QUERY_COUNT_BUCKETS
+))
+db_duration = registry.add(Histogram(
+    'gis_db_duration_seconds', 'Time a request spent in SQL statements.', ('view',), LATENCY_BUCKETS
+))
+stage_duration = registry.add(Histogram(
+    'gis_stage_duration_seconds', 'Time a request spent in an instrumented stage, such as serialization or GEOS calls.',
+    ('view', 'stage'), LATENCY_BUCKETS
+))
+response_size = registry.add(Histogram(
+    'gis_response_bytes', 'Size of the response body.', ('view',), SIZE_BUCKETS
+))
+
+
+class RequestRecord:
+    """
+    What one request spent its time on, filled in while it runs.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.statements = []
+        self.stages = {}
+
+
+current_record = ContextVar('current_record', default=None)
+
+
+@contextmanager
+def timer(stage):
+    """
+    Adds the time spent in the block to `stage` of the current request.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = current_record.get()
+        if record is not None:
+            record.stages[stage] = record.stages.get(stage, 0.0) + time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting and timing the statements of the current request.
+    """
+    record = current_record.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        record.queries += 1
+        record.query_time += elapsed
+        if len(record.statements) < MAX_RECORDED_QUERIES:
+            record.statements.append((elapsed, sql))
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Adds `record_query` to a database connection. Connected to `connection_created`.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def observe_request(view, method, status_code, record, size):
+    duration = time.perf_counter() - record.started
+    requests_total.inc((view, method, str(status_code)))
+    request_duration.observe((view, method), duration)
+    db_queries.observe((view,), record.queries)
+    db_duration.observe((view,), record.query_time)
+    for stage, elapsed in record.stages.items():
+        stage_duration.observe((view, stage), elapsed)
+    response_size.observe((view,), size)
+    return duration
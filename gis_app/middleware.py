@@ -0,0 +1,163 @@
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.sessions.backends.base import SessionBase
+from django.contrib.sessions.middleware import SessionMiddleware
+from rest_framework_simplejwt.settings import api_settings
+
+from .metrics import RequestRecord, current_record, observe_request
+
+STATELESS_PATH_PREFIX = '/api/'
+# Number of the slowest statements listed in the slow request log
+SLOW_REQUEST_QUERIES = 20
+
+logger = logging.getLogger('gis_app.metrics')
+
+
+class RequestSession(SessionBase):
+    """
+    Empty session that lives for one request and is never loaded or stored.
+    """
+
+    def exists(self, session_key):
+        return False
+
+    def create(self):
+        self.modified = True
+
+    def save(self, must_create=False):
+        pass
+
+    def delete(self, session_key=None):
+        pass
+
+    def load(self):
+        return {}
+
+
+def is_stateless_request(request):
+    """
+    Whether the request is an API request authenticated with a JWT.
+    """
+    if not request.path.startswith(STATELESS_PATH_PREFIX):
+        return False
+    parts = request.headers.get('Authorization', '').split()
+    return len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES
+
+
+class StatelessAPISessionMiddleware(SessionMiddleware):
+    """
+    Session middleware that gives API requests carrying a JWT an empty
+    session instead of the one named by the session cookie, so they never
+    read or write the session table and the user is only taken from the token.
+    """
+
+    def process_request(self, request):
+        if is_stateless_request(request):
+            request.session = RequestSession()
+        else:
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if isinstance(getattr(request, 'session', None), RequestSession):
+            return response
+        return super().process_response(request, response)
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, SQL statements, instrumented stages and response
+    size of every request in the metrics of `gis_app.metrics`, labelled by
+    the URL name of the view, and logs the requests slower than
+    `SLOW_REQUEST_THRESHOLD` seconds with their slowest statements.
+
+    Streamed responses are recorded once their last chunk was sent, so the
+    statements run while streaming are counted as well.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        record = RequestRecord()
+        token = current_record.set(record)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_record.reset(token)
+        return self.record_response(request, response, record)
+
+    async def __acall__(self, request):
+        record = RequestRecord()
+        token = current_record.set(record)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_record.reset(token)
+        return self.record_response(request, response, record)
+
+    def record_response(self, request, response, record):
+        if not response.streaming:
+            self.observe(request, response, record, len(response.content))
+        elif response.is_async:
+            response.streaming_content = self.astream(request, response, record, response.streaming_content)
+        else:
+            response.streaming_content = self.stream(request, response, record, response.streaming_content)
+        return response
+
+    def stream(self, request, response, record, content):
+        size = 0
+        chunks = iter(content)
+        try:
+            while True:
+                token = current_record.set(record)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    current_record.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.observe(request, response, record, size)
+
+    async def astream(self, request, response, record, content):
+        size = 0
+        chunks = aiter(content)
+        try:
+            while True:
+                token = current_record.set(record)
+                try:
+                    chunk = await anext(chunks)
+                except StopAsyncIteration:
+                    break
+                finally:
+                    current_record.reset(token)
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.observe(request, response, record, size)
+
+    def observe(self, request, response, record, size):
+        match = request.resolver_match
+        view = match.view_name if match is not None else 'unmatched'
+        duration = observe_request(view, request.method, response.status_code, record, size)
+        threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD', 1.0)
+        if threshold is not None and duration >= threshold:
+            statements = sorted(record.statements, key=lambda statement: statement[0], reverse=True)[:SLOW_REQUEST_QUERIES]
+            logger.warning(
+                'Slow request %s %s (%s): %d in %.3f s, %d bytes, %d SQL statements in %.3f s%s',
+                request.method, request.get_full_path(), view, response.status_code, duration, size,
+                record.queries, record.query_time,
+                ''.join(f'\n  {elapsed * 1000:.1f} ms: {sql}' for elapsed, sql in statements),
+            )
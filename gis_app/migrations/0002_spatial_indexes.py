@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Used to replace the spatial indexes of Location.coordinates and
+    Boundary.area with named, postgres-only GistIndex entries. The
+    `spatial_index=True` indexes of 0001_initial are kept instead, which are
+    GiST indexes on PostGIS and R*Tree indexes on SpatiaLite; 0008 renames
+    the indexes of databases migrated with the earlier version.
+    """
+
+    dependencies = [
+        ('gis_app', '0001_initial'),
+    ]
+
+    operations = []
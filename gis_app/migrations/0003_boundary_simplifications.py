@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:54
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copy of gis_app.simplification.SIMPLIFY_TOLERANCES when this migration was written.
+SIMPLIFY_TOLERANCES = (0.0001, 0.001, 0.01)
+
+
+def simplify_existing_boundaries(apps, schema_editor):
+    Boundary = apps.get_model('gis_app', 'Boundary')
+    BoundarySimplification = apps.get_model('gis_app', 'BoundarySimplification')
+    rows = []
+    for boundary in Boundary.objects.iterator(chunk_size=100):
+        for tolerance in SIMPLIFY_TOLERANCES:
+            area = boundary.area.simplify(tolerance, preserve_topology=True)
+            if area.geom_type == 'Polygon' and not area.empty:
+                rows.append(BoundarySimplification(boundary=boundary, tolerance=tolerance, area=area))
+        if len(rows) >= 1000:
+            BoundarySimplification.objects.bulk_create(rows)
+            rows = []
+    BoundarySimplification.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gis_app', '0002_spatial_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoundarySimplification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tolerance', models.FloatField()),
+                ('area', django.contrib.gis.db.models.fields.PolygonField(spatial_index=False, srid=4326)),
+                ('boundary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='simplifications', to='gis_app.boundary')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='boundarysimplification',
+            constraint=models.UniqueConstraint(fields=('boundary', 'tolerance'), name='boundary_simplification_unique'),
+        ),
+        migrations.RunPython(simplify_existing_boundaries, migrations.RunPython.noop),
+    ]
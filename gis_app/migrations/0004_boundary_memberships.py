@@ -0,0 +1,48 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def add_existing_memberships(apps, schema_editor):
+    Location = apps.get_model('gis_app', 'Location')
+    Boundary = apps.get_model('gis_app', 'Boundary')
+    BoundaryMembership = apps.get_model('gis_app', 'BoundaryMembership')
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'INSERT INTO {membership} (location_id, boundary_id) '
+            'SELECT l.id, b.id FROM {location} l JOIN {boundary} b ON ST_Contains(b.area, l.coordinates)'.format(
+                membership=BoundaryMembership._meta.db_table,
+                location=Location._meta.db_table,
+                boundary=Boundary._meta.db_table,
+            )
+        )
+        return
+    for boundary in Boundary.objects.iterator():
+        location_ids = Location.objects.filter(coordinates__within=boundary.area).values_list('id', flat=True)
+        BoundaryMembership.objects.bulk_create(
+            BoundaryMembership(location_id=location_id, boundary=boundary) for location_id in location_ids
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gis_app', '0003_boundary_simplifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoundaryMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('boundary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='gis_app.boundary')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='gis_app.location')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='boundarymembership',
+            constraint=models.UniqueConstraint(fields=('location', 'boundary'), name='boundary_membership_unique'),
+        ),
+        migrations.RunPython(add_existing_memberships, migrations.RunPython.noop),
+    ]
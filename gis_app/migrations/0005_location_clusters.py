@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gis_app', '0004_boundary_memberships'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('x', models.IntegerField()),
+                ('y', models.IntegerField()),
+                ('count', models.IntegerField()),
+                ('sum_lon', models.FloatField()),
+                ('sum_lat', models.FloatField()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='locationcluster',
+            constraint=models.UniqueConstraint(fields=('zoom', 'x', 'y'), name='location_cluster_unique'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-18 17:14
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copy of gis_app.subdivision.PIECE_MAX_VERTICES when this migration was written.
+PIECE_MAX_VERTICES = 256
+
+
+def subdivide_existing_boundaries(apps, schema_editor):
+    # Containment queries fall back to the whole area of boundaries without
+    # pieces, so other backends can leave them to the next write.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Boundary = apps.get_model('gis_app', 'Boundary')
+    BoundaryPiece = apps.get_model('gis_app', 'BoundaryPiece')
+    schema_editor.execute(
+        'INSERT INTO {piece} (boundary_id, area) '
+        'SELECT b.id, d.geom FROM {boundary} b, ST_Dump(ST_Subdivide(b.area, %s)) d '
+        "WHERE GeometryType(d.geom) = 'POLYGON'".format(
+            piece=BoundaryPiece._meta.db_table,
+            boundary=Boundary._meta.db_table,
+        ),
+        params=[PIECE_MAX_VERTICES],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gis_app', '0006_change_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BoundaryPiece',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('area', django.contrib.gis.db.models.fields.PolygonField(srid=4326)),
+                ('boundary', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pieces', to='gis_app.boundary')),
+            ],
+        ),
+        migrations.RunPython(subdivide_existing_boundaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-18 18:02
+
+from django.db import migrations
+
+NAMED_SPATIAL_INDEXES = (
+    ('location', 'coordinates', 'location_coordinates_gist'),
+    ('boundary', 'area', 'boundary_area_gist'),
+    ('boundarypiece', 'area', 'boundary_piece_area_gist'),
+)
+
+
+def rename_named_spatial_indexes(apps, schema_editor):
+    """
+    Databases migrated with the earlier 0002_spatial_indexes and
+    0007_boundary_pieces have named GiST indexes in place of the ones
+    GeoDjango creates for `spatial_index=True`. Gives them the GeoDjango names, so altering the fields later finds them.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, column, name in NAMED_SPATIAL_INDEXES:
+        table = apps.get_model('gis_app', model_name)._meta.db_table
+        index_name = schema_editor._create_index_name(table, [column], suffix='_id')
+        schema_editor.execute('ALTER INDEX IF EXISTS %s RENAME TO %s' % (
+            schema_editor.quote_name(name), schema_editor.quote_name(index_name)
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gis_app', '0007_boundary_pieces'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_named_spatial_indexes, migrations.RunPython.noop),
+    ]
@@ -20,3 +20,80 @@ class Boundary(models.Model):
 
 	def __str__(self):
 		return self.name
+
+
+class BoundarySimplification(models.Model):
+	boundary = models.ForeignKey(Boundary, on_delete=models.CASCADE, related_name='simplifications')
+	tolerance = models.FloatField()
+	area = models.PolygonField(spatial_index=False)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['boundary', 'tolerance'], name='boundary_simplification_unique'),
+		]
+
+	def __str__(self):
+		return f'{self.boundary_id} @ {self.tolerance}'
+
+
+class BoundaryPiece(models.Model):
+	boundary = models.ForeignKey(Boundary, on_delete=models.CASCADE, related_name='pieces')
+	area = models.PolygonField()
+
+	def __str__(self):
+		return f'{self.boundary_id} piece {self.pk}'
+
+
+class BoundaryMembership(models.Model):
+	location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='memberships')
+	boundary = models.ForeignKey(Boundary, on_delete=models.CASCADE, related_name='memberships')
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['location', 'boundary'], name='boundary_membership_unique'),
+		]
+
+	def __str__(self):
+		return f'{self.location_id} in {self.boundary_id}'
+
+
+class LocationCluster(models.Model):
+	zoom = models.PositiveSmallIntegerField()
+	x = models.IntegerField()
+	y = models.IntegerField()
+	count = models.IntegerField()
+	sum_lon = models.FloatField()
+	sum_lat = models.FloatField()
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['zoom', 'x', 'y'], name='location_cluster_unique'),
+		]
+
+	def __str__(self):
+		return f'{self.zoom}/{self.x}/{self.y}: {self.count}'
+
+
+class ChangeEvent(models.Model):
+	LOCATION = 'location'
+	BOUNDARY = 'boundary'
+	MODELS = [(LOCATION, 'Location'), (BOUNDARY, 'Boundary')]
+
+	CREATE = 'create'
+	UPDATE = 'update'
+	DELETE = 'delete'
+	ACTIONS = [(CREATE, 'Create'), (UPDATE, 'Update'), (DELETE, 'Delete')]
+
+	seq = models.BigAutoField(primary_key=True)
+	model = models.CharField(max_length=16, choices=MODELS)
+	object_id = models.BigIntegerField()
+	action = models.CharField(max_length=8, choices=ACTIONS)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['model', 'seq'], name='change_event_model_seq'),
+		]
+
+	def __str__(self):
+		return f'{self.seq}: {self.action} {self.model} {self.object_id}'
@@ -0,0 +1,159 @@
+from operator import attrgetter, itemgetter
+
+from django.http import JsonResponse
+from rest_framework.response import Response
+from rest_framework import status
+
+from .geojson import stream_feature_collection, astream_feature_collection, feature_collection_response
+from .conditional import list_validators, alist_validators, set_validators, not_modified_response
+from .metrics import timer
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def is_true(value):
+    """
+    Returns True for the query string values accepted as an enabled flag.
+    """
+    return str(value).lower() in TRUE_VALUES
+
+
+def parse_page_params(query_params):
+    """
+    Returns the (cursor, limit) pair from the query params.
+    Raises ValueError if either value is not a valid non-negative integer.
+    """
+    cursor = query_params.get('cursor')
+    limit = query_params.get('limit')
+    cursor = int(cursor) if cursor else None
+    limit = int(limit) if limit else DEFAULT_PAGE_SIZE
+    if limit < 1 or (cursor is not None and cursor < 0):
+        raise ValueError('cursor and limit must be positive integers')
+    return cursor, min(limit, MAX_PAGE_SIZE)
+
+
+def keyset_page(queryset, cursor, limit, key=attrgetter('pk')):
+    """
+    Returns one page of the queryset ordered by primary key and the cursor of the next page.
+
+    The page is selected with `pk > cursor` instead of an OFFSET, so the cost of
+    fetching a page does not grow with its position in the table.
+    `key` returns the primary key of a fetched row.
+    """
+    if cursor is not None:
+        queryset = queryset.filter(pk__gt=cursor)
+    rows = list(queryset.order_by('pk')[:limit + 1])
+    next_cursor = key(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def akeyset_page(queryset, cursor, limit, key=attrgetter('pk')):
+    """
+    Async version of `keyset_page`.
+    """
+    if cursor is not None:
+        queryset = queryset.filter(pk__gt=cursor)
+    rows = [row async for row in queryset.order_by('pk')[:limit + 1]]
+    next_cursor = key(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def list_response(request, queryset, serializer_class, features, context=None):
+    """
+    Builds the response of a list endpoint with an ETag header,
+    or a 304 response without reading the rows if the client's copy is current.
+    """
+    etag, last_modified = list_validators(queryset, request.query_params)
+    response = not_modified_response(request, etag, last_modified)
+    if response is not None:
+        return response
+    response = build_list_response(request, queryset, serializer_class, features, context)
+    if response.status_code == status.HTTP_200_OK:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def build_list_response(request, queryset, serializer_class, features, context=None):
+    """
+    Builds the body of a list endpoint.
+
+    `?stream=true` streams the queryset as a GeoJSON FeatureCollection,
+    `?geojson=true` returns it as a GeoJSON FeatureCollection,
+    `?limit=` / `?cursor=` return a keyset page with the next cursor,
+    otherwise the whole queryset is serialized as before.
+
+    The GeoJSON outputs are read with the `features` reader and bypass the serializer,
+    the other ones are serialized with `context` as the serializer context.
+    """
+    params = request.query_params
+    if is_true(params.get('stream')):
+        return stream_feature_collection(queryset, features)
+    geojson = is_true(params.get('geojson'))
+    if 'limit' in params or 'cursor' in params:
+        try:
+            cursor, limit = parse_page_params(params)
+        except ValueError:
+            return Response({'error': 'Invalid pagination parameters'}, status=status.HTTP_400_BAD_REQUEST)
+        if geojson:
+            page, next_cursor = keyset_page(features.rows(queryset), cursor, limit, key=itemgetter(0))
+            with timer('serialization'):
+                return feature_collection_response(page, features, next_cursor=next_cursor)
+        page, next_cursor = keyset_page(queryset, cursor, limit)
+        serializer = serializer_class(page, many=True, context=context or {})
+        with timer('serialization'):
+            data = serializer.data
+        return Response({'results': data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+    if geojson:
+        with timer('serialization'):
+            return feature_collection_response(features.rows(queryset.order_by('pk')).iterator(), features)
+    serializer = serializer_class(queryset, many=True, context=context or {})
+    with timer('serialization'):
+        data = serializer.data
+    return Response(data, status=status.HTTP_200_OK)
+
+
+async def alist_response(request, queryset, serializer_class, features, context=None):
+    """
+    Async version of `list_response`, reading the queryset with the async ORM.
+    """
+    etag, last_modified = await alist_validators(queryset, request.query_params)
+    response = not_modified_response(request, etag, last_modified)
+    if response is not None:
+        return response
+    response = await abuild_list_response(request, queryset, serializer_class, features, context)
+    if response.status_code == status.HTTP_200_OK:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+async def abuild_list_response(request, queryset, serializer_class, features, context=None):
+    """
+    Async version of `build_list_response`.
+    """
+    params = request.query_params
+    if is_true(params.get('stream')):
+        return astream_feature_collection(queryset, features)
+    geojson = is_true(params.get('geojson'))
+    if 'limit' in params or 'cursor' in params:
+        try:
+            cursor, limit = parse_page_params(params)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid pagination parameters'}, status=status.HTTP_400_BAD_REQUEST)
+        if geojson:
+            page, next_cursor = await akeyset_page(features.rows(queryset), cursor, limit, key=itemgetter(0))
+            with timer('serialization'):
+                return feature_collection_response(page, features, next_cursor=next_cursor)
+        page, next_cursor = await akeyset_page(queryset, cursor, limit)
+        serializer = serializer_class(page, many=True, context=context or {})
+        with timer('serialization'):
+            return JsonResponse({'results': serializer.data, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+    if geojson:
+        rows = [row async for row in features.rows(queryset.order_by('pk'))]
+        with timer('serialization'):
+            return feature_collection_response(rows, features)
+    serializer = serializer_class([obj async for obj in queryset], many=True, context=context or {})
+    with timer('serialization'):
+        return JsonResponse(serializer.data, safe=False, status=status.HTTP_200_OK)
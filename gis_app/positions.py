@@ -0,0 +1,150 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Location
+from . import hooks
+
+BUFFERED = 'buffered'
+COMMITTED = 'committed'
+DURABILITY_MODES = (BUFFERED, COMMITTED)
+FLUSH_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class PositionBatch:
+    """
+    The position updates collected between two flushes, by location id.
+    `done` is set once the batch was flushed, `written` then holds the ids
+    of the locations that existed and were updated.
+    """
+
+    def __init__(self):
+        self.positions = {}
+        self.done = threading.Event()
+        self.written = set()
+        self.error = None
+
+
+class PositionBuffer:
+    """
+    In-process buffer of location coordinate updates.
+
+    Updates are collected by location id, so a location moved several times
+    before the next flush is written once, at its last position. A flush
+    writes the whole batch with one `bulk_update` of the `coordinates` and
+    `updated_at` columns and runs the write hooks once for all of it.
+
+    With `buffered` durability the updates are acknowledged once buffered
+    and flushed by a background thread every `flush_interval` seconds, or as
+    soon as `max_pending` locations are waiting. Updates buffered when the
+    process dies are lost. With `committed` durability every request flushes
+    before it is acknowledged; concurrent requests waiting for the same flush
+    are written together.
+    """
+
+    def __init__(self, flush_interval=1.0, max_pending=10000, durability=BUFFERED):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'durability must be one of {", ".join(DURABILITY_MODES)}')
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.durability = durability
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.batch = PositionBatch()
+        self.thread = None
+
+    def add(self, positions):
+        """
+        Buffers (location id, Point) updates, in order. Returns the batch they
+        were added to.
+        """
+        with self.lock:
+            batch = self.batch
+            for pk, point in positions:
+                batch.positions[pk] = point
+            full = len(batch.positions) >= self.max_pending
+        if self.durability == COMMITTED or full:
+            self.flush(batch)
+        else:
+            self.start()
+        return batch
+
+    def flush(self, batch=None):
+        """
+        Writes the buffered updates. With a `batch`, returns as soon as that
+        batch was flushed, which may have been done by another thread.
+
+        A failed write is logged and kept as the `error` of the batch. With
+        `buffered` durability its updates are buffered again for the next
+        flush, unless the locations were moved again in the meantime.
+        """
+        with self.flush_lock:
+            if batch is not None and batch.done.is_set():
+                return batch
+            with self.lock:
+                current, self.batch = self.batch, PositionBatch()
+            try:
+                current.written = self.write(current.positions)
+            except Exception as e:
+                logger.exception('Flushing %d location positions failed', len(current.positions))
+                current.error = e
+                if self.durability == BUFFERED:
+                    with self.lock:
+                        for pk, point in current.positions.items():
+                            self.batch.positions.setdefault(pk, point)
+            finally:
+                current.done.set()
+            return current
+
+    def write(self, positions):
+        """
+        Updates the coordinates of the locations that still exist. Returns their ids.
+        """
+        if not positions:
+            return set()
+        now = timezone.now()
+        with transaction.atomic():
+            previous = dict(
+                Location.objects.select_for_update().filter(pk__in=list(positions)).order_by('pk')
+                .values_list('pk', 'coordinates')
+            )
+            locations = [
+                Location(pk=pk, coordinates=point, updated_at=now)
+                for pk, point in positions.items() if pk in previous
+            ]
+            Location.objects.bulk_update(locations, ['coordinates', 'updated_at'], batch_size=FLUSH_BATCH_SIZE)
+            if locations:
+                hooks.locations_written(locations, [previous[location.pk] for location in locations])
+        return set(previous)
+
+    def start(self):
+        """
+        Starts the background flushes once per process.
+        """
+        if self.thread is not None or not self.flush_interval:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='position-buffer', daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            close_old_connections()
+            self.flush()
+
+
+position_buffer = PositionBuffer(
+    flush_interval=getattr(settings, 'POSITION_FLUSH_INTERVAL', 1.0),
+    max_pending=getattr(settings, 'POSITION_BUFFER_SIZE', 10000),
+    durability=getattr(settings, 'POSITION_BUFFER_DURABILITY', BUFFERED),
+)
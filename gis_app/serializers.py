@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.contrib.auth.models import User
 from .models import Location, Boundary
-from django.contrib.gis.geos import Point, Polygon
+from django.contrib.gis.geos import Point, Polygon, GEOSException, WKTWriter
+from . import hooks
 
 class RegisterUserSerializer(serializers.ModelSerializer):
 	class Meta:
@@ -18,19 +20,34 @@ class LocationSerializer(serializers.ModelSerializer):
 		model = Location
 		fields = '__all__'
 
+	def validate_coordinates(self, value):
+		try:
+			longitude, latitude = value['coordinates']
+			return Point(float(longitude), float(latitude), srid=4326)
+		except (KeyError, TypeError, ValueError):
+			raise serializers.ValidationError('Expected a GeoJSON Point with [longitude, latitude] coordinates.')
+
 	def create(self, validated_data):
-		coordinates_data = validated_data.pop('coordinates')
-		coordinates = Point(coordinates_data['coordinates'][0], coordinates_data['coordinates'][1])
-		location = Location.objects.create(coordinates=coordinates, **validated_data)
+		with transaction.atomic():
+			location = Location.objects.create(**validated_data)
+			hooks.locations_written([location])
 		return location
 
 	def update(self, instance, validated_data):
-		coordinates_data = validated_data.get('coordinates')
-		if coordinates_data:
-			instance.coordinates = Point(coordinates_data['coordinates'][0], coordinates_data['coordinates'][1])
+		previous_coordinates = instance.coordinates
+		self.assign(instance, validated_data)
+		with transaction.atomic():
+			instance.save()
+			hooks.locations_written([instance], [previous_coordinates])
+		return instance
+
+	def assign(self, instance, validated_data):
+		"""
+		Sets the validated fields on the instance without saving it.
+		"""
+		instance.coordinates = validated_data.get('coordinates', instance.coordinates)
 		instance.name = validated_data.get('name', instance.name)
 		instance.description = validated_data.get('description', instance.description)
-		instance.save()
 		return instance
 
 class BoundarySerializer(serializers.ModelSerializer):
@@ -38,16 +55,159 @@ class BoundarySerializer(serializers.ModelSerializer):
 		model = Boundary
 		fields = '__all__'
 
+	def validate_area(self, value):
+		try:
+			return Polygon(value['coordinates'][0], srid=4326)
+		except (KeyError, IndexError, TypeError, ValueError, GEOSException):
+			raise serializers.ValidationError('Expected a GeoJSON Polygon with a closed exterior ring.')
+
 	def create(self, validated_data):
-		area_data = validated_data.pop('area')
-		area = Polygon(area_data['coordinates'][0])
-		boundary = Boundary.objects.create(area=area, **validated_data)
+		with transaction.atomic():
+			boundary = Boundary.objects.create(**validated_data)
+			hooks.boundaries_written([boundary])
 		return boundary
 
 	def update(self, instance, validated_data):
-		area_data = validated_data.get('area')
-		if area_data:
-			instance.area = Polygon(area_data['coordinates'][0])
+		previous_area = instance.area
+		self.assign(instance, validated_data)
+		with transaction.atomic():
+			instance.save()
+			hooks.boundaries_written([instance], [previous_area])
+		return instance
+
+	def assign(self, instance, validated_data):
+		"""
+		Sets the validated fields on the instance without saving it.
+		"""
+		instance.area = validated_data.get('area', instance.area)
 		instance.name = validated_data.get('name', instance.name)
-		instance.save()
 		return instance
+
+	def to_representation(self, instance):
+		"""
+		Returns the boundary with its `simplified_area` annotation, when the
+		queryset has one, in place of the area, and the area coordinates rounded
+		to the `precision` of the serializer context.
+		"""
+		data = super().to_representation(instance)
+		area = getattr(instance, 'simplified_area', None) or instance.area
+		precision = self.context.get('precision')
+		if area is not instance.area or precision is not None:
+			writer = WKTWriter(trim=True, precision=precision)
+			data['area'] = f'SRID={area.srid};{writer.write(area).decode()}' if area.srid else writer.write(area).decode()
+		return data
+
+class LonLatField(serializers.ListField):
+	"""
+	A `[longitude, latitude]` pair, returned as a tuple.
+	"""
+	child = serializers.FloatField()
+
+	def __init__(self, **kwargs):
+		kwargs['min_length'] = 2
+		kwargs['max_length'] = 2
+		super().__init__(**kwargs)
+
+	def to_internal_value(self, data):
+		lon, lat = super().to_internal_value(data)
+		if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+			raise serializers.ValidationError('Coordinates are outside the valid longitude/latitude range.')
+		return lon, lat
+
+class GeoJSONPolygonField(serializers.Field):
+	"""
+	An inline GeoJSON Polygon, returned as a Polygon in SRID 4326.
+	"""
+
+	def to_internal_value(self, data):
+		if not isinstance(data, dict) or data.get('type') != 'Polygon':
+			raise serializers.ValidationError('Expected a GeoJSON Polygon.')
+		try:
+			polygon = Polygon(*data['coordinates'], srid=4326)
+		except (KeyError, IndexError, TypeError, ValueError, GEOSException):
+			raise serializers.ValidationError('Expected a GeoJSON Polygon with closed rings.')
+		if not polygon.valid:
+			raise serializers.ValidationError(f'Invalid polygon: {polygon.valid_reason}')
+		return polygon
+
+class DistanceSerializer(serializers.Serializer):
+	location1_id = serializers.IntegerField(required=False)
+	location1 = LonLatField(required=False)
+	location2_id = serializers.IntegerField(required=False)
+	location2 = LonLatField(required=False)
+
+	def validate(self, data):
+		if ('location1_id' in data) == ('location1' in data):
+			raise serializers.ValidationError('Provide either location1_id or location1.')
+		if ('location2_id' in data) == ('location2' in data):
+			raise serializers.ValidationError('Provide either location2_id or location2.')
+		return data
+
+class WithinBoundarySerializer(serializers.Serializer):
+	location_id = serializers.IntegerField(required=False)
+	location = LonLatField(required=False)
+	boundary_id = serializers.IntegerField(required=False)
+	boundary = GeoJSONPolygonField(required=False)
+
+	def validate(self, data):
+		if ('location_id' in data) == ('location' in data):
+			raise serializers.ValidationError('Provide either location_id or location.')
+		if ('boundary_id' in data) == ('boundary' in data):
+			raise serializers.ValidationError('Provide either boundary_id or boundary.')
+		return data
+
+class ReverseGeocodeSerializer(serializers.Serializer):
+	MAX_POINTS = 10000
+	MAX_K = 100
+
+	points = serializers.ListField(child=LonLatField(), min_length=1, max_length=MAX_POINTS)
+	k = serializers.IntegerField(min_value=0, max_value=MAX_K, default=1)
+
+class PositionSerializer(serializers.Serializer):
+	id = serializers.IntegerField()
+	coordinates = LonLatField()
+
+class PositionUpdateSerializer(serializers.Serializer):
+	MAX_POSITIONS = 50000
+
+	positions = serializers.ListField(child=PositionSerializer(), min_length=1, max_length=MAX_POSITIONS)
+
+class BatchWithinBoundarySerializer(serializers.Serializer):
+	MAX_POINTS = 100000
+	MAX_BOUNDARIES = 1000
+
+	location_ids = serializers.ListField(child=serializers.IntegerField(), required=False, max_length=MAX_POINTS)
+	points = serializers.ListField(child=LonLatField(), required=False, max_length=MAX_POINTS)
+	boundary_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=MAX_BOUNDARIES)
+	format = serializers.ChoiceField(choices=['lists', 'matrix'], default='lists')
+
+	def validate(self, data):
+		if ('location_ids' in data) == ('points' in data):
+			raise serializers.ValidationError('Provide either location_ids or points.')
+		return data
+
+class DistanceMatrixSerializer(serializers.Serializer):
+	MAX_CELLS = 1000000
+
+	origin_ids = serializers.ListField(child=serializers.IntegerField(), required=False, min_length=1)
+	origins = serializers.ListField(child=LonLatField(), required=False, min_length=1)
+	destination_ids = serializers.ListField(child=serializers.IntegerField(), required=False, min_length=1)
+	destinations = serializers.ListField(child=LonLatField(), required=False, min_length=1)
+
+	def validate(self, data):
+		if ('origin_ids' in data) == ('origins' in data):
+			raise serializers.ValidationError('Provide either origin_ids or origins.')
+		if ('destination_ids' in data) == ('destinations' in data):
+			raise serializers.ValidationError('Provide either destination_ids or destinations.')
+		origin_count = len(data.get('origin_ids') or data.get('origins'))
+		destination_count = len(data.get('destination_ids') or data.get('destinations'))
+		if origin_count * destination_count > self.MAX_CELLS:
+			raise serializers.ValidationError(f'The matrix may have at most {self.MAX_CELLS} cells.')
+		return data
+
+class NearestLocationsSerializer(serializers.Serializer):
+	MAX_K = 100
+
+	lon = serializers.FloatField(min_value=-180, max_value=180)
+	lat = serializers.FloatField(min_value=-90, max_value=90)
+	k = serializers.IntegerField(min_value=1, max_value=MAX_K, default=10)
@@ -0,0 +1,68 @@
+from django.contrib.gis.db.models import PolygonField
+from django.contrib.gis.db.models.functions import GeoFunc
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import BoundarySimplification
+
+# Tolerances in degrees (about 11 m, 110 m and 1.1 km at the equator) of the
+# simplified versions stored for every boundary.
+SIMPLIFY_TOLERANCES = (0.0001, 0.001, 0.01)
+
+
+class SimplifyPreserveTopology(GeoFunc):
+    function = 'ST_SimplifyPreserveTopology'
+    output_field = PolygonField(srid=4326)
+
+
+def simplify(area, tolerance):
+    """
+    Returns the area simplified with `tolerance`, or None if the result is not a valid polygon.
+    """
+    simplified = area.simplify(tolerance, preserve_topology=True)
+    if simplified.geom_type != 'Polygon' or simplified.empty:
+        return None
+    return simplified
+
+
+def refresh_simplifications(boundaries):
+    """
+    Replaces the stored simplified versions of the boundaries.
+    """
+    rows = []
+    for boundary in boundaries:
+        for tolerance in SIMPLIFY_TOLERANCES:
+            area = simplify(boundary.area, tolerance)
+            if area is not None:
+                rows.append(BoundarySimplification(boundary=boundary, tolerance=tolerance, area=area))
+    with transaction.atomic():
+        BoundarySimplification.objects.filter(boundary__in=[boundary.pk for boundary in boundaries]).delete()
+        BoundarySimplification.objects.bulk_create(rows, batch_size=1000)
+
+
+def stored_tolerance(tolerance):
+    """
+    Returns the largest stored tolerance not above `tolerance`, or None.
+    """
+    stored = [level for level in SIMPLIFY_TOLERANCES if level <= tolerance]
+    return max(stored) if stored else None
+
+
+def simplified_area(tolerance):
+    """
+    Returns an expression for the boundary area simplified with `tolerance`.
+
+    The tolerance is rounded down to the nearest stored level, whose polygon
+    is read from the simplifications table. Boundaries without a stored
+    version, and tolerances below the smallest level, are simplified by the
+    database on the fly.
+    """
+    level = stored_tolerance(tolerance)
+    if level is None:
+        return SimplifyPreserveTopology('area', tolerance)
+    stored = BoundarySimplification.objects.filter(boundary=OuterRef('pk'), tolerance=level).values('area')[:1]
+    return Coalesce(
+        Subquery(stored), SimplifyPreserveTopology('area', level),
+        output_field=PolygonField(srid=4326)
+    )
@@ -0,0 +1,162 @@
+from django.contrib.gis.db.models.functions import GeometryDistance
+from django.contrib.gis.geos import Point, MultiPoint
+from django.db import connection
+
+from .filters import radius_prefilter
+from .geo import haversine_matrix
+from .models import Location, Boundary, BoundaryPiece
+from .spatial_index import location_tree
+
+
+def is_postgis():
+    return getattr(connection.ops, 'postgis', False)
+
+
+CONTAINMENT_SQL = """
+    SELECT {key}, b.id
+    FROM {source}
+    JOIN {piece} bp ON ST_Intersects(bp.area, {point})
+    JOIN {boundary} b ON b.id = bp.boundary_id
+    WHERE {where} AND (ST_Contains(bp.area, {point}) OR ST_Contains(b.area, {point}))
+    UNION
+    SELECT {key}, b.id
+    FROM {source}
+    JOIN {boundary} b ON ST_Contains(b.area, {point})
+    WHERE {where} AND NOT EXISTS (SELECT 1 FROM {piece} bp WHERE bp.boundary_id = b.id)
+"""
+
+
+def containment_sql(key, source, point, where):
+    """
+    Returns a query selecting the distinct (`key`, boundary id) pairs of the
+    points of `source` and the boundaries (aliased `b`) containing them.
+
+    Containment is tested against the small subdivided pieces of the
+    boundaries, whose index finds the one or two pieces around a point
+    instead of every boundary whose large bounding box covers it. Points
+    on an edge between two pieces are tested against the whole area, as are
+    boundaries without stored pieces. The placeholders of `source` and
+    `where` appear twice, so their params must be passed twice.
+    """
+    return CONTAINMENT_SQL.format(
+        key=key, source=source, point=point, where=where,
+        piece=BoundaryPiece._meta.db_table, boundary=Boundary._meta.db_table,
+    )
+
+
+def location_memberships(location_ids, boundaries):
+    """
+    Returns {location_id: [boundary_id, ...]} for the locations contained in any of the boundaries.
+    """
+    boundary_ids = [boundary.id for boundary in boundaries]
+    if is_postgis():
+        sql = containment_sql(
+            'l.id', f'{Location._meta.db_table} l', 'l.coordinates', 'l.id = ANY(%s) AND b.id = ANY(%s)'
+        ) + ' ORDER BY 1, 2'
+        memberships = {}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [list(location_ids), boundary_ids] * 2)
+            for location_id, boundary_id in cursor.fetchall():
+                memberships.setdefault(location_id, []).append(boundary_id)
+        return memberships
+
+    prepared = prepare_boundaries(boundaries)
+    memberships = {}
+    rows = Location.objects.filter(id__in=location_ids).values_list('id', 'coordinates')
+    for location_id, point in rows.iterator():
+        contained = containing_boundaries(prepared, point.x, point.y)
+        if contained:
+            memberships[location_id] = contained
+    return memberships
+
+
+def point_memberships(points, boundaries):
+    """
+    Returns, for each (lon, lat) point, the list of ids of the boundaries containing it.
+    """
+    if is_postgis():
+        sql = containment_sql(
+            'p.idx', 'unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS p(lon, lat, idx)',
+            'ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326)', 'b.id = ANY(%s)'
+        ) + ' ORDER BY 1, 2'
+        memberships = [[] for _ in points]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [
+                [lon for lon, _ in points], [lat for _, lat in points], [boundary.id for boundary in boundaries]
+            ] * 2)
+            for idx, boundary_id in cursor.fetchall():
+                memberships[idx - 1].append(boundary_id)
+        return memberships
+
+    prepared = prepare_boundaries(boundaries)
+    return [containing_boundaries(prepared, lon, lat) for lon, lat in points]
+
+
+def prepare_boundaries(boundaries):
+    """
+    Returns (id, extent, prepared geometry) tuples, sorted by id, for Python side containment tests.
+    """
+    return [(boundary.id, boundary.area.extent, boundary.area.prepared) for boundary in sorted(boundaries, key=lambda b: b.id)]
+
+
+def containing_boundaries(prepared, lon, lat):
+    """
+    Returns the ids of the prepared boundaries containing the point.
+    The extent check skips most of the GEOS calls for boundaries far away.
+    """
+    point = None
+    contained = []
+    for boundary_id, (min_x, min_y, max_x, max_y), geometry in prepared:
+        if min_x <= lon <= max_x and min_y <= lat <= max_y:
+            if point is None:
+                point = Point(lon, lat, srid=4326)
+            if geometry.contains(point):
+                contained.append(boundary_id)
+    return contained
+
+
+def nearest_locations(point, k):
+    """
+    Returns the `k` locations nearest to the point as (distance in meters, location) pairs.
+
+    On PostGIS the `<->` operator walks the GiST index to find k candidates in
+    degree space; since degrees are not meters, every location within the
+    farthest candidate's distance is then fetched with the indexed
+    `radius_prefilter`, which wraps at the antimeridian, and ranked by
+    great-circle distance. Other backends use an in-memory KDTree.
+    """
+    if is_postgis():
+        candidates = Location.objects.order_by(GeometryDistance('coordinates', point)).values_list('coordinates', flat=True)[:k]
+        candidates = [(candidate.x, candidate.y) for candidate in candidates]
+        if not candidates:
+            return []
+        radius = haversine_matrix([(point.x, point.y)], candidates).max() + 1
+        rows = list(Location.objects.filter(radius_prefilter('coordinates', point, radius)).values_list('id', 'coordinates'))
+        distances = haversine_matrix([(point.x, point.y)], [(p.x, p.y) for _, p in rows])[0]
+        pairs = sorted(zip(distances.tolist(), [location_id for location_id, _ in rows]))[:k]
+    else:
+        pairs = location_tree().nearest(point.x, point.y, k)
+    locations = Location.objects.in_bulk([location_id for _, location_id in pairs])
+    return [(distance, locations[location_id]) for distance, location_id in pairs if location_id in locations]
+
+
+def existing_points(points):
+    """
+    Returns the subset of the (lon, lat) points that are already stored as a location.
+    """
+    if not points:
+        return set()
+    if is_postgis():
+        # For points, a bounding box overlap is an exact coordinate match and
+        # each lookup is a single GiST index probe.
+        sql = """
+            SELECT DISTINCT ST_X(l.coordinates), ST_Y(l.coordinates)
+            FROM unnest(%s::float8[], %s::float8[]) AS p(lon, lat)
+            JOIN {location} l ON l.coordinates && ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326)
+        """.format(location=Location._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [[lon for lon, _ in points], [lat for _, lat in points]])
+            return set(cursor.fetchall())
+    multipoint = MultiPoint([Point(lon, lat) for lon, lat in points], srid=4326)
+    rows = Location.objects.filter(coordinates__intersects=multipoint).values_list('coordinates', flat=True)
+    return {(point.x, point.y) for point in rows}
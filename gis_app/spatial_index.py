@@ -0,0 +1,152 @@
+import heapq
+import math
+import threading
+
+from django.db.models import Count, Max
+
+from .geo import EARTH_RADIUS_M
+from .models import Location
+
+
+def unit_vector(lon, lat):
+    lon, lat = math.radians(lon), math.radians(lat)
+    return math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)
+
+
+def chord_to_meters(chord):
+    return 2 * EARTH_RADIUS_M * math.asin(min(chord / 2, 1.0))
+
+
+class KDTree:
+    """
+    Static k-d tree over points on the unit sphere.
+
+    Points are stored as 3-d unit vectors, so the euclidean (chord) distance
+    orders neighbours exactly like the great-circle distance and there is no
+    special casing of the antimeridian or the poles.
+    """
+
+    def __init__(self, items):
+        """
+        `items` is an iterable of (id, lon, lat) tuples.
+        """
+        points = [(unit_vector(lon, lat), item_id) for item_id, lon, lat in items]
+        self.size = len(points)
+        self.root = self.build(points, 0)
+
+    def build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points.sort(key=lambda point: point[0][axis])
+        median = len(points) // 2
+        return (
+            points[median], axis,
+            self.build(points[:median], depth + 1),
+            self.build(points[median + 1:], depth + 1),
+        )
+
+    def nearest(self, lon, lat, k, exclude=()):
+        """
+        Returns up to `k` (distance in meters, id) pairs sorted by distance,
+        leaving out the ids in `exclude`.
+        """
+        target = unit_vector(lon, lat)
+        heap = []  # max-heap of (-squared chord, id) holding the best k so far
+
+        def search(node):
+            if node is None:
+                return
+            (vector, item_id), axis, left, right = node
+            distance = sum((a - b) ** 2 for a, b in zip(vector, target))
+            if item_id in exclude:
+                pass
+            elif len(heap) < k:
+                heapq.heappush(heap, (-distance, item_id))
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, (-distance, item_id))
+            delta = target[axis] - vector[axis]
+            near, far = (left, right) if delta < 0 else (right, left)
+            search(near)
+            if len(heap) < k or delta ** 2 < -heap[0][0]:
+                search(far)
+
+        if k > 0:
+            search(self.root)
+        return sorted((chord_to_meters(math.sqrt(-distance)), item_id) for distance, item_id in heap)
+
+
+class STRTree:
+    """
+    Static R-tree over bounding boxes, packed with the Sort-Tile-Recursive
+    algorithm: every level is sorted into vertical slices by x, each slice by
+    y, and cut into nodes of `capacity` children.
+    """
+
+    def __init__(self, items, capacity=16):
+        """
+        `items` is an iterable of (id, (min_x, min_y, max_x, max_y)) tuples.
+        """
+        self.capacity = capacity
+        nodes = [(extent, item_id) for item_id, extent in items]
+        self.size = len(nodes)
+        while len(nodes) > 1:
+            nodes = self.pack(nodes)
+        self.root = nodes[0] if nodes else None
+
+    def pack(self, nodes):
+        """
+        Groups the nodes of one level into parent nodes of `capacity` children.
+        """
+        capacity = self.capacity
+        slice_count = math.ceil(math.sqrt(math.ceil(len(nodes) / capacity)))
+        slice_size = slice_count * capacity
+        nodes = sorted(nodes, key=lambda node: node[0][0] + node[0][2])
+        parents = []
+        for start in range(0, len(nodes), slice_size):
+            column = sorted(nodes[start:start + slice_size], key=lambda node: node[0][1] + node[0][3])
+            for offset in range(0, len(column), capacity):
+                children = column[offset:offset + capacity]
+                extent = (
+                    min(child[0][0] for child in children), min(child[0][1] for child in children),
+                    max(child[0][2] for child in children), max(child[0][3] for child in children),
+                )
+                parents.append((extent, children))
+        return parents
+
+    def query(self, x, y):
+        """
+        Returns the ids of the items whose bounding box contains the point.
+        """
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            (min_x, min_y, max_x, max_y), children = stack.pop()
+            if not (min_x <= x <= max_x and min_y <= y <= max_y):
+                continue
+            if isinstance(children, list):
+                stack.extend(children)
+            else:
+                found.append(children)
+        return found
+
+
+_location_tree = None
+_location_tree_version = None
+_location_tree_lock = threading.Lock()
+
+
+def location_tree():
+    """
+    Returns a KDTree over all locations, rebuilt when the row count or the
+    latest `updated_at` changed since it was built.
+    """
+    global _location_tree, _location_tree_version
+    version = Location.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+    version = (version['count'], version['updated_at'])
+    with _location_tree_lock:
+        if _location_tree is None or _location_tree_version != version:
+            rows = Location.objects.values_list('id', 'coordinates').iterator(chunk_size=10000)
+            _location_tree = KDTree((location_id, point.x, point.y) for location_id, point in rows)
+            _location_tree_version = version
+        return _location_tree
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.db import connection, transaction
+
+from .models import Boundary, BoundaryPiece
+from .spatial import is_postgis
+
+# Largest number of vertices of a stored piece. Small pieces have small
+# bounding boxes, so the GiST index finds the one or two pieces around a
+# point and the exact test only walks a few hundred vertices.
+PIECE_MAX_VERTICES = getattr(settings, 'BOUNDARY_PIECE_MAX_VERTICES', 256)
+
+PIECE_INSERT_SQL = """
+    INSERT INTO {piece} (boundary_id, area)
+    SELECT b.id, d.geom
+    FROM {boundary} b, ST_Dump(ST_Subdivide(b.area, %s)) d
+    WHERE b.id = ANY(%s) AND GeometryType(d.geom) = 'POLYGON'
+"""
+
+
+def polygons(geometry):
+    """
+    Returns the non empty polygons of a geometry, flattening collections.
+    """
+    if geometry.geom_type == 'Polygon':
+        return [] if geometry.empty else [geometry]
+    if geometry.geom_type in ('MultiPolygon', 'GeometryCollection'):
+        return [polygon for part in geometry for polygon in polygons(part)]
+    return []
+
+
+def subdivide(area, max_vertices=PIECE_MAX_VERTICES):
+    """
+    Splits a polygon in halves along the longer side of its extent until
+    every piece has at most `max_vertices` vertices, like ST_Subdivide.
+    """
+    min_x, min_y, max_x, max_y = area.extent
+    if area.num_points <= max_vertices or (min_x == max_x and min_y == max_y):
+        return [area]
+    if max_x - min_x >= max_y - min_y:
+        middle = (min_x + max_x) / 2
+        halves = [(min_x, min_y, middle, max_y), (middle, min_y, max_x, max_y)]
+    else:
+        middle = (min_y + max_y) / 2
+        halves = [(min_x, min_y, max_x, middle), (min_x, middle, max_x, max_y)]
+    pieces = []
+    for half in halves:
+        for polygon in polygons(area.intersection(Polygon.from_bbox(half))):
+            polygon.srid = area.srid
+            pieces += subdivide(polygon, max_vertices)
+    return pieces
+
+
+def refresh_pieces(boundaries):
+    """
+    Replaces the stored pieces of the boundaries.
+    """
+    boundary_ids = [boundary.pk for boundary in boundaries]
+    if not boundary_ids:
+        return
+    with transaction.atomic():
+        BoundaryPiece.objects.filter(boundary__in=boundary_ids).delete()
+        if is_postgis():
+            sql = PIECE_INSERT_SQL.format(piece=BoundaryPiece._meta.db_table, boundary=Boundary._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [PIECE_MAX_VERTICES, boundary_ids])
+            return
+        BoundaryPiece.objects.bulk_create(
+            (BoundaryPiece(boundary=boundary, area=piece) for boundary in boundaries for piece in subdivide(boundary.area)),
+            batch_size=1000
+        )
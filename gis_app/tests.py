@@ -1,8 +1,26 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.contrib.auth.models import User
+from django.utils import timezone
 from rest_framework import status
-from .models import Location, Boundary
+from .models import Location, Boundary, BoundarySimplification, BoundaryMembership, BoundaryPiece, ChangeEvent, LocationCluster
+from .simplification import SIMPLIFY_TOLERANCES
+from .subdivision import subdivide
 from django.contrib.gis.geos import Point, Polygon
+from .cache import tile_cache, aggregate_cache, prepared_boundaries
+from .spatial_index import KDTree, STRTree
+from .geocoder import reverse_geocoder
+from .positions import BUFFERED, COMMITTED, position_buffer
+from .metrics import registry
+from .geoparquet import pyarrow
+import json
+import math
+import os
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipIf
 
 
 class UserTests(TestCase):
@@ -41,6 +59,38 @@ class UserTests(TestCase):
         self.assertIn('access_token', response.json())
 
 
+class StatelessJWTTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        Location.objects.create(name='Test Location', description='A test location', coordinates=Point(77.5, 28.5))
+        response = self.client.post('/login/', {'username': 'testuser', 'password': '1234'})
+        self.token = response.json()['access_token']
+        self.client = Client()
+
+    def test_token_request(self):
+        response = self.client.get('/api/locations/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 1)
+        self.assertNotIn('sessionid', response.cookies)
+
+        # Neither the session nor the user is loaded, only the list validators and the locations are queried
+        with self.assertNumQueries(2):
+            self.client.get('/api/locations/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_invalid_token(self):
+        response = self.client.get('/api/locations/', HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_token_ignores_session(self):
+        self.client.login(username='testuser', password='1234')
+        response = self.client.get('/api/locations/', HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/api/locations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
 class LocationTests(TestCase):
 
     def setUp(self):
@@ -86,6 +136,276 @@ class LocationTests(TestCase):
         self.assertEqual(Location.objects.count(), 0)
 
 
+class LocationPositionTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        self.location = Location.objects.create(name='Truck', description='Moving', coordinates=Point(78.0, 27.0))
+        # The tests flush in their own transaction, not in the background thread
+        self.addCleanup(setattr, position_buffer, 'flush_interval', position_buffer.flush_interval)
+        self.addCleanup(setattr, position_buffer, 'durability', position_buffer.durability)
+        position_buffer.flush_interval = None
+        position_buffer.durability = BUFFERED
+
+    def post(self, positions):
+        return self.client.post('/api/locations/positions/', {'positions': positions}, content_type='application/json')
+
+    def test_buffered_positions(self):
+        response = self.post([{'id': self.location.id, 'coordinates': [78.1, 27.1]}])
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.post([{'id': self.location.id, 'coordinates': [78.2, 27.2]}])
+        self.assertEqual(Location.objects.get().coordinates.tuple, (78.0, 27.0))
+
+        updated_at = Location.objects.get().updated_at
+        batch = position_buffer.flush()
+        self.assertEqual(batch.written, {self.location.id})
+        location = Location.objects.get()
+        self.assertEqual(location.coordinates.tuple, (78.2, 27.2))
+        self.assertGreater(location.updated_at, updated_at)
+        self.assertEqual(ChangeEvent.objects.filter(object_id=self.location.id, action=ChangeEvent.UPDATE).count(), 1)
+
+    def test_committed_positions(self):
+        position_buffer.durability = COMMITTED
+        response = self.post([{'id': self.location.id, 'coordinates': [78.1, 27.1]}, {'id': 0, 'coordinates': [0, 0]}])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['missing_ids'], [0])
+        self.assertEqual(Location.objects.get().coordinates.tuple, (78.1, 27.1))
+
+    def test_invalid_positions(self):
+        response = self.post([{'id': self.location.id, 'coordinates': [200, 0]}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LocationPaginationTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        for i in range(3):
+            Location.objects.create(name=f'Location {i}', description='A test location', coordinates=Point(78.0 + i, 27.0))
+
+    def test_keyset_pagination(self):
+        url = '/api/locations/'
+        response = self.client.get(url, {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        page = response.json()
+        self.assertEqual([row['name'] for row in page['results']], ['Location 0', 'Location 1'])
+        self.assertIsNotNone(page['next_cursor'])
+
+        response = self.client.get(url, {'limit': 2, 'cursor': page['next_cursor']})
+        page = response.json()
+        self.assertEqual([row['name'] for row in page['results']], ['Location 2'])
+        self.assertIsNone(page['next_cursor'])
+
+    def test_invalid_pagination(self):
+        response = self.client.get('/api/locations/', {'limit': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_stream_locations(self):
+        response = self.client.get('/api/locations/', {'stream': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        collection = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(collection['type'], 'FeatureCollection')
+        self.assertEqual(len(collection['features']), 3)
+        self.assertEqual(collection['features'][0]['geometry']['coordinates'], [78.0, 27.0])
+
+    def test_geojson_locations(self):
+        response = self.client.get('/api/locations/', {'geojson': 'true', 'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        collection = json.loads(response.content)
+        self.assertEqual([feature['properties']['name'] for feature in collection['features']], ['Location 0', 'Location 1'])
+        self.assertEqual(collection['features'][1]['geometry'], {'type': 'Point', 'coordinates': [79.0, 27.0]})
+        self.assertEqual(collection['next_cursor'], collection['features'][1]['id'])
+
+    def test_benchmark_serializers(self):
+        out = StringIO()
+        call_command('benchmark_serializers', '--model', 'locations', '--repeat', '1', stdout=out)
+        self.assertIn('locations: 3 rows', out.getvalue())
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        self.location = Location.objects.create(name='Test Location', description='A test location', coordinates=Point(77.5, 28.5))
+
+    def test_list_not_modified(self):
+        response = self.client.get('/api/locations/')
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+
+        response = self.client.get('/api/locations/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        response = self.client.get('/api/locations/', {'geojson': 'true'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.client.delete(f'/api/locations/{self.location.id}/')
+        response = self.client.get('/api/locations/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_etag_follows_writes_within_a_second(self):
+        etag = self.client.get('/api/locations/')['ETag']
+        url = f'/api/locations/{self.location.id}/'
+        self.client.put(url, {'name': 'Updated Location'}, content_type='application/json')
+        # Same row count and latest updated_at as before the update
+        Location.objects.filter(pk=self.location.pk).update(updated_at=self.location.updated_at)
+        response = self.client.get('/api/locations/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_not_modified(self):
+        url = f'/api/locations/{self.location.id}/'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.put(url, {'name': 'Updated Location'}, content_type='application/json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['name'], 'Updated Location')
+        self.assertEqual(self.client.get(f'/api/locations/{self.location.id + 1}/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_since(self):
+        Location.objects.filter(pk=self.location.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        Location.objects.create(name='New Location', description='A new location', coordinates=Point(77.6, 28.6))
+        since = (timezone.now() - timedelta(hours=1)).isoformat()
+        response = self.client.get('/api/locations/', {'since': since})
+        self.assertEqual([row['name'] for row in response.json()], ['New Location'])
+        response = self.client.get('/api/locations/', {'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LocationSpatialFilterTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        Location.objects.create(name='Taj Mahal', description='Agra', coordinates=Point(78.042155, 27.175015))
+        Location.objects.create(name='Agra Fort', description='Agra', coordinates=Point(78.0211, 27.1795))
+        Location.objects.create(name='Qutub Minar', description='Delhi', coordinates=Point(77.185455, 28.524428))
+
+    def test_bbox_filter(self):
+        response = self.client.get('/api/locations/', {'bbox': '78.0,27.0,78.1,27.2'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(row['name'] for row in response.json()), ['Agra Fort', 'Taj Mahal'])
+
+    def test_radius_filter(self):
+        response = self.client.get('/api/locations/', {'near': '78.042155,27.175015', 'radius': 1000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['name'] for row in response.json()], ['Taj Mahal'])
+
+        response = self.client.get('/api/locations/', {'near': '78.042155,27.175015', 'radius': 5000})
+        self.assertEqual(len(response.json()), 2)
+
+    def test_radius_filter_across_antimeridian(self):
+        Location.objects.create(name='Taveuni', description='Fiji', coordinates=Point(179.99, -16.8))
+        response = self.client.get('/api/locations/', {'near': '-179.99,-16.8', 'radius': 5000})
+        self.assertEqual([row['name'] for row in response.json()], ['Taveuni'])
+
+    def test_invalid_filter(self):
+        response = self.client.get('/api/locations/', {'bbox': '78.0,27.0'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/locations/', {'near': '78.0,27.0'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NearestLocationsTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        Location.objects.create(name='Taj Mahal', description='Agra', coordinates=Point(78.042155, 27.175015))
+        Location.objects.create(name='Agra Fort', description='Agra', coordinates=Point(78.0211, 27.1795))
+        Location.objects.create(name='Qutub Minar', description='Delhi', coordinates=Point(77.185455, 28.524428))
+
+    def test_nearest_locations(self):
+        response = self.client.get('/api/locations/nearest/', {'lon': 78.04, 'lat': 27.17, 'k': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()
+        self.assertEqual([row['name'] for row in results], ['Taj Mahal', 'Agra Fort'])
+        self.assertLess(results[0]['distance'], results[1]['distance'])
+
+    def test_nearest_locations_across_antimeridian(self):
+        Location.objects.create(name='Taveuni', description='Fiji', coordinates=Point(179.99, -16.8))
+        Location.objects.create(name='Lau Islands', description='Fiji', coordinates=Point(-179.5, -16.8))
+        response = self.client.get('/api/locations/nearest/', {'lon': -179.99, 'lat': -16.8, 'k': 1})
+        self.assertEqual([row['name'] for row in response.json()], ['Taveuni'])
+
+    def test_nearest_locations_invalid_data(self):
+        response = self.client.get('/api/locations/nearest/', {'lon': 78.04})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_kdtree_matches_brute_force(self):
+        items = [(i, (i * 37) % 360 - 180, (i * 11) % 180 - 90) for i in range(200)]
+        tree = KDTree(items)
+        expected = sorted(items, key=lambda item: Point(item[1], item[2]).distance(Point(179.5, 0.5)))[:1]
+        self.assertEqual([location_id for _, location_id in tree.nearest(179.5, 0.5, 1)], [expected[0][0]])
+        self.assertEqual(len(tree.nearest(0, 0, 5)), 5)
+
+
+class ReverseGeocodeTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        reverse_geocoder.reset()
+        self.boundary = Boundary.objects.create(name='Agra', area=Polygon(((78.0, 27.1), (78.0, 27.2), (78.1, 27.2), (78.1, 27.1), (78.0, 27.1))))
+        self.taj = Location.objects.create(name='Taj Mahal', description='Agra', coordinates=Point(78.042155, 27.175015))
+        Location.objects.create(name='Qutub Minar', description='Delhi', coordinates=Point(77.185455, 28.524428))
+
+    def test_reverse_geocode(self):
+        response = self.client.get('/api/geocode/reverse/', {'point': '78.04,27.17'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = response.json()
+        self.assertEqual(result['boundaries'], [{'id': self.boundary.id, 'name': 'Agra'}])
+        self.assertEqual([location['name'] for location in result['nearest']], ['Taj Mahal'])
+
+    def test_reverse_geocode_batch(self):
+        response = self.client.post('/api/geocode/reverse/', {'points': [[78.04, 27.17], [77.19, 28.52]], 'k': 2}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()
+        self.assertEqual([len(result['boundaries']) for result in results], [1, 0])
+        self.assertEqual([result['nearest'][0]['name'] for result in results], ['Taj Mahal', 'Qutub Minar'])
+
+    def test_reverse_geocode_without_queries(self):
+        self.client.get('/api/geocode/reverse/', {'point': '78.04,27.17'})
+        reverse_geocoder.next_refresh = float('inf')
+        # Only the session and the user are read
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/geocode/reverse/', {'point': '78.04,27.17'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_reverse_geocode_follows_writes(self):
+        self.client.get('/api/geocode/reverse/', {'point': '78.04,27.17'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f'/api/locations/{self.taj.id}/', {'name': 'Taj Mahal', 'description': 'Agra', 'coordinates': {'type': 'Point', 'coordinates': [77.2, 28.5]}}, content_type='application/json')
+            self.client.delete(f'/api/boundaries/{self.boundary.id}/')
+        result = self.client.get('/api/geocode/reverse/', {'point': '78.04,27.17', 'k': 2}).json()
+        self.assertEqual(result['boundaries'], [])
+        self.assertEqual([location['name'] for location in result['nearest']], ['Qutub Minar', 'Taj Mahal'])
+
+    def test_reverse_geocode_invalid_data(self):
+        self.assertEqual(self.client.get('/api/geocode/reverse/', {'point': '200,0'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post('/api/geocode/reverse/', {'points': []}, content_type='application/json').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_strtree_matches_brute_force(self):
+        items = [(i, ((i * 37) % 350 - 180, (i * 11) % 170 - 90, (i * 37) % 350 - 170, (i * 11) % 170 - 80)) for i in range(200)]
+        tree = STRTree(items)
+        expected = [i for i, (min_x, min_y, max_x, max_y) in items if min_x <= 5 <= max_x and min_y <= 5 <= max_y]
+        self.assertEqual(sorted(tree.query(5, 5)), expected)
+
+
 class BoundaryTests(TestCase):
 
     def setUp(self):
@@ -124,6 +444,31 @@ class BoundaryTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.json()), 1)
 
+    def test_stream_boundaries(self):
+        Boundary.objects.create(name='Test Boundary', area=Polygon(self.coordinates[0]))
+        response = self.client.get('/api/boundaries/', {'stream': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        collection = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(collection['features']), 1)
+        self.assertEqual(collection['features'][0]['properties']['name'], 'Test Boundary')
+
+    def test_simplified_boundary(self):
+        url = '/api/boundaries/'
+        data = {'name': 'Test Boundary', 'area': {'type': 'Polygon', 'coordinates': self.coordinates}}
+        boundary_id = self.client.post(url, data, content_type='application/json').json()['id']
+        self.assertEqual(BoundarySimplification.objects.filter(boundary_id=boundary_id).count(), len(SIMPLIFY_TOLERANCES))
+
+        response = self.client.get(f'/api/boundaries/{boundary_id}/', {'simplify': '0.001', 'precision': '3'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('78.03 27.18', response.json()['area'])
+
+        response = self.client.get(url, {'geojson': 'true', 'simplify': '0.001', 'precision': '2'})
+        ring = json.loads(response.content)['features'][0]['geometry']['coordinates'][0]
+        self.assertEqual(ring[0], [78.03, 27.18])
+
+        response = self.client.get(url, {'precision': '-1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_update_boundary(self):
         boundary = Boundary.objects.create(name='Test Boundary', area=Polygon(self.coordinates[0]))
         url = f'/api/boundaries/{boundary.id}/'
@@ -140,6 +485,163 @@ class BoundaryTests(TestCase):
         self.assertEqual(Boundary.objects.count(), 0)
 
 
+class BulkWriteTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+
+    def test_bulk_create_locations(self):
+        data = [
+            {'name': 'First', 'description': 'First location', 'coordinates': {'type': 'Point', 'coordinates': [77.1, 28.6]}},
+            {'name': 'Second', 'description': 'Second location', 'coordinates': {'type': 'Point', 'coordinates': [77.2, 28.7]}},
+        ]
+        response = self.client.post('/api/locations/bulk/', data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Location.objects.count(), 2)
+        self.assertEqual([result['status'] for result in response.json()['results']], [201, 201])
+
+    def test_bulk_create_reports_invalid_items(self):
+        data = {
+            'type': 'FeatureCollection',
+            'features': [
+                {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [77.1, 28.6]},
+                 'properties': {'name': 'Valid', 'description': 'Valid location'}},
+                {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': ['x']},
+                 'properties': {'name': 'Invalid', 'description': 'Invalid location'}},
+            ],
+        }
+        response = self.client.post('/api/locations/bulk/', data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        results = response.json()['results']
+        self.assertEqual(results[0]['status'], 201)
+        self.assertEqual(results[1]['status'], 400)
+        self.assertIn('coordinates', results[1]['errors'])
+        self.assertEqual(Location.objects.get().name, 'Valid')
+
+    def test_bulk_update_locations(self):
+        location = Location.objects.create(name='Test Location', description='A test location', coordinates=Point(77.1, 28.6))
+        data = [
+            {'id': location.id, 'name': 'Updated Location'},
+            {'id': location.id + 1, 'name': 'Missing Location'},
+        ]
+        response = self.client.patch('/api/locations/bulk/', data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([result['status'] for result in response.json()['results']], [200, 404])
+        location.refresh_from_db()
+        self.assertEqual(location.name, 'Updated Location')
+        self.assertEqual(location.description, 'A test location')
+
+    def test_bulk_delete_boundaries(self):
+        boundary = Boundary.objects.create(name='Test Boundary', area=Polygon(((0, 0), (0, 1), (1, 1), (1, 0), (0, 0))))
+        response = self.client.delete('/api/boundaries/bulk/', {'ids': [boundary.id]}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][0]['status'], 204)
+        self.assertEqual(Boundary.objects.count(), 0)
+
+    def test_bulk_rejects_other_payloads(self):
+        response = self.client.post('/api/boundaries/bulk/', {'name': 'Test Boundary'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ChangeFeedTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+
+    def get_changes(self, **params):
+        response = self.client.get('/api/changes/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_change_feed(self):
+        data = {'name': 'Kept Location', 'description': 'A location', 'coordinates': {'type': 'Point', 'coordinates': [77.5, 28.5]}}
+        kept = self.client.post('/api/locations/', data, content_type='application/json').json()['id']
+        self.client.put(f'/api/locations/{kept}/', {'name': 'Renamed Location'}, content_type='application/json')
+        data['name'] = 'Deleted Location'
+        deleted = self.client.post('/api/locations/', data, content_type='application/json').json()['id']
+        self.client.delete(f'/api/locations/{deleted}/')
+
+        feed = self.get_changes()
+        changes = feed['changes']
+        self.assertEqual(
+            [(change['id'], change['action']) for change in changes],
+            [(kept, 'create'), (kept, 'update'), (deleted, 'create'), (deleted, 'delete')]
+        )
+        self.assertEqual(changes[0]['feature']['properties']['name'], 'Renamed Location')
+        self.assertIsNone(changes[3]['feature'])
+        self.assertEqual(feed['last_seq'], changes[-1]['seq'])
+
+        self.assertEqual(self.get_changes(after=feed['last_seq']), {'changes': [], 'last_seq': feed['last_seq']})
+        page = self.get_changes(limit=1)
+        self.assertEqual(len(page['changes']), 1)
+        self.assertEqual(page['last_seq'], changes[0]['seq'])
+        self.assertEqual(len(self.get_changes(after=page['last_seq'])['changes']), 3)
+
+    def test_model_filter(self):
+        data = {'name': 'Test Boundary', 'area': {'type': 'Polygon', 'coordinates': [[[77, 28], [77, 29], [78, 29], [78, 28], [77, 28]]]}}
+        self.client.post('/api/boundaries/', data, content_type='application/json')
+        data = [{'name': 'Bulk Location', 'description': 'A location', 'coordinates': {'type': 'Point', 'coordinates': [77.5, 28.5]}}] * 2
+        self.client.post('/api/locations/bulk/', data, content_type='application/json')
+        self.assertEqual([change['action'] for change in self.get_changes(model='location')['changes']], ['create', 'create'])
+        self.assertEqual([change['model'] for change in self.get_changes(model='boundary')['changes']], ['boundary'])
+        response = self.client.get('/api/changes/', {'model': 'user'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_write_rolls_back_without_change_event(self):
+        data = {'name': 'Lost Location', 'description': 'A location', 'coordinates': {'type': 'Point', 'coordinates': [77.5, 28.5]}}
+        with mock.patch('gis_app.hooks.record_changes', side_effect=RuntimeError('no change log')):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/locations/', data, content_type='application/json')
+        self.assertFalse(Location.objects.exists())
+
+
+@skipIf(pyarrow is None, 'pyarrow is not installed')
+class ParquetTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        Location.objects.create(name='Agra', description='Taj Mahal', coordinates=Point(78.04, 27.17))
+        Location.objects.create(name='Delhi', description='Red Fort', coordinates=Point(77.24, 28.66))
+
+    def export(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content)
+
+    def test_export_and_import(self):
+        data = self.export('/api/locations/parquet/')
+        table = pyarrow.parquet.read_table(BytesIO(data))
+        self.assertEqual(sorted(table.column('name').to_pylist()), ['Agra', 'Delhi'])
+        self.assertIn(b'geo', table.schema.metadata)
+
+        Location.objects.all().delete()
+        upload = SimpleUploadedFile('locations.parquet', data)
+        response = self.client.post('/api/locations/parquet/?bbox=78,27,79,28', {'file': upload})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json(), {'created': 1, 'skipped': 0})
+        self.assertEqual(Location.objects.get().description, 'Taj Mahal')
+
+    def test_command_round_trip(self):
+        Boundary.objects.create(name='Test Boundary', area=Polygon(((77, 28), (77, 29), (78, 29), (78, 28), (77, 28))))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'boundaries.parquet')
+            call_command('export_parquet', path, model='boundary', stdout=StringIO())
+            Boundary.objects.all().delete()
+            call_command('import_parquet', path, model='boundary', stdout=StringIO())
+        self.assertEqual(Boundary.objects.get().name, 'Test Boundary')
+
+        # Points are not boundaries
+        upload = SimpleUploadedFile('locations.parquet', self.export('/api/locations/parquet/'))
+        response = self.client.post('/api/boundaries/parquet/', {'file': upload})
+        self.assertEqual(response.json(), {'created': 0, 'skipped': 2})
+
+
 class CalculateDistanceTests(TestCase):
 
     def setUp(self):
@@ -159,6 +661,61 @@ class CalculateDistanceTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()['distance'], 1.5983899194404934)
 
+    def test_calculate_distance_coordinates(self):
+        url = '/api/locations/distance/'
+        data = {
+            'location1': [78.042155, 27.175015],
+            'location2': [77.185455, 28.524428]
+        }
+        # Without a session cookie nothing is read from the database
+        with self.assertNumQueries(0):
+            response = Client().post(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['distance'], 1.5983899194404934)
+        response = self.client.post(url, {'location1': [78.042155, 27.175015]}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DistanceMatrixTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        self.url = '/api/locations/distance/matrix/'
+
+    def test_distance_matrix_ids(self):
+        location1 = Location.objects.create(name='Location 1', description='First location', coordinates=Point(78.042155, 27.175015))
+        location2 = Location.objects.create(name='Location 2', description='Second location', coordinates=Point(77.185455, 28.524428))
+        data = {
+            'origin_ids': [location1.id, location2.id],
+            'destination_ids': [location2.id]
+        }
+        response = self.client.post(self.url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        distances = response.json()['distances']
+        self.assertEqual(len(distances), 2)
+        self.assertAlmostEqual(distances[0][0], 172070, delta=10)
+        self.assertEqual(distances[1][0], 0)
+
+    def test_distance_matrix_streams_large_matrix(self):
+        data = {
+            'origins': [[78.0 + i / 1000, 27.0] for i in range(101)],
+            'destinations': [[77.0, 28.0 + i / 1000] for i in range(100)]
+        }
+        response = self.client.post(self.url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        result = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(result['distances']), 101)
+        self.assertEqual(len(result['distances'][0]), 100)
+
+    def test_distance_matrix_invalid_data(self):
+        response = self.client.post(self.url, {'origins': [[78.0, 27.0]]}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data = {'origin_ids': [0], 'destinations': [[78.0, 27.0]]}
+        response = self.client.post(self.url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class CheckBoundaryTests(TestCase):
 
@@ -194,3 +751,513 @@ class CheckBoundaryTests(TestCase):
         self.assertEqual(response1.status_code, status.HTTP_200_OK)
         self.assertFalse(response1.json()['is_within'])
         self.assertTrue(response2.json()['is_within'])
+
+    def test_check_inline_boundary(self):
+        url = '/api/locations/within_boundary/'
+        data = {
+            'location': [78.042155, 27.175015],
+            'boundary': {'type': 'Polygon', 'coordinates': self.coordinates}
+        }
+        # Without a session cookie nothing is read from the database
+        with self.assertNumQueries(0):
+            response = Client().post(url, data, content_type='application/json')
+        self.assertTrue(response.json()['is_within'])
+        data['boundary']['coordinates'] = [[[0, 0], [1, 1], [0, 1], [1, 0], [0, 0]]]
+        response = self.client.post(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prepared_boundary_cache(self):
+        prepared_boundaries.clear()
+        boundary = Boundary.objects.create(name='Test Boundary', area=Polygon(self.coordinates[0]))
+        url = '/api/locations/within_boundary/'
+        data = {'location': [78.042155, 27.175015], 'boundary_id': boundary.id}
+        anonymous = Client()
+        with self.assertNumQueries(2):
+            self.assertTrue(anonymous.post(url, data, content_type='application/json').json()['is_within'])
+        # The prepared area is reused while the boundary is unchanged
+        with self.assertNumQueries(1):
+            self.assertTrue(anonymous.post(url, data, content_type='application/json').json()['is_within'])
+
+        area = {'type': 'Polygon', 'coordinates': [[[77, 28], [77, 29], [78, 29], [78, 28], [77, 28]]]}
+        self.client.put(f'/api/boundaries/{boundary.id}/', {'area': area}, content_type='application/json')
+        self.assertFalse(self.client.post(url, data, content_type='application/json').json()['is_within'])
+        data['boundary_id'] = boundary.id + 1
+        self.assertEqual(self.client.post(url, data, content_type='application/json').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BoundaryMembershipTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+
+    def create(self, url, data):
+        response = self.client.post(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.json()['id']
+
+    def test_memberships_follow_writes(self):
+        inside = self.create('/api/locations/', {
+            'name': 'Inside', 'description': 'Inside the boundary', 'coordinates': {'type': 'Point', 'coordinates': [0.5, 0.5]}
+        })
+        boundary = self.create('/api/boundaries/', {
+            'name': 'Square', 'area': {'type': 'Polygon', 'coordinates': [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]}
+        })
+        outside = self.create('/api/locations/', {
+            'name': 'Outside', 'description': 'Outside the boundary', 'coordinates': {'type': 'Point', 'coordinates': [2, 2]}
+        })
+
+        response = self.client.get(f'/api/boundaries/{boundary}/locations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.json()], [inside])
+        response = self.client.get(f'/api/locations/{inside}/boundaries/')
+        self.assertEqual([row['id'] for row in response.json()], [boundary])
+
+        data = {'coordinates': {'type': 'Point', 'coordinates': [0.25, 0.25]}}
+        self.client.put(f'/api/locations/{outside}/', data, content_type='application/json')
+        response = self.client.get(f'/api/boundaries/{boundary}/locations/')
+        self.assertEqual(sorted(row['id'] for row in response.json()), sorted([inside, outside]))
+
+        self.client.delete(f'/api/locations/{inside}/')
+        self.assertEqual(list(BoundaryMembership.objects.values_list('location_id', flat=True)), [outside])
+
+    def test_memberships_of_subdivided_boundary(self):
+        # A star shaped polygon too large for a single piece
+        ring = [(math.cos(i * math.pi / 500) * (1 + i % 2), math.sin(i * math.pi / 500) * (1 + i % 2)) for i in range(1000)]
+        boundary = self.create('/api/boundaries/', {'name': 'Star', 'area': {'type': 'Polygon', 'coordinates': [ring + ring[:1]]}})
+        pieces = list(BoundaryPiece.objects.filter(boundary_id=boundary).values_list('area', flat=True))
+        self.assertGreater(len(pieces), 1)
+        self.assertTrue(all(piece.num_points <= 256 for piece in pieces))
+        self.assertAlmostEqual(sum(piece.area for piece in pieces), Boundary.objects.get(id=boundary).area.area)
+
+        inside = self.create('/api/locations/', {
+            'name': 'Inside', 'description': 'Inside the boundary', 'coordinates': {'type': 'Point', 'coordinates': [0.5, 0.5]}
+        })
+        self.create('/api/locations/', {
+            'name': 'Outside', 'description': 'Outside the boundary', 'coordinates': {'type': 'Point', 'coordinates': [3, 3]}
+        })
+        response = self.client.get(f'/api/boundaries/{boundary}/locations/')
+        self.assertEqual([row['id'] for row in response.json()], [inside])
+        response = self.client.post('/api/locations/within_boundary/batch/', {'points': [[0, 0], [3, 3]], 'boundary_ids': [boundary]}, content_type='application/json')
+        self.assertEqual([row['boundary_ids'] for row in response.json()['results']], [[boundary], []])
+
+        data = {'area': {'type': 'Polygon', 'coordinates': [[[2, 2], [2, 4], [4, 4], [4, 2], [2, 2]]]}}
+        self.client.put(f'/api/boundaries/{boundary}/', data, content_type='application/json')
+        self.assertEqual(BoundaryPiece.objects.filter(boundary_id=boundary).count(), 1)
+
+    def test_subdivide(self):
+        area = Polygon([(i / 100, (i % 2) / 10) for i in range(1000)] + [(10, 1), (0, 1), (0, 0)], srid=4326)
+        pieces = subdivide(area, 64)
+        self.assertTrue(all(piece.num_points <= 64 for piece in pieces))
+        self.assertAlmostEqual(sum(piece.area for piece in pieces), area.area)
+        self.assertEqual(subdivide(Polygon(((0, 0), (0, 1), (1, 1), (0, 0)))), [Polygon(((0, 0), (0, 1), (1, 1), (0, 0)))])
+
+    def test_missing_boundary(self):
+        response = self.client.get('/api/boundaries/999/locations/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_rebuild_memberships(self):
+        boundary = Boundary.objects.create(name='Square', area=Polygon(((0, 0), (0, 1), (1, 1), (1, 0), (0, 0))))
+        location = Location.objects.create(name='Inside', description='Inside the boundary', coordinates=Point(0.5, 0.5))
+        Location.objects.create(name='Outside', description='Outside the boundary', coordinates=Point(2, 2))
+        call_command('rebuild_memberships', stdout=StringIO())
+        self.assertEqual(list(BoundaryMembership.objects.values_list('location_id', 'boundary_id')), [(location.id, boundary.id)])
+
+
+class AggregationTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        aggregate_cache.invalidate()
+        self.boundary = self.client.post('/api/boundaries/', {
+            'name': 'Square', 'area': {'type': 'Polygon', 'coordinates': [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]}
+        }, content_type='application/json').json()['id']
+        for lon, lat in ((0.25, 0.25), (0.3, 0.35), (0.75, 0.75), (2, 2)):
+            self.create_location(lon, lat)
+
+    def create_location(self, lon, lat):
+        # The aggregates are invalidated once the write committed
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/locations/', {
+                'name': f'Location {lon} {lat}', 'description': 'A test location',
+                'coordinates': {'type': 'Point', 'coordinates': [lon, lat]}
+            }, content_type='application/json')
+
+    def test_boundary_counts(self):
+        response = self.client.get('/api/aggregate/boundaries/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [{'id': self.boundary, 'name': 'Square', 'count': 3}])
+
+        self.create_location(0.5, 0.5)
+        response = self.client.get('/api/aggregate/boundaries/')
+        self.assertEqual(response.json()[0]['count'], 4)
+
+    def test_square_grid(self):
+        response = self.client.get('/api/aggregate/grid/', {'bbox': '0,0,1,1', 'size': '0.5'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        cells = {tuple(cell['center']): cell['count'] for cell in response.json()['cells']}
+        self.assertEqual(cells, {(0.25, 0.25): 2, (0.75, 0.75): 1})
+
+    def test_hex_grid(self):
+        response = self.client.get('/api/aggregate/grid/', {'bbox': '0,0,1,1', 'size': '0.5', 'shape': 'hex'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(cell['count'] for cell in response.json()['cells']), 3)
+
+    def test_invalid_grid(self):
+        response = self.client.get('/api/aggregate/grid/', {'bbox': '0,0,1,1', 'size': '0.5', 'shape': 'circle'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/aggregate/grid/', {'bbox': '-180,-90,180,90', 'size': '0.0001'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LocationClusterTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+
+    def create_location(self, lon, lat):
+        response = self.client.post('/api/locations/', {
+            'name': 'Test Location', 'description': 'A test location',
+            'coordinates': {'type': 'Point', 'coordinates': [lon, lat]}
+        }, content_type='application/json')
+        return response.json()['id']
+
+    def get_clusters(self, zoom, bbox='-180,-85,180,85'):
+        response = self.client.get('/api/locations/clusters/', {'zoom': zoom, 'bbox': bbox})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(feature['properties']['count'], feature['geometry']['coordinates']) for feature in response.json()['features']]
+
+    def test_clusters_follow_writes(self):
+        first = self.create_location(77.0, 28.0)
+        self.create_location(77.2, 28.2)
+        self.create_location(-74.0, 40.7)
+        clusters = self.get_clusters(0)
+        self.assertEqual(sorted(count for count, _ in clusters), [1, 2])
+        self.assertIn([77.1, 28.1], [[round(lon, 6), round(lat, 6)] for _, (lon, lat) in clusters])
+
+        self.client.put(f'/api/locations/{first}/', {'coordinates': {'type': 'Point', 'coordinates': [-74.1, 40.8]}}, content_type='application/json')
+        self.assertEqual(sorted(count for count, _ in self.get_clusters(0)), [1, 2])
+        self.client.delete(f'/api/locations/{first}/')
+        self.assertEqual(sorted(count for count, _ in self.get_clusters(0)), [1, 1])
+        self.assertFalse(LocationCluster.objects.filter(count__lte=0).exists())
+
+    def test_rebuild_clusters(self):
+        Location.objects.create(name='Test Location', description='A test location', coordinates=Point(77.0, 28.0))
+        call_command('rebuild_clusters', stdout=StringIO())
+        self.assertEqual(self.get_clusters(5, '76,27,78,29'), [(1, [77.0, 28.0])])
+
+    def test_invalid_zoom(self):
+        response = self.client.get('/api/locations/clusters/', {'zoom': 30, 'bbox': '0,0,1,1'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/locations/clusters/', {'zoom': 16, 'bbox': '-180,-85,180,85'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.location = Location.objects.create(name='Test Location', description='A test location', coordinates=Point(78.04, 27.175))
+        self.other = Location.objects.create(name='Other Location', description='Another location', coordinates=Point(78.06, 27.175))
+        self.boundary = Boundary.objects.create(name='Test Boundary', area=Polygon(((78.03, 27.17), (78.03, 27.18), (78.05, 27.18), (78.05, 27.17), (78.03, 27.17))))
+
+    async def test_location_list(self):
+        response = await self.async_client.get('/api/async/locations/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/async/locations/', {'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Test Location'])
+
+        response = await self.async_client.get('/api/async/locations/', {'stream': 'true'})
+        collection = json.loads(b''.join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual(len(collection['features']), 2)
+
+    async def test_boundary_detail(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f'/api/async/boundaries/{self.boundary.id}/', {'precision': '2'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('78.03 27.17', response.json()['area'])
+        response = await self.async_client.get(f'/api/async/boundaries/{self.boundary.id + 1}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_distance_and_within_boundary(self):
+        data = {'location1_id': self.location.id, 'location2_id': self.other.id}
+        response = await self.async_client.post('/api/async/locations/distance/', data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertAlmostEqual(response.json()['distance'], 0.02)
+
+        data = {'location_id': self.location.id, 'boundary_id': self.boundary.id}
+        response = await self.async_client.post('/api/async/locations/within_boundary/', data, content_type='application/json')
+        self.assertTrue(response.json()['is_within'])
+
+
+class BatchCheckBoundaryTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        self.agra = Boundary.objects.create(name='Agra', area=Polygon.from_bbox((77.9, 27.0, 78.2, 27.3)))
+        self.taj = Boundary.objects.create(name='Taj', area=Polygon.from_bbox((78.03, 27.17, 78.05, 27.18)))
+        self.location1 = Location.objects.create(name='Taj Mahal', description='Agra', coordinates=Point(78.042155, 27.175015))
+        self.location2 = Location.objects.create(name='Qutub Minar', description='Delhi', coordinates=Point(77.185455, 28.524428))
+        self.url = '/api/locations/within_boundary/batch/'
+
+    def test_batch_location_ids(self):
+        data = {
+            'location_ids': [self.location1.id, self.location2.id, 0],
+            'boundary_ids': [self.agra.id, self.taj.id]
+        }
+        response = self.client.post(self.url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'], [
+            {'location_id': self.location1.id, 'boundary_ids': [self.agra.id, self.taj.id]},
+            {'location_id': self.location2.id, 'boundary_ids': []},
+        ])
+        self.assertEqual(response.json()['missing_location_ids'], [0])
+
+    def test_batch_points_matrix(self):
+        data = {
+            'points': [[78.042155, 27.175015], [78.0, 27.1], [77.185455, 28.524428]],
+            'boundary_ids': [self.agra.id, self.taj.id],
+            'format': 'matrix'
+        }
+        response = self.client.post(self.url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['matrix'], [[True, True], [True, False], [False, False]])
+
+    def test_batch_invalid_data(self):
+        response = self.client.post(self.url, {'boundary_ids': [self.agra.id]}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data = {'points': [[78.0, 27.1]], 'boundary_ids': [0]}
+        response = self.client.post(self.url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TileTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        tile_cache.clear()
+        self.coordinates = [
+                        [
+                            [78.030155, 27.180015],
+                            [78.030155, 27.170015],
+                            [78.050155, 27.170015],
+                            [78.050155, 27.180015],
+                            [78.030155, 27.180015]
+                        ]
+                    ]
+        Location.objects.create(name='Taj Mahal', description='Agra', coordinates=Point(78.042155, 27.175015))
+        Boundary.objects.create(name='Test Boundary', area=Polygon(self.coordinates[0]))
+
+    def test_get_tile(self):
+        response = self.client.get('/tiles/0/0/0.mvt')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertIn(b'locations', response.content)
+        self.assertIn(b'boundaries', response.content)
+
+    def test_get_single_layer_tile(self):
+        response = self.client.get('/tiles/0/0/0.mvt', {'layers': 'locations'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'Taj Mahal', response.content)
+        self.assertNotIn(b'boundaries', response.content)
+
+    def test_empty_tile(self):
+        response = self.client.get('/tiles/10/0/0.mvt')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b'')
+
+    def test_tile_requires_authentication(self):
+        response = Client().get('/tiles/0/0/0.mvt')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_tile(self):
+        response = self.client.get('/tiles/1/2/0.mvt')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/tiles/0/0/0.mvt', {'layers': 'roads'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TileCacheTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        tile_cache.clear()
+        self.rendered = []
+
+    def render(self, layer, z, x, y):
+        self.rendered.append((layer, z, x, y))
+        return b'tile'
+
+    def test_cached_tile_is_not_rendered_again(self):
+        tile_cache.get_or_render('locations', 14, 11743, 6906, self.render)
+        tile_cache.get_or_render('locations', 14, 11743, 6906, self.render)
+        self.assertEqual(len(self.rendered), 1)
+
+    def test_invalidate_only_intersecting_tiles(self):
+        tile_cache.get_or_render('locations', 14, 11743, 6906, self.render)
+        tile_cache.get_or_render('locations', 14, 0, 0, self.render)
+        tile_cache.get_or_render('boundaries', 14, 11743, 6906, self.render)
+        tile_cache.invalidate('locations', [Point(78.042155, 27.175015)])
+
+        tile_cache.get_or_render('locations', 14, 11743, 6906, self.render)
+        tile_cache.get_or_render('locations', 14, 0, 0, self.render)
+        tile_cache.get_or_render('boundaries', 14, 11743, 6906, self.render)
+        self.assertEqual(self.rendered.count(('locations', 14, 11743, 6906)), 2)
+        self.assertEqual(self.rendered.count(('locations', 14, 0, 0)), 1)
+        self.assertEqual(self.rendered.count(('boundaries', 14, 11743, 6906)), 1)
+
+    def test_write_invalidates_tile(self):
+        url = '/tiles/0/0/0.mvt'
+        self.assertNotIn(b'Taj Mahal', self.client.get(url).content)
+        data = {
+            'name': 'Taj Mahal',
+            'description': 'Agra',
+            'coordinates': {'type': 'Point', 'coordinates': [78.042155, 27.175015]}
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/locations/', data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn(b'Taj Mahal', self.client.get(url).content)
+
+        location_id = response.json()['id']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/locations/{location_id}/')
+        self.assertNotIn(b'Taj Mahal', self.client.get(url).content)
+
+
+class LoadLocationsTests(TestCase):
+
+    def write_csv(self, content, suffix='.csv'):
+        file = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8')
+        with file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_load_locations(self):
+        path = self.write_csv(
+            'name,description,latitude,longitude\n'
+            'Taj Mahal,Agra,27.175015,78.042155\n'
+            'Taj Mahal again,,27.175015,78.042155\n'
+            'Qutub Minar,Delhi,28.524428,77.185455\n'
+            'Broken,,not a number,77.0\n'
+        )
+        out = StringIO()
+        call_command('load_locations', path, batch_size=2, stdout=out)
+        self.assertEqual(Location.objects.count(), 2)
+        self.assertIn('rows/sec', out.getvalue())
+
+    def test_load_locations_skips_existing_rows(self):
+        Location.objects.create(name='Taj Mahal', description='Agra', coordinates=Point(78.042155, 27.175015))
+        path = self.write_csv(
+            'name,description,latitude,longitude\n'
+            'Taj Mahal,Agra,27.175015,78.042155\n'
+            'Qutub Minar,,28.524428,77.185455\n'
+        )
+        call_command('load_locations', path, stdout=StringIO())
+        self.assertEqual(Location.objects.count(), 2)
+        self.assertEqual(Location.objects.get(name='Qutub Minar').description, 'No description available')
+
+    def test_load_locations_in_parallel(self):
+        csv_path = self.write_csv(
+            'name,description,latitude,longitude\n'
+            'Taj Mahal,Agra,27.175015,78.042155\n'
+        )
+        features = [
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [77.185455, 28.524428]}, 'properties': {'name': 'Qutub Minar'}},
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [78.042155, 27.175015]}, 'properties': {'name': 'Taj Mahal'}},
+        ]
+        geojson_path = self.write_csv('\n'.join(json.dumps(feature) for feature in features), suffix='.geojsonl')
+        call_command('load_locations', csv_path, geojson_path, workers=2, batch_size=1, stdout=StringIO())
+        self.assertEqual(Location.objects.count(), 2)
+
+    def test_load_locations_resumes_from_checkpoint(self):
+        path = self.write_csv(
+            'name,description,latitude,longitude\n'
+            'Taj Mahal,Agra,27.175015,78.042155\n'
+            'Qutub Minar,Delhi,28.524428,77.185455\n'
+        )
+        offset = len('name,description,latitude,longitude\nTaj Mahal,Agra,27.175015,78.042155\n')
+        checkpoint = self.write_csv(json.dumps({path: {'position': 1, 'offset': offset, 'done': False}}), suffix='.json')
+        call_command('load_locations', path, checkpoint=checkpoint, stdout=StringIO())
+        self.assertEqual(list(Location.objects.values_list('name', flat=True)), ['Qutub Minar'])
+        with open(checkpoint) as file:
+            self.assertEqual(json.load(file)[path], {'position': 2, 'offset': os.path.getsize(path), 'done': True})
+
+        call_command('load_locations', path, checkpoint=checkpoint, stdout=StringIO())
+        self.assertEqual(Location.objects.count(), 1)
+
+    def test_load_locations_resumes_from_position_without_offset(self):
+        path = self.write_csv(
+            'name,description,latitude,longitude\n'
+            'Taj Mahal,Agra,27.175015,78.042155\n'
+            'Qutub Minar,Delhi,28.524428,77.185455\n'
+        )
+        checkpoint = self.write_csv(json.dumps({path: {'position': 1, 'done': False}}), suffix='.json')
+        call_command('load_locations', path, checkpoint=checkpoint, stdout=StringIO())
+        self.assertEqual(list(Location.objects.values_list('name', flat=True)), ['Qutub Minar'])
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.client.login(username='testuser', password='1234')
+        Location.objects.create(name='Taj Mahal', description='Agra', coordinates=Point(78.042155, 27.175015))
+        registry.clear()
+
+    def samples(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_request_metrics(self):
+        response = self.client.get('/api/locations/', {'limit': 10})
+        samples = self.samples()
+        self.assertEqual(samples['gis_requests_total{view="location-list",method="GET",status="200"}'], 1)
+        self.assertEqual(samples['gis_request_duration_seconds_count{view="location-list",method="GET"}'], 1)
+        self.assertGreater(samples['gis_db_queries_sum{view="location-list"}'], 0)
+        self.assertEqual(samples['gis_stage_duration_seconds_count{view="location-list",stage="serialization"}'], 1)
+        self.assertEqual(samples['gis_response_bytes_sum{view="location-list"}'], len(response.content))
+
+    def test_streamed_response_metrics(self):
+        response = self.client.get('/api/locations/', {'stream': 'true'})
+        size = len(b''.join(response.streaming_content))
+        samples = self.samples()
+        self.assertEqual(samples['gis_response_bytes_sum{view="location-list"}'], size)
+        self.assertGreater(samples['gis_db_queries_sum{view="location-list"}'], 0)
+
+    def test_metrics_access(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(METRICS_ALLOWED_IPS=['203.0.113.7']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, status.HTTP_200_OK)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.8').status_code, status.HTTP_200_OK)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_log(self):
+        with self.assertLogs('gis_app.metrics', 'WARNING') as logs:
+            self.client.get('/api/locations/')
+        self.assertIn('location-list', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
@@ -0,0 +1,309 @@
+import math
+import struct
+
+from django.contrib.gis.geos import Polygon
+from django.db import connection
+
+from .models import Location, Boundary
+from .spatial import is_postgis
+
+LAYERS = ('locations', 'boundaries')
+MAX_ZOOM = 22
+EXTENT = 4096
+BUFFER = 64
+TILE_PIXELS = 256
+WEB_MERCATOR_WORLD = 2 * math.pi * 6378137
+MAX_LATITUDE = 85.0511287798066
+
+GEOM_POINT = 1
+GEOM_POLYGON = 3
+
+
+def is_valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def tile_bounds(z, x, y):
+    """
+    Returns the (west, south, east, north) bounds of a tile in degrees.
+    """
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360 - 180, lat(y + 1), (x + 1) / n * 360 - 180, lat(y)
+
+
+def tile_envelope(z, x, y, buffer=BUFFER):
+    """
+    Returns the tile area, grown by `buffer` tile units, as a Polygon in SRID 4326.
+    """
+    west, south, east, north = tile_bounds(z, x, y)
+    pad_x = (east - west) * buffer / EXTENT
+    pad_y = (north - south) * buffer / EXTENT
+    envelope = Polygon.from_bbox((
+        max(west - pad_x, -180), max(south - pad_y, -MAX_LATITUDE),
+        min(east + pad_x, 180), min(north + pad_y, MAX_LATITUDE),
+    ))
+    envelope.srid = 4326
+    return envelope
+
+
+def tile_range(extent, z, buffer=BUFFER):
+    """
+    Returns the (min_x, min_y, max_x, max_y) tile indexes at zoom `z` whose
+    area, grown by `buffer` tile units, intersects the lon/lat extent.
+    """
+    n = 2 ** z
+    west, south, east, north = extent
+    pad = buffer / EXTENT
+
+    def column(lon):
+        return (lon + 180) / 360 * n
+
+    def row(lat):
+        lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+        return (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+
+    def clamp(value):
+        return min(max(int(math.floor(value)), 0), n - 1)
+
+    return (
+        clamp(column(west) - pad), clamp(row(north) - pad),
+        clamp(column(east) + pad), clamp(row(south) + pad),
+    )
+
+
+def simplify_tolerance(z):
+    """
+    Returns the width of one screen pixel at zoom `z`, in degrees of longitude.
+    """
+    return 360 / (TILE_PIXELS * 2 ** z)
+
+
+def render_tile(layer, z, x, y):
+    """
+    Returns the encoded Mapbox Vector Tile of a single layer.
+
+    On PostGIS 3+ the tile is built in the database with ST_AsMVT, otherwise
+    the features are fetched with a bbox filter and encoded in Python.
+
+    Tiles with several layers are the concatenation of single layer tiles,
+    because a tile is just a sequence of `layers` fields.
+    """
+    if use_postgis_mvt():
+        return render_postgis(layer, z, x, y)
+    return render_python(layer, z, x, y)
+
+
+def use_postgis_mvt():
+    return is_postgis() and connection.ops.spatial_version >= (3, 0, 0)
+
+
+# PostGIS
+
+POSTGIS_TILE_SQL = """
+    WITH bounds AS (
+        SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom
+    ),
+    mvtgeom AS (
+        SELECT t.id AS feature_id, t.id, t.name,
+               ST_AsMVTGeom({geometry}, bounds.geom, {extent}, {buffer}, true) AS geom
+        FROM {table} t, bounds
+        WHERE t.{column} && ST_Transform(ST_Expand(bounds.geom, %(margin)s), 4326)
+    )
+    SELECT ST_AsMVT(mvtgeom.*, %(layer)s, {extent}, 'geom', 'feature_id') FROM mvtgeom
+"""
+
+
+def render_postgis(layer, z, x, y):
+    quote = connection.ops.quote_name
+    if layer == 'locations':
+        table, column = Location._meta.db_table, 'coordinates'
+        geometry = 'ST_Transform(t.%s, 3857)' % quote(column)
+    else:
+        table, column = Boundary._meta.db_table, 'area'
+        geometry = 'ST_SimplifyPreserveTopology(ST_Transform(t.%s, 3857), %%(tolerance)s)' % quote(column)
+    sql = POSTGIS_TILE_SQL.format(
+        geometry=geometry, table=quote(table), column=quote(column), extent=EXTENT, buffer=BUFFER
+    )
+    tile_size = WEB_MERCATOR_WORLD / 2 ** z
+    params = {
+        'z': z, 'x': x, 'y': y, 'layer': layer,
+        'margin': tile_size * BUFFER / EXTENT,
+        'tolerance': tile_size / TILE_PIXELS,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] else b''
+
+
+# Pure Python fallback
+
+def render_python(layer, z, x, y):
+    envelope = tile_envelope(z, x, y)
+    project = tile_projector(z, x, y)
+    features = []
+    if layer == 'locations':
+        rows = Location.objects.filter(coordinates__bboverlaps=envelope).values_list('id', 'name', 'coordinates')
+        for pk, name, point in rows.iterator():
+            features.append((pk, {'id': pk, 'name': name}, GEOM_POINT, encode_point(project(point.x, point.y))))
+    else:
+        tolerance = simplify_tolerance(z)
+        rows = Boundary.objects.filter(area__bboverlaps=envelope).values_list('id', 'name', 'area')
+        for pk, name, area in rows.iterator():
+            clipped = area.simplify(tolerance, preserve_topology=True).intersection(envelope)
+            geometry = encode_polygons(polygon_parts(clipped), project)
+            if geometry:
+                features.append((pk, {'id': pk, 'name': name}, GEOM_POLYGON, geometry))
+    if not features:
+        return b''
+    return encode_tile(layer, features)
+
+
+def tile_projector(z, x, y):
+    """
+    Returns a function projecting lon/lat to integer tile coordinates.
+    """
+    n = 2 ** z
+
+    def project(lon, lat):
+        lat = max(min(lat, MAX_LATITUDE), -MAX_LATITUDE)
+        world_x = (lon + 180) / 360 * n
+        world_y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+        return round((world_x - x) * EXTENT), round((world_y - y) * EXTENT)
+
+    return project
+
+
+def polygon_parts(geometry):
+    if geometry.empty:
+        return []
+    if geometry.geom_type == 'Polygon':
+        return [geometry]
+    if geometry.geom_type in ('MultiPolygon', 'GeometryCollection'):
+        parts = []
+        for part in geometry:
+            parts.extend(polygon_parts(part))
+        return parts
+    return []
+
+
+def zigzag(n):
+    return (n << 1) ^ (n >> 31)
+
+
+def command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+
+def encode_point(point):
+    return [command(1, 1), zigzag(point[0]), zigzag(point[1])]
+
+
+def ring_area(ring):
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1])) / 2
+
+
+def encode_polygons(polygons, project):
+    """
+    Encodes polygons as MVT geometry commands.
+
+    Exterior rings are written with a positive area and interior rings with a
+    negative area in tile coordinates, as required by the MVT spec.
+    """
+    geometry = []
+    cursor = (0, 0)
+    for polygon in polygons:
+        for index, ring in enumerate(polygon):
+            points = []
+            for lon, lat in ring.coords[:-1]:
+                point = project(lon, lat)
+                if not points or point != points[-1]:
+                    points.append(point)
+            if len(points) > 1 and points[0] == points[-1]:
+                points.pop()
+            area = ring_area(points) if len(points) >= 3 else 0
+            if area == 0:
+                if index == 0:
+                    break
+                continue
+            if (index == 0) != (area > 0):
+                points.reverse()
+            geometry.append(command(1, 1))
+            geometry.extend((zigzag(points[0][0] - cursor[0]), zigzag(points[0][1] - cursor[1])))
+            geometry.append(command(2, len(points) - 1))
+            for previous, point in zip(points, points[1:]):
+                geometry.extend((zigzag(point[0] - previous[0]), zigzag(point[1] - previous[1])))
+            geometry.append(command(7, 1))
+            cursor = points[-1]
+    return geometry
+
+
+def varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def field_varint(number, value):
+    return varint(number << 3) + varint(value)
+
+
+def field_bytes(number, data):
+    return varint(number << 3 | 2) + varint(len(data)) + data
+
+
+def field_packed(number, values):
+    return field_bytes(number, b''.join(varint(value) for value in values))
+
+
+def encode_value(value):
+    if isinstance(value, str):
+        return field_bytes(1, value.encode('utf-8'))
+    if isinstance(value, float):
+        return varint(3 << 3 | 1) + struct.pack('<d', value)
+    if value >= 0:
+        return field_varint(5, value)
+    return field_varint(6, zigzag64(value))
+
+
+def zigzag64(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def encode_tile(layer, features):
+    """
+    Encodes (id, properties, geometry type, geometry commands) features as a single layer tile.
+    """
+    keys = {}
+    values = {}
+    encoded_features = []
+    for pk, properties, geom_type, geometry in features:
+        tags = []
+        for key, value in properties.items():
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault((type(value), value), len(values)))
+        encoded_features.append(field_bytes(2,
+            field_varint(1, pk)
+            + field_packed(2, tags)
+            + field_varint(3, geom_type)
+            + field_packed(4, geometry)
+        ))
+    layer_message = (
+        field_varint(15, 2)
+        + field_bytes(1, layer.encode('utf-8'))
+        + b''.join(encoded_features)
+        + b''.join(field_bytes(3, key.encode('utf-8')) for key in keys)
+        + b''.join(field_bytes(4, encode_value(value)) for _, value in values)
+        + field_varint(5, EXTENT)
+    )
+    return field_bytes(3, layer_message)
@@ -1,9 +1,14 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from . import async_views
 from .views import (
 		RegisterUserView, LoginUserView, LocationListCreateView, LocationUpdateRetrieveDeleteView,
 		BoundaryListCreateView, BoundaryUpdateRetrieveDeleteView, CalculateDistanceView, CheckBoundryView,
-		index
+		BatchCheckBoundaryView, DistanceMatrixView, NearestLocationsView, LocationBulkView, BoundaryBulkView,
+		BoundaryLocationsView, LocationBoundariesView, BoundaryCountsView, GridCountsView,
+		LocationClustersView, ChangeFeedView, LocationParquetView, BoundaryParquetView,
+		ReverseGeocodeView, LocationPositionsView, TileView,
+		index, metrics
 	)
 
 urlpatterns = [
@@ -15,12 +20,39 @@ urlpatterns = [
 
     path('api/locations/', LocationListCreateView.as_view(), name='location-list'),
     path('api/locations/<int:pk>/', LocationUpdateRetrieveDeleteView.as_view(), name='location-detail'),
+    path('api/locations/<int:pk>/boundaries/', LocationBoundariesView.as_view(), name='location-boundaries'),
+    path('api/locations/bulk/', LocationBulkView.as_view(), name='location-bulk'),
+    path('api/locations/positions/', LocationPositionsView.as_view(), name='location-positions'),
+    path('api/locations/parquet/', LocationParquetView.as_view(), name='location-parquet'),
+    path('api/locations/clusters/', LocationClustersView.as_view(), name='location-clusters'),
+    path('api/locations/nearest/', NearestLocationsView.as_view(), name='location-nearest'),
 
     path('api/boundaries/', BoundaryListCreateView.as_view(), name='boundary-list'),
+    path('api/boundaries/bulk/', BoundaryBulkView.as_view(), name='boundary-bulk'),
+    path('api/boundaries/parquet/', BoundaryParquetView.as_view(), name='boundary-parquet'),
     path('api/boundaries/<int:pk>/', BoundaryUpdateRetrieveDeleteView.as_view(), name='boundary-update'),
+    path('api/boundaries/<int:pk>/locations/', BoundaryLocationsView.as_view(), name='boundary-locations'),
 
     path('api/locations/distance/', CalculateDistanceView.as_view(), name='location-distance'),
+    path('api/locations/distance/matrix/', DistanceMatrixView.as_view(), name='location-distance-matrix'),
     path('api/locations/within_boundary/', CheckBoundryView.as_view(), name='check-boundary'),
+    path('api/locations/within_boundary/batch/', BatchCheckBoundaryView.as_view(), name='check-boundary-batch'),
+
+    path('api/aggregate/boundaries/', BoundaryCountsView.as_view(), name='aggregate-boundaries'),
+    path('api/aggregate/grid/', GridCountsView.as_view(), name='aggregate-grid'),
+
+    path('api/changes/', ChangeFeedView.as_view(), name='change-feed'),
+    path('api/geocode/reverse/', ReverseGeocodeView.as_view(), name='reverse-geocode'),
+
+    path('api/async/locations/', async_views.location_list, name='async-location-list'),
+    path('api/async/locations/<int:pk>/', async_views.location_detail, name='async-location-detail'),
+    path('api/async/boundaries/', async_views.boundary_list, name='async-boundary-list'),
+    path('api/async/boundaries/<int:pk>/', async_views.boundary_detail, name='async-boundary-detail'),
+    path('api/async/locations/distance/', async_views.calculate_distance, name='async-location-distance'),
+    path('api/async/locations/within_boundary/', async_views.check_boundary, name='async-check-boundary'),
+
+    path('tiles/<int:z>/<int:x>/<int:y>.mvt', TileView.as_view(), name='tile'),
+    path('metrics', metrics, name='metrics'),
 
     path('', index, name='index')
 
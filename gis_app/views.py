@@ -1,16 +1,47 @@
 from django.shortcuts import render, get_object_or_404
+from django.db import transaction
+from django.utils import timezone
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, Http404, StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from .serializers import RegisterUserSerializer, LoginUserSerializer, LocationSerializer, BoundarySerializer
+from .serializers import (
+    RegisterUserSerializer, LoginUserSerializer, LocationSerializer, BoundarySerializer, BatchWithinBoundarySerializer,
+    DistanceMatrixSerializer, NearestLocationsSerializer, DistanceSerializer, WithinBoundarySerializer,
+    ReverseGeocodeSerializer, PositionUpdateSerializer
+)
 from django.contrib.auth import login, authenticate
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import Location, Boundary
+from .pagination import list_response
+from .conditional import detail_validators, validators, set_validators, not_modified_response
+from .filters import filter_locations, filter_boundaries
+from .geojson import location_features, boundary_features
+from .tiles import LAYERS, is_valid_tile, render_tile
+from .cache import tile_cache, aggregate_cache, prepared_boundaries
+from .spatial import is_postgis, location_memberships, point_memberships, nearest_locations
+from .geo import haversine_matrix, parse_tolerance, parse_precision, parse_bbox, parse_point
+from .clusters import CLUSTER_MAX_ZOOM, MAX_CLUSTER_CELLS, cluster_cell_range, clusters
+from .aggregation import GRID_SHAPES, MAX_GRID_CELLS, boundary_counts, grid_cell_count, grid_counts
+from .simplification import simplified_area, SIMPLIFY_TOLERANCES
+from .changes import CHANGE_MODELS, stream_changes
+from .geocoder import reverse_geocoder
+from .positions import COMMITTED, position_buffer
+from .metrics import PROMETHEUS_CONTENT_TYPE, registry, timer
+from .geoparquet import PARQUET_CONTENT_TYPE, ParquetUnavailable, require_pyarrow, import_file, location_layer, boundary_layer
+from . import hooks
 from django.contrib.gis.geos import Point, Polygon
 import json
 from rest_framework.permissions import IsAuthenticated
 
+INDEX_LIST_SIZE = 100
+BULK_MAX_ITEMS = 50000
+BULK_BATCH_SIZE = 1000
+DISTANCE_MATRIX_STREAM_CELLS = 10000
+DISTANCE_MATRIX_BLOCK_CELLS = 100000
+
 
 class RegisterUserView(APIView):
     """
@@ -61,6 +92,14 @@ class LocationListCreateView(APIView):
 
     GET:
     Returns a list of all locations.
+    Supports keyset pagination with `limit` and `cursor`, and streaming
+    the locations as a GeoJSON FeatureCollection with `stream=true`.
+    `geojson=true` returns the locations (or the page) as a GeoJSON FeatureCollection.
+    Locations can be filtered with `bbox=min_lon,min_lat,max_lon,max_lat`
+    and `near=lon,lat` with a `radius` in meters, and `since=<ISO 8601 timestamp>`
+    returns only the locations updated after it.
+    Responses carry an ETag header; conditional requests get 304 when
+    no location was created, updated or deleted since.
 
     POST:
     Creates a new location with name, description, and coordinates.
@@ -70,9 +109,11 @@ class LocationListCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        location_obj = Location.objects.all()
-        serializer = LocationSerializer(location_obj, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            location_obj = filter_locations(Location.objects.all(), request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return list_response(request, location_obj, LocationSerializer, location_features)
 
     def post(self, request):
         serializer = LocationSerializer(data=request.data)
@@ -87,7 +128,8 @@ class LocationUpdateRetrieveDeleteView(APIView):
     API view to retrieve, update, and delete a location by its ID.
 
     GET:
-    Returns the data of the specified location.
+    Returns the data of the specified location, or 304 if the client's copy
+    matches the ETag or Last-Modified headers.
 
     PUT:
     Updates the specified location with new data.
@@ -101,9 +143,13 @@ class LocationUpdateRetrieveDeleteView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
+        response = not_modified_response(request, *detail_validators(Location.objects.all(), pk, request.query_params))
+        if response is not None:
+            return response
         location_obj = get_object_or_404(Location, pk=pk)
         serializer = LocationSerializer(location_obj)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        return set_validators(response, *validators(request.query_params, location_obj.pk, location_obj.updated_at))
 
     def put(self, request, pk):
         location_obj = get_object_or_404(Location, pk=pk)
@@ -115,16 +161,294 @@ class LocationUpdateRetrieveDeleteView(APIView):
 
     def delete(self, request, pk):
         location_obj = get_object_or_404(Location, pk=pk)
-        location_obj.delete()
+        deleted = [(location_obj.pk, location_obj.coordinates)]
+        with transaction.atomic():
+            location_obj.delete()
+            hooks.locations_deleted(deleted)
         return Response({"Location deleted"}, status=status.HTTP_204_NO_CONTENT)
 
 
+class LocationPositionsView(APIView):
+    """
+    API view to move locations, for assets whose position changes every few seconds.
+
+    POST:
+    Takes `positions`, a list of `{"id": 1, "coordinates": [longitude, latitude]}`.
+    The updates are buffered and written in batches, keeping only the last
+    position of every location, see `POSITION_BUFFER_DURABILITY`.
+    With `buffered` durability returns 202 once the positions are buffered.
+    With `committed` durability returns 200 once they are written, with the
+    `missing_ids` of the locations that do not exist.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = PositionUpdateSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        positions = [
+            (position['id'], Point(*position['coordinates'], srid=4326))
+            for position in serializer.validated_data['positions']
+        ]
+        batch = position_buffer.add(positions)
+        if position_buffer.durability != COMMITTED:
+            return Response({'accepted': len(positions)}, status=status.HTTP_202_ACCEPTED)
+        if batch.error is not None:
+            return Response({'error': 'The positions could not be written'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        missing_ids = sorted({pk for pk, _ in positions} - batch.written)
+        return Response({'accepted': len(positions), 'missing_ids': missing_ids}, status=status.HTTP_200_OK)
+
+
+class NearestLocationsView(APIView):
+    """
+    API view to find the locations nearest to a point.
+
+    GET:
+    Takes `lon`, `lat` and `k` (default 10, at most 100) query parameters.
+    Returns the `k` nearest locations sorted by their `distance` in meters.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        serializer = NearestLocationsSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        point = Point(data['lon'], data['lat'], srid=4326)
+        results = []
+        for distance, location in nearest_locations(point, data['k']):
+            item = LocationSerializer(location).data
+            item['distance'] = round(distance, 1)
+            results.append(item)
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class ReverseGeocodeView(APIView):
+    """
+    API view to find the boundaries containing points and the locations nearest to them,
+    answered from the in-process indexes of the reverse geocoder without querying the tables.
+
+    GET:
+    Takes a `point` (`lon,lat`) and `k` (default 1, at most 100) query parameters.
+
+    POST:
+    Takes `points` ([longitude, latitude] pairs, at most 10000) and `k`.
+
+    Returns, for each point, the `boundaries` containing it and its `k` `nearest`
+    locations with their `distance` in meters.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            point = parse_point(request.query_params.get('point', ''), 'point')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        data = {'points': [[point.x, point.y]]}
+        if 'k' in request.query_params:
+            data['k'] = request.query_params['k']
+        response = self.lookup(data)
+        if response.status_code == status.HTTP_200_OK:
+            response.data = response.data[0]
+        return response
+
+    def post(self, request):
+        return self.lookup(request.data)
+
+    def lookup(self, data):
+        serializer = ReverseGeocodeSerializer(data=data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        results = reverse_geocoder.lookup(serializer.validated_data['points'], serializer.validated_data['k'])
+        for result in results:
+            for location in result['nearest']:
+                location['distance'] = round(location['distance'], 1)
+        return Response(results, status=status.HTTP_200_OK)
+
+
+class BulkWriteView(APIView):
+    """
+    Base API view to create, update and delete many objects in one request.
+
+    Items are given as a JSON array or as a GeoJSON FeatureCollection.
+    Every item is validated by the model serializer, then all valid items
+    are written with one bulk query in a single transaction.
+    The response lists a status for every item, in request order.
+    """
+
+    permission_classes = [IsAuthenticated]
+    model = None
+    serializer_class = None
+    geometry_field = None
+    written_hook = None
+    deleted_hook = None
+
+    def get_items(self, data):
+        """
+        Returns the list of items of the payload, or None if it is neither an array nor a FeatureCollection.
+        """
+        if isinstance(data, dict) and data.get('type') == 'FeatureCollection':
+            data = data.get('features')
+            if not isinstance(data, list):
+                return None
+            items = []
+            for feature in data:
+                if not isinstance(feature, dict):
+                    return None
+                item = dict(feature.get('properties') or {})
+                item[self.geometry_field] = feature.get('geometry')
+                if feature.get('id') is not None:
+                    item['id'] = feature['id']
+                items.append(item)
+            return items
+        return data if isinstance(data, list) else None
+
+    def invalid_payload(self, items):
+        if items is None:
+            return Response({'error': 'Expected an array or a GeoJSON FeatureCollection'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > BULK_MAX_ITEMS:
+            return Response({'error': f'At most {BULK_MAX_ITEMS} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+        return None
+
+    def results_response(self, results, success_status, response_status=None):
+        """
+        Responds with `response_status` (by default `success_status`) when every
+        item succeeded, and with 207 Multi-Status otherwise.
+        """
+        if all(result['status'] == success_status for result in results):
+            response_status = response_status or success_status
+        else:
+            response_status = status.HTTP_207_MULTI_STATUS
+        return Response({'results': results}, status=response_status)
+
+    def post(self, request):
+        items = self.get_items(request.data)
+        error = self.invalid_payload(items)
+        if error:
+            return error
+        results = []
+        objects = []
+        for index, item in enumerate(items):
+            serializer = self.serializer_class(data=item)
+            if serializer.is_valid():
+                objects.append((index, self.model(**serializer.validated_data)))
+                results.append(None)
+            else:
+                results.append({'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors})
+        with transaction.atomic():
+            created = self.model.objects.bulk_create([obj for _, obj in objects], batch_size=BULK_BATCH_SIZE)
+            self.written_hook(created)
+        for (index, _), obj in zip(objects, created):
+            results[index] = {'index': index, 'status': status.HTTP_201_CREATED, 'id': obj.pk}
+        return self.results_response(results, status.HTTP_201_CREATED)
+
+    def patch(self, request):
+        items = self.get_items(request.data)
+        error = self.invalid_payload(items)
+        if error:
+            return error
+        ids = [item.get('id') for item in items if isinstance(item, dict) and isinstance(item.get('id'), int)]
+        instances = self.model.objects.in_bulk(ids)
+        results = []
+        updated = {}
+        previous = []
+        now = timezone.now()
+        for index, item in enumerate(items):
+            instance = instances.get(item.get('id')) if isinstance(item, dict) and isinstance(item.get('id'), int) else None
+            if instance is None:
+                results.append({'index': index, 'status': status.HTTP_404_NOT_FOUND, 'errors': 'Object not found'})
+                continue
+            serializer = self.serializer_class(instance, data=item, partial=True)
+            if not serializer.is_valid():
+                results.append({'index': index, 'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors})
+                continue
+            if instance.pk not in updated:
+                previous.append(getattr(instance, self.geometry_field))
+            serializer.assign(instance, serializer.validated_data)
+            instance.updated_at = now
+            updated[instance.pk] = instance
+            results.append({'index': index, 'status': status.HTTP_200_OK, 'id': instance.pk})
+        fields = [field.name for field in self.model._meta.concrete_fields if not field.primary_key and field.name != 'created_at']
+        with transaction.atomic():
+            self.model.objects.bulk_update(list(updated.values()), fields, batch_size=BULK_BATCH_SIZE)
+            self.written_hook(list(updated.values()), previous)
+        return self.results_response(results, status.HTTP_200_OK)
+
+    def delete(self, request):
+        data = request.data
+        ids = data.get('ids') if isinstance(data, dict) else data
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            return Response({'error': 'Expected {"ids": [...]} or an array of ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > BULK_MAX_ITEMS:
+            return Response({'error': f'At most {BULK_MAX_ITEMS} items per request'}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            deleted = list(self.model.objects.filter(id__in=ids).values_list('id', self.geometry_field))
+            self.model.objects.filter(id__in=[pk for pk, _ in deleted]).delete()
+            self.deleted_hook(deleted)
+        found = {pk for pk, _ in deleted}
+        results = [
+            {'index': index, 'id': pk, 'status': status.HTTP_204_NO_CONTENT if pk in found else status.HTTP_404_NOT_FOUND}
+            for index, pk in enumerate(ids)
+        ]
+        # A 204 response cannot carry the per-item results.
+        return self.results_response(results, status.HTTP_204_NO_CONTENT, status.HTTP_200_OK)
+
+
+class LocationBulkView(BulkWriteView):
+    """
+    API view to create, update and delete many locations.
+
+    POST:
+    Creates the locations of an array or FeatureCollection.
+
+    PATCH:
+    Partially updates the locations of an array or FeatureCollection, each item carrying its `id`.
+
+    DELETE:
+    Deletes the locations listed in `ids`.
+    """
+
+    model = Location
+    serializer_class = LocationSerializer
+    geometry_field = 'coordinates'
+    written_hook = staticmethod(hooks.locations_written)
+    deleted_hook = staticmethod(hooks.locations_deleted)
+
+
+def simplified_boundaries(queryset, params):
+    """
+    Applies the `simplify` and `precision` query params to a boundary queryset.
+    Returns the queryset, the GeoJSON feature reader and the serializer context.
+    Raises ValueError on invalid values.
+    """
+    features = boundary_features
+    context = {}
+    if params.get('simplify'):
+        queryset = queryset.annotate(simplified_area=simplified_area(parse_tolerance(params['simplify'])))
+        features = features.configure(geometry_field='simplified_area')
+    if params.get('precision'):
+        context['precision'] = parse_precision(params['precision'])
+        features = features.configure(precision=context['precision'])
+    return queryset, features, context
+
+
 class BoundaryListCreateView(APIView):
     """
     API view to list and create boundaries.
 
     GET:
     Returns a list of all boundaries.
+    Supports keyset pagination with `limit` and `cursor`, and streaming
+    the boundaries as a GeoJSON FeatureCollection with `stream=true`.
+    `geojson=true` returns the boundaries (or the page) as a GeoJSON FeatureCollection.
+    Boundaries can be filtered with `bbox=min_lon,min_lat,max_lon,max_lat`,
+    and `since=<ISO 8601 timestamp>` returns only the boundaries updated after it.
+    Responses carry an ETag header; conditional requests get 304 when
+    no boundary was created, updated or deleted since.
+    `simplify=<tolerance in degrees>` and `precision=<digits>` reduce the size of the areas.
 
     POST:
     Creates a new boundary with name and area.
@@ -134,9 +458,12 @@ class BoundaryListCreateView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        boundary_obj = Boundary.objects.all()
-        serializer = BoundarySerializer(boundary_obj, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            boundary_obj = filter_boundaries(Boundary.objects.all(), request.query_params)
+            boundary_obj, features, context = simplified_boundaries(boundary_obj, request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return list_response(request, boundary_obj, BoundarySerializer, features, context)
 
     def post(self, request):
         serializer = BoundarySerializer(data=request.data)
@@ -151,7 +478,9 @@ class BoundaryUpdateRetrieveDeleteView(APIView):
     API view to retrieve, update, and delete a boundary by its ID.
 
     GET:
-    Returns the data of the specified boundary.
+    Returns the data of the specified boundary, or 304 if the client's copy
+    matches the ETag or Last-Modified headers.
+    Supports `simplify` and `precision` like the boundary list.
 
     PUT:
     Updates the specified boundary with new data.
@@ -165,9 +494,17 @@ class BoundaryUpdateRetrieveDeleteView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
-        boundary_obj = get_object_or_404(Boundary, pk=pk)
-        serializer = BoundarySerializer(boundary_obj)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            boundaries, _, context = simplified_boundaries(Boundary.objects.all(), request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response = not_modified_response(request, *detail_validators(Boundary.objects.all(), pk, request.query_params))
+        if response is not None:
+            return response
+        boundary_obj = get_object_or_404(boundaries, pk=pk)
+        serializer = BoundarySerializer(boundary_obj, context=context)
+        response = Response(serializer.data, status=status.HTTP_200_OK)
+        return set_validators(response, *validators(request.query_params, boundary_obj.pk, boundary_obj.updated_at))
 
     def put(self, request, pk):
         boundary_obj = get_object_or_404(Boundary, pk=pk)
@@ -179,34 +516,188 @@ class BoundaryUpdateRetrieveDeleteView(APIView):
 
     def delete(self, request, pk):
         boundary_obj = get_object_or_404(Boundary, pk=pk)
-        boundary_obj.delete()
+        deleted = [(boundary_obj.pk, boundary_obj.area)]
+        with transaction.atomic():
+            boundary_obj.delete()
+            hooks.boundaries_deleted(deleted)
         return Response({"Boundary deleted"}, status=status.HTTP_204_NO_CONTENT)
 
 
+class BoundaryBulkView(BulkWriteView):
+    """
+    API view to create, update and delete many boundaries.
+
+    POST:
+    Creates the boundaries of an array or FeatureCollection.
+
+    PATCH:
+    Partially updates the boundaries of an array or FeatureCollection, each item carrying its `id`.
+
+    DELETE:
+    Deletes the boundaries listed in `ids`.
+    """
+
+    model = Boundary
+    serializer_class = BoundarySerializer
+    geometry_field = 'area'
+    written_hook = staticmethod(hooks.boundaries_written)
+    deleted_hook = staticmethod(hooks.boundaries_deleted)
+
+
+class ParquetView(APIView):
+    """
+    Base API view to export and import objects as GeoParquet files.
+
+    GET:
+    Streams the objects as a GeoParquet file, one row group at a time.
+    Accepts the filters of the list endpoint.
+
+    POST:
+    Creates the objects of the GeoParquet file uploaded as `file`.
+    With `bbox=min_lon,min_lat,max_lon,max_lat` only the rows overlapping it
+    are imported, skipping the row groups of the file outside of it.
+    Returns the number of created and skipped rows.
+    """
+
+    permission_classes = [IsAuthenticated]
+    layer = None
+    filter_queryset = None
+
+    def get(self, request):
+        try:
+            require_pyarrow()
+            queryset = self.filter_queryset(self.layer.model.objects.all(), request.query_params)
+        except ParquetUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(self.layer.iter_file(queryset), content_type=PARQUET_CONTENT_TYPE)
+        response['Content-Disposition'] = f'attachment; filename="{self.layer.model._meta.model_name}.parquet"'
+        return response
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'Expected a GeoParquet file upload named file'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            require_pyarrow()
+            bbox = request.query_params.get('bbox')
+            extent = parse_bbox(bbox).extent if bbox else None
+            created, skipped = import_file(self.layer, upload.file, extent)
+        except ParquetUnavailable as e:
+            return Response({'error': str(e)}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        except (ValueError, OSError) as e:
+            return Response({'error': f'Invalid GeoParquet file: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'created': created, 'skipped': skipped}, status=status.HTTP_201_CREATED)
+
+
+class LocationParquetView(ParquetView):
+    """
+    API view to export and import locations as GeoParquet.
+    """
+
+    layer = location_layer
+    filter_queryset = staticmethod(filter_locations)
+
+
+class BoundaryParquetView(ParquetView):
+    """
+    API view to export and import boundaries as GeoParquet.
+    """
+
+    layer = boundary_layer
+    filter_queryset = staticmethod(filter_boundaries)
+
+
 class CalculateDistanceView(APIView):
     """
     API view to calculate the distance between two locations.
 
     POST:
-    Calculates the distance between two locations specified by their IDs.
+    Calculates the distance between two locations, each given by its ID
+    (`location1_id`, `location2_id`) or as `[longitude, latitude]` coordinates
+    (`location1`, `location2`). Coordinates are used as is, without a query.
     Returns the distance on success.
     """
 
     def post(self, request):
-        location1_id = request.data.get('location1_id')
-        location2_id = request.data.get('location2_id')
-
-        if location1_id and location2_id:
-            loc1_obj = get_object_or_404(Location, id=location1_id)
-            loc2_obj = get_object_or_404(Location, id=location2_id)
-            distance = loc1_obj.coordinates.distance(loc2_obj.coordinates)
-            data = {
-                'location1_id': location1_id,
-                'location2_id': location2_id,
-                'distance': distance
-            }
-            return Response(data, status=status.HTTP_200_OK)
-        return Response({'error': 'Invalid data'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = DistanceSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        points = []
+        for name in ('location1', 'location2'):
+            if f'{name}_id' in data:
+                points.append(get_object_or_404(Location, id=data[f'{name}_id']).coordinates)
+            else:
+                points.append(Point(*data[name], srid=4326))
+        result = {name: list(value) if isinstance(value, tuple) else value for name, value in data.items()}
+        with timer('geos'):
+            result['distance'] = points[0].distance(points[1])
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class DistanceMatrixView(APIView):
+    """
+    API view to calculate the distances between many origins and destinations.
+
+    POST:
+    Takes `origin_ids` or `origins` and `destination_ids` or `destinations`
+    (location ids or [longitude, latitude] pairs).
+    Returns the N x M matrix of great-circle distances in meters, one row per origin.
+    Large matrices are streamed row block by row block.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = DistanceMatrixSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        ids = set(data.get('origin_ids', [])) | set(data.get('destination_ids', []))
+        coordinates = {
+            location_id: (point.x, point.y)
+            for location_id, point in Location.objects.filter(id__in=ids).values_list('id', 'coordinates')
+        }
+        missing_ids = ids - coordinates.keys()
+        if missing_ids:
+            return Response(
+                {'error': 'Locations not found', 'location_ids': sorted(missing_ids)},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if 'origin_ids' in data:
+            origin_keys = data['origin_ids']
+            origins = [coordinates[location_id] for location_id in origin_keys]
+        else:
+            origins = data['origins']
+            origin_keys = [list(point) for point in origins]
+        if 'destination_ids' in data:
+            destination_keys = data['destination_ids']
+            destinations = [coordinates[location_id] for location_id in destination_keys]
+        else:
+            destinations = data['destinations']
+            destination_keys = [list(point) for point in destinations]
+
+        if len(origins) * len(destinations) <= DISTANCE_MATRIX_STREAM_CELLS:
+            distances = haversine_matrix(origins, destinations).round(1).tolist()
+            result = {'origins': origin_keys, 'destinations': destination_keys, 'distances': distances}
+            return Response(result, status=status.HTTP_200_OK)
+
+        def rows():
+            yield '{"origins": %s, "destinations": %s, "distances": [' % (
+                json.dumps(origin_keys), json.dumps(destination_keys)
+            )
+            block_size = max(1, DISTANCE_MATRIX_BLOCK_CELLS // len(destinations))
+            for start in range(0, len(origins), block_size):
+                block = haversine_matrix(origins[start:start + block_size], destinations).round(1)
+                separator = ',' if start else ''
+                yield separator + ','.join(json.dumps(row) for row in block.tolist())
+            yield ']}'
+
+        return StreamingHttpResponse(rows(), content_type='application/json')
 
 
 class CheckBoundryView(APIView):
@@ -214,36 +705,305 @@ class CheckBoundryView(APIView):
     API view to check if a location is within a boundary.
 
     POST:
-    Checks if the specified location (by ID) is within the specified boundary (by ID).
+    Checks if a location, given by `location_id` or as `location` coordinates,
+    is within a boundary, given by `boundary_id` or as an inline GeoJSON
+    Polygon `boundary`. Inline values need no query. Stored boundaries are
+    tested with their prepared area, cached until the boundary changes.
     Returns a boolean indicating whether the location is within the boundary.
     """
 
     def post(self, request):
-        location_id = request.data.get('location_id')
-        boundary_id = request.data.get('boundary_id')
-        if location_id and boundary_id:
-            loc_obj = get_object_or_404(Location, id=location_id)
-            boundary_obj = get_object_or_404(Boundary, id=boundary_id)
-            result = boundary_obj.area.contains(loc_obj.coordinates)
-            return Response({'is_within': result}, status=status.HTTP_200_OK)
-        return Response({'errors': 'Invalid data'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = WithinBoundarySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        if 'location_id' in data:
+            point = get_object_or_404(Location, id=data['location_id']).coordinates
+        else:
+            point = Point(*data['location'], srid=4326)
+        if 'boundary_id' in data:
+            area = prepared_boundaries.get(data['boundary_id'])
+            if area is None:
+                raise Http404
+        else:
+            area = data['boundary']
+        with timer('geos'):
+            is_within = area.contains(point)
+        return Response({'is_within': is_within}, status=status.HTTP_200_OK)
+
+
+class BoundaryLocationsView(APIView):
+    """
+    API view to list the locations inside a boundary.
+
+    GET:
+    Returns the locations contained in the specified boundary, read from the
+    precomputed membership table. Supports the pagination, streaming and
+    GeoJSON options of the location list.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        get_object_or_404(Boundary.objects.only('id'), pk=pk)
+        location_obj = Location.objects.filter(memberships__boundary_id=pk)
+        return list_response(request, location_obj, LocationSerializer, location_features)
+
+
+class LocationBoundariesView(APIView):
+    """
+    API view to list the boundaries containing a location.
+
+    GET:
+    Returns the boundaries containing the specified location, read from the
+    precomputed membership table. Supports the options of the boundary list.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        get_object_or_404(Location.objects.only('id'), pk=pk)
+        try:
+            boundary_obj, features, context = simplified_boundaries(
+                Boundary.objects.filter(memberships__location_id=pk), request.query_params
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return list_response(request, boundary_obj, BoundarySerializer, features, context)
+
+
+class BatchCheckBoundaryView(APIView):
+    """
+    API view to check many locations or points against one or more boundaries.
+
+    POST:
+    Takes `location_ids` or raw `points` ([longitude, latitude] pairs) and `boundary_ids`.
+    Returns, for each location or point, the ids of the boundaries containing it,
+    or with `"format": "matrix"` a membership matrix with one row per location or point
+    and one column per boundary. All containment tests run as a single spatial join.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BatchWithinBoundarySerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        boundary_ids = list(dict.fromkeys(data['boundary_ids']))
+        boundaries = Boundary.objects.filter(id__in=boundary_ids)
+        if is_postgis():
+            # The spatial join reads the areas in the database, only the ids are needed here
+            boundaries = boundaries.only('id')
+        boundaries = list(boundaries)
+        missing_boundary_ids = set(boundary_ids) - {boundary.id for boundary in boundaries}
+        if missing_boundary_ids:
+            return Response(
+                {'error': 'Boundaries not found', 'boundary_ids': sorted(missing_boundary_ids)},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if 'points' in data:
+            points = data['points']
+            contained = point_memberships(points, boundaries)
+            keys = [list(point) for point in points]
+            key_name = 'point'
+            result = {}
+        else:
+            location_ids = list(dict.fromkeys(data['location_ids']))
+            existing_ids = set(Location.objects.filter(id__in=location_ids).values_list('id', flat=True))
+            keys = [location_id for location_id in location_ids if location_id in existing_ids]
+            memberships = location_memberships(keys, boundaries)
+            contained = [memberships.get(location_id, []) for location_id in keys]
+            key_name = 'location_id'
+            result = {'missing_location_ids': [location_id for location_id in location_ids if location_id not in existing_ids]}
+
+        if data['format'] == 'matrix':
+            result.update({
+                key_name + 's': keys,
+                'boundary_ids': boundary_ids,
+                'matrix': [[boundary_id in members for boundary_id in boundary_ids] for members in map(set, contained)],
+            })
+        else:
+            result['results'] = [{key_name: key, 'boundary_ids': ids} for key, ids in zip(keys, contained)]
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class BoundaryCountsView(APIView):
+    """
+    API view to count the locations inside every boundary.
+
+    GET:
+    Returns the id, name and location count of every boundary, or of the
+    boundaries overlapping `bbox=min_lon,min_lat,max_lon,max_lat` or updated
+    after `since=<ISO 8601 timestamp>`.
+    Results are cached until the next write.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            boundary_obj = filter_boundaries(Boundary.objects.all(), request.query_params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        key = 'boundaries:%s:%s' % (request.query_params.get('bbox', ''), request.query_params.get('since', ''))
+        counts = aggregate_cache.get_or_compute(key, lambda: boundary_counts(boundary_obj))
+        return Response(counts, status=status.HTTP_200_OK)
+
+
+class GridCountsView(APIView):
+    """
+    API view to count the locations in the cells of a grid.
+
+    GET:
+    Takes `bbox=min_lon,min_lat,max_lon,max_lat`, a cell `size` in degrees
+    and a `shape` (`square` or `hex`, default `square`).
+    Returns the center and location count of every non empty cell.
+    Results are cached until the next write.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        shape = params.get('shape', 'square')
+        if shape not in GRID_SHAPES:
+            return Response({'error': f'shape must be one of {", ".join(GRID_SHAPES)}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            bbox = parse_bbox(params.get('bbox'))
+            size = parse_tolerance(params.get('size'), name='size')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if grid_cell_count(bbox.extent, size, shape) > MAX_GRID_CELLS:
+            return Response({'error': f'The grid has more than {MAX_GRID_CELLS} cells, use a larger size'}, status=status.HTTP_400_BAD_REQUEST)
+
+        key = 'grid:%s:%r:%r' % (shape, size, bbox.extent)
+        cells = aggregate_cache.get_or_compute(key, lambda: grid_counts(bbox, size, shape))
+        return Response({'shape': shape, 'size': size, 'cells': cells}, status=status.HTTP_200_OK)
+
+
+class LocationClustersView(APIView):
+    """
+    API view to get clusters of locations for a map view.
+
+    GET:
+    Takes `zoom` (0 to CLUSTER_MAX_ZOOM) and `bbox=min_lon,min_lat,max_lon,max_lat`.
+    Returns a GeoJSON FeatureCollection with one point per non empty cluster,
+    at the mean of its locations, with the number of locations as `count`.
+    Clusters are cells of 64 screen pixels at that zoom, precomputed for every
+    zoom level and updated whenever locations change.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            zoom = int(request.query_params.get('zoom', ''))
+        except ValueError:
+            return Response({'error': 'zoom must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= zoom <= CLUSTER_MAX_ZOOM:
+            return Response({'error': f'zoom must be between 0 and {CLUSTER_MAX_ZOOM}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            bbox = parse_bbox(request.query_params.get('bbox'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        min_x, min_y, max_x, max_y = cluster_cell_range(bbox.extent, zoom)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > MAX_CLUSTER_CELLS:
+            return Response({'error': 'bbox is too large for this zoom'}, status=status.HTTP_400_BAD_REQUEST)
+
+        features = [
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': {'count': count}}
+            for count, lon, lat in clusters(bbox.extent, zoom)
+        ]
+        return Response({'type': 'FeatureCollection', 'features': features}, status=status.HTTP_200_OK)
+
+
+class ChangeFeedView(APIView):
+    """
+    API view to sync clients incrementally from the change log.
+
+    GET:
+    Streams the create, update and delete events with a sequence number
+    greater than `after` (default 0), oldest first, optionally only those of
+    one `model` (`location` or `boundary`) and at most `limit` of them.
+    Creates and updates carry the current state of the object as a GeoJSON
+    Feature, deletes carry a null feature.
+    `last_seq` is the `after` of the next request.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            after = int(request.query_params.get('after') or 0)
+            limit = request.query_params.get('limit')
+            limit = int(limit) if limit else None
+        except ValueError:
+            return Response({'error': 'after and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if after < 0 or (limit is not None and limit < 1):
+            return Response({'error': 'after must not be negative and limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        model = request.query_params.get('model')
+        if model and model not in CHANGE_MODELS:
+            return Response({'error': f'model must be one of {", ".join(CHANGE_MODELS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        return stream_changes(after, model, limit)
+
+
+class TileView(APIView):
+    """
+    API view to get vector tiles.
+
+    GET:
+    Returns the Mapbox Vector Tile z/x/y with a `locations` and a `boundaries` layer.
+    The `layers` query parameter selects a comma separated subset of the layers.
+    Each layer of the tile is cached until a write touches its area.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, z, x, y):
+        if not is_valid_tile(z, x, y):
+            raise Http404('Invalid tile')
+        layers = request.query_params.get('layers')
+        layers = layers.split(',') if layers else LAYERS
+        if any(layer not in LAYERS for layer in layers):
+            return Response({'error': f'layers must be a subset of {", ".join(LAYERS)}'}, status=status.HTTP_400_BAD_REQUEST)
+        with timer('tiles'):
+            content = b''.join(tile_cache.get_or_render(layer, z, x, y, render_tile) for layer in layers)
+        return HttpResponse(content, content_type='application/vnd.mapbox-vector-tile')
+
+
+def metrics(request):
+    """
+    Returns the request metrics of this process in the Prometheus text format.
+    Only served to the addresses in METRICS_ALLOWED_IPS and to staff users,
+    since it exposes the latency and SQL statistics of every view.
+    """
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if request.META.get('REMOTE_ADDR') not in allowed_ips and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
 
 
 def index(request):
     """
-    Renders the index page with locations and boundaries data.
+    Renders the index page with the first locations and boundaries.
+    The map loads the full data lazily as vector tiles.
     """
     permission_classes = [IsAuthenticated]
 
-    location_obj = Location.objects.only('id', 'name', 'description', 'coordinates')
-    location_serializer = LocationSerializer(location_obj, many=True)
-    boundaries = Boundary.objects.only('id', 'name', 'area')
-    boundary_serializer = BoundarySerializer(boundaries, many=True)
+    # The template only prints the fields, so the rows are passed as they
+    # are read instead of going through the serializers.
+    location_obj = Location.objects.values('id', 'name', 'description', 'coordinates').order_by('id')[:INDEX_LIST_SIZE]
+    # The table only previews the areas, so it shows their coarsest simplified version.
+    boundaries = Boundary.objects.annotate(
+        simplified_area=simplified_area(SIMPLIFY_TOLERANCES[-1])
+    ).values('id', 'name', 'simplified_area').order_by('id')[:INDEX_LIST_SIZE]
 
     context = {
-        'locations': location_serializer.data,
-        'boundaries': boundary_serializer.data,
-        'locations_json': json.dumps(location_serializer.data),
-        'boundaries_json': json.dumps(boundary_serializer.data)
+        'locations': location_obj,
+        'boundaries': boundaries,
+        'cluster_max_zoom': CLUSTER_MAX_ZOOM,
     }
     return render(request, 'gis_app/index.html', context)
@@ -53,8 +53,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'gis_app.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'gis_app.middleware.StatelessAPISessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -97,6 +98,76 @@ DATABASES = {
 }
 
 
+# The local memory backends are private to every worker process, so a write
+# only invalidates the cached tiles and aggregation results of the process
+# that handled it; the other workers serve stale entries until they expire.
+# With several workers, point TILE_CACHE_BACKEND / CACHE_BACKEND to a shared
+# backend such as django.core.cache.backends.redis.RedisCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    },
+    'tiles': {
+        'BACKEND': os.getenv('TILE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('TILE_CACHE_LOCATION', 'tiles'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Rendered vector tiles are kept in an in-process LRU in front of the 'tiles' cache
+TILE_CACHE_ALIAS = 'tiles'
+TILE_CACHE_LRU_SIZE = 512
+TILE_CACHE_TIMEOUT = 3600
+# Writes invalidate tiles through their ancestor tile at this zoom level
+TILE_CACHE_INVALIDATION_ZOOM = 12
+TILE_CACHE_MAX_INVALIDATION_TILES = 4096
+
+# Aggregation results are cached until the next write, at most this many seconds
+AGGREGATE_CACHE_ALIAS = 'default'
+AGGREGATE_CACHE_TIMEOUT = 300
+
+# API requests are authenticated by the session cookie or by a JWT access
+# token in the Authorization header. Requests to /api/ with a token skip the
+# session table, their user is built from the token claims.
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+        'gis_app.authentication.CachedJWTAuthentication',
+    ],
+}
+
+# Number of prepared boundary areas kept in the in-process cache of every worker
+PREPARED_GEOMETRY_CACHE_SIZE = 256
+
+# Requests taking at least this many seconds are logged with their slowest SQL statements, None disables the log
+SLOW_REQUEST_THRESHOLD = 1.0
+
+# Client addresses allowed to read /metrics besides staff users. Behind a reverse
+# proxy on the same host every request comes from the proxy's address, so the
+# proxy must not forward /metrics from outside.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Buffering of POST /api/locations/positions/: 'buffered' acknowledges updates
+# before they are written, and loses those of the last POSITION_FLUSH_INTERVAL
+# seconds if the process dies; 'committed' acknowledges them once written.
+POSITION_BUFFER_DURABILITY = 'buffered'
+POSITION_FLUSH_INTERVAL = 1.0
+POSITION_BUFFER_SIZE = 10000
+
+# Largest number of vertices of the subdivided pieces stored for every boundary
+BOUNDARY_PIECE_MAX_VERTICES = 256
+
+# Seconds between the refreshes of the reverse geocoder index from the change log
+GEOCODER_REFRESH_INTERVAL = 1.0
+
+# Number of validated JWTs kept in the in-process cache of every worker
+JWT_TOKEN_CACHE_SIZE = 10000
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 